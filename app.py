@@ -1,4 +1,7 @@
 import gradio as gr
+from backend.database import get_db_manager
+from backend.figure_store import get_figure_store
+from backend.job_queue import get_job_queue
 from ui.evaluador import crear_tab_nueva_evaluacion
 from ui.historial import crear_tab_historial
 from ui.estadisticas import crear_tab_estadisticas
@@ -135,9 +138,16 @@ with gr.Blocks(
 
     with gr.Tabs():
         crear_tab_nueva_evaluacion()
-        crear_tab_historial()
-        crear_tab_estadisticas()
-        crear_tab_generador_ia()
+        crear_tab_historial(demo)
+        crear_tab_estadisticas(demo)
+        crear_tab_generador_ia(demo)
+
 
 if __name__ == "__main__":
+    # Archiva al iniciar y luego periódicamente, mientras el servidor siga activo
+    get_db_manager().iniciar_archivado_periodico()
+    get_figure_store().iniciar_limpieza_periodica()
+    # Retoma los trabajos que quedaron en cola al detener el servidor; el
+    # despachador también elimina periódicamente los trabajos vencidos
+    get_job_queue().iniciar()
     demo.launch(share=True)
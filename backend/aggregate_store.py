@@ -0,0 +1,402 @@
+import os
+import ast
+import json
+import sqlite3
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from backend.formula_engine import AGREGACIONES, ErrorFormula, compilar_formula
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+ESQUEMA_AGREGADOS = """
+    CREATE TABLE IF NOT EXISTS series (
+        nombre TEXT PRIMARY KEY,
+        columna_periodo TEXT NOT NULL,
+        frecuencia TEXT NOT NULL,
+        medidas TEXT NOT NULL,
+        columna_grupo TEXT,
+        columna_clave TEXT,
+        ultimo_periodo TEXT,
+        ultima_clave REAL,
+        actualizado TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS agregados (
+        serie TEXT NOT NULL,
+        periodo TEXT NOT NULL,
+        grupo TEXT NOT NULL,
+        medida TEXT NOT NULL,
+        suma REAL NOT NULL,
+        cuenta INTEGER NOT NULL,
+        minimo REAL,
+        maximo REAL,
+        PRIMARY KEY (serie, periodo, grupo, medida)
+    );
+"""
+
+# Suma los agregados de las filas nuevas a los ya guardados del mismo grupo
+SQL_ACUMULAR = """
+    INSERT INTO agregados (serie, periodo, grupo, medida, suma, cuenta, minimo, maximo)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (serie, periodo, grupo, medida) DO UPDATE SET
+        suma = suma + excluded.suma,
+        cuenta = cuenta + excluded.cuenta,
+        minimo = MIN(COALESCE(minimo, excluded.minimo), COALESCE(excluded.minimo, minimo)),
+        maximo = MAX(COALESCE(maximo, excluded.maximo), COALESCE(excluded.maximo, maximo))
+"""
+
+# Estadísticos que se pueden pedir de una medida
+ESTADISTICOS = ("suma", "cuenta", "minimo", "maximo", "promedio", "acumulado")
+
+
+class AlmacenAgregados:
+    """
+    Agregados por período y grupo de datasets que crecen agregando períodos
+    (p. ej. un mes nuevo al final de avance_obra.csv), guardados en SQLite.
+
+    Cada serie define la columna de período, las medidas numéricas y,
+    opcionalmente, una columna de grupo y una de clave. Al actualizar con el
+    dataset completo solo se agregan las filas nuevas:
+
+    - con clave (un id creciente): las filas con clave mayor a la última vista
+    - sin clave: las filas del último período guardado en adelante; ese
+      período se recalcula por si se había cargado incompleto
+
+    Antes se comprueba que las filas ya agregadas sigan sumando lo guardado
+    (cuenta y suma de cada medida). Si no, el dataset no es la continuación
+    del anterior (otro archivo con el mismo esquema, o filas corregidas) y
+    la serie se reconstruye con el dataset completo.
+
+    Por cada (período, grupo, medida) se guardan suma, cuenta, mínimo y
+    máximo, de los que salen promedios, acumulados y cocientes de sumas.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """db_path: Base de los agregados (AGREGADOS_DB, "agregados.db")"""
+        self.db_path = db_path or os.getenv("AGREGADOS_DB", "agregados.db")
+        self.init_database()
+
+    def init_database(self):
+        """Crea las tablas si no existen"""
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(ESQUEMA_AGREGADOS)
+
+    def definir_serie(
+        self,
+        nombre: str,
+        columna_periodo: str,
+        medidas: List[str],
+        columna_grupo: Optional[str] = None,
+        columna_clave: Optional[str] = None,
+        frecuencia: str = "M",
+    ):
+        """
+        Registra una serie (o actualiza su definición). Si cambian el período,
+        las medidas o el grupo, se descartan sus agregados.
+        """
+        with sqlite3.connect(self.db_path) as conn:
+            anterior = conn.execute(
+                """
+                SELECT columna_periodo, frecuencia, medidas, columna_grupo, columna_clave
+                FROM series WHERE nombre = ?
+                """,
+                (nombre,),
+            ).fetchone()
+            definicion = (
+                columna_periodo,
+                frecuencia,
+                json.dumps(medidas),
+                columna_grupo,
+                columna_clave,
+            )
+            if anterior == definicion:
+                return
+            conn.execute("DELETE FROM agregados WHERE serie = ?", (nombre,))
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO series
+                (nombre, columna_periodo, frecuencia, medidas, columna_grupo, columna_clave)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (nombre, *definicion),
+            )
+
+    def _definicion(self, conn: sqlite3.Connection, nombre: str) -> Dict[str, Any]:
+        conn.row_factory = sqlite3.Row
+        fila = conn.execute(
+            "SELECT * FROM series WHERE nombre = ?", (nombre,)
+        ).fetchone()
+        conn.row_factory = None
+        if fila is None:
+            raise KeyError(f"Serie no definida: {nombre}")
+        definicion = dict(fila)
+        definicion["medidas"] = json.loads(definicion["medidas"])
+        return definicion
+
+    def actualizar(self, nombre: str, df: "pd.DataFrame") -> Dict[str, Any]:
+        """
+        Incorpora las filas nuevas de `df` (el dataset completo) a la serie.
+        Retorna {"filas_nuevas", "periodos", "reconstruida"} con lo que se
+        actualizó.
+        """
+        import pandas as pd
+
+        with sqlite3.connect(self.db_path) as conn:
+            serie = self._definicion(conn, nombre)
+        # Los períodos se convierten una vez por valor distinto, no por fila
+        codigos, valores = pd.factorize(df[serie["columna_periodo"]])
+        fechas = pd.DatetimeIndex(pd.to_datetime(valores, errors="coerce"))
+        periodos = pd.Series(
+            fechas.to_period(serie["frecuencia"]).take(codigos, allow_fill=True),
+            index=df.index,
+        )
+
+        clave = serie["columna_clave"]
+        reconstruir = False
+        if clave and serie["ultima_clave"] is not None:
+            previas = df[(df[clave] <= serie["ultima_clave"]) & periodos.notna()]
+            reconstruir = not self._historia_coincide(nombre, serie, previas)
+            nuevas = df[serie["ultima_clave"] < df[clave]]
+            reemplazar = []
+        elif serie["ultimo_periodo"] is not None:
+            desde = pd.Period(serie["ultimo_periodo"], serie["frecuencia"])
+            # Las filas sin fecha válida tampoco se habían agregado
+            previas = df[periodos < desde]
+            reconstruir = not self._historia_coincide(
+                nombre, serie, previas, serie["ultimo_periodo"]
+            )
+            nuevas = df[periodos >= desde]
+            reemplazar = sorted(periodos[nuevas.index].dropna().astype(str).unique())
+        else:
+            nuevas, reemplazar = df, []
+        if reconstruir:
+            nuevas, reemplazar = df, []
+        # Las filas sin fecha válida no pertenecen a ningún período
+        nuevas = nuevas[periodos[nuevas.index].notna()]
+        if nuevas.empty and not reconstruir:
+            return {"filas_nuevas": 0, "periodos": [], "reconstruida": False}
+
+        grupo = serie["columna_grupo"]
+        claves_grupo = [periodos[nuevas.index].astype(str).rename("periodo")]
+        claves_grupo.append(
+            nuevas[grupo].astype(str).rename("grupo")
+            if grupo
+            else pd.Series("", index=nuevas.index, name="grupo")
+        )
+        medidas = nuevas[serie["medidas"]].apply(pd.to_numeric, errors="coerce")
+        agregados = medidas.groupby(claves_grupo, observed=True).agg(
+            ["sum", "count", "min", "max"]
+        )
+        # Una fila por (período, grupo, medida)
+        agregados = agregados.stack(level=0, future_stack=True).reset_index()
+        agregados = agregados.astype(object).where(agregados.notna(), None)
+        filas = [
+            (nombre, periodo, g, medida, float(suma or 0), int(cuenta), minimo, maximo)
+            for periodo, g, medida, suma, cuenta, minimo, maximo in agregados.itertuples(
+                index=False
+            )
+        ]
+
+        ultimo_periodo = periodos.max()
+        ultima_clave = float(df[clave].max()) if clave else None
+        with sqlite3.connect(self.db_path) as conn:
+            if reconstruir:
+                conn.execute("DELETE FROM agregados WHERE serie = ?", (nombre,))
+            conn.executemany(
+                "DELETE FROM agregados WHERE serie = ? AND periodo = ?",
+                [(nombre, periodo) for periodo in reemplazar],
+            )
+            conn.executemany(SQL_ACUMULAR, filas)
+            conn.execute(
+                """
+                UPDATE series SET ultimo_periodo = ?, ultima_clave = ?,
+                    actualizado = CURRENT_TIMESTAMP
+                WHERE nombre = ?
+                """,
+                (
+                    None if pd.isna(ultimo_periodo) else str(ultimo_periodo),
+                    ultima_clave,
+                    nombre,
+                ),
+            )
+        return {
+            "filas_nuevas": len(nuevas),
+            "periodos": sorted(agregados["periodo"].unique().tolist()),
+            "reconstruida": reconstruir,
+        }
+
+    def _historia_coincide(
+        self,
+        nombre: str,
+        serie: Dict[str, Any],
+        previas: "pd.DataFrame",
+        antes_de: Optional[str] = None,
+    ) -> bool:
+        """
+        Si las filas `previas` (las ya agregadas, con período válido) tienen, por
+        medida, la misma cuenta y suma que lo guardado para los períodos
+        anteriores a `antes_de` (todos, si es None). Son sumas vectorizadas
+        de las columnas, mucho más baratas que volver a agrupar.
+        """
+        import math
+
+        import pandas as pd
+
+        condicion, parametros = "", [nombre]
+        if antes_de is not None:
+            condicion = "AND periodo < ?"
+            parametros.append(antes_de)
+        with sqlite3.connect(self.db_path) as conn:
+            guardados = {
+                medida: (suma, cuenta)
+                for medida, suma, cuenta in conn.execute(
+                    f"""
+                    SELECT medida, SUM(suma), SUM(cuenta) FROM agregados
+                    WHERE serie = ? {condicion} GROUP BY medida
+                    """,
+                    parametros,
+                )
+            }
+        medidas = previas[serie["medidas"]].apply(pd.to_numeric, errors="coerce")
+        for medida in serie["medidas"]:
+            suma, cuenta = guardados.get(medida, (0.0, 0))
+            if int(medidas[medida].count()) != cuenta or not math.isclose(
+                float(medidas[medida].sum()), suma, rel_tol=1e-9, abs_tol=1e-6
+            ):
+                return False
+        return True
+
+    def serie(
+        self,
+        nombre: str,
+        medida: str,
+        estadistico: str = "suma",
+        por_grupo: bool = False,
+    ) -> "pd.DataFrame":
+        """
+        Serie de una medida por período (y grupo): suma, cuenta, minimo,
+        maximo, promedio o acumulado (suma acumulada de los períodos).
+        """
+        import pandas as pd
+
+        if estadistico not in ESTADISTICOS:
+            raise ValueError(f"Estadístico desconocido: {estadistico}")
+        columnas = "periodo, grupo" if por_grupo else "periodo"
+        with sqlite3.connect(self.db_path) as conn:
+            df = pd.read_sql_query(
+                f"""
+                SELECT {columnas}, SUM(suma) AS suma, SUM(cuenta) AS cuenta,
+                    MIN(minimo) AS minimo, MAX(maximo) AS maximo
+                FROM agregados WHERE serie = ? AND medida = ?
+                GROUP BY {columnas} ORDER BY {columnas}
+                """,
+                conn,
+                params=(nombre, medida),
+            )
+        if estadistico == "promedio":
+            df["valor"] = df["suma"] / df["cuenta"].where(df["cuenta"] > 0)
+        elif estadistico == "acumulado":
+            df["valor"] = (
+                df.groupby("grupo")["suma"].cumsum()
+                if por_grupo
+                else df["suma"].cumsum()
+            )
+        else:
+            df["valor"] = df[estadistico]
+        return df[[*columnas.split(", "), "valor"]]
+
+    def calcular(
+        self, nombre: str, formula: str, por_grupo: bool = False
+    ) -> "pd.DataFrame":
+        """
+        Evalúa una fórmula de cocientes de sumas (p. ej.
+        "avance_real / avance_programado * 100") sobre los agregados, sin
+        volver a leer el dataset. Solo admite columnas sueltas y sum().
+        """
+        import pandas as pd
+
+        compilada = compilar_formula(formula)
+        for nodo in ast.walk(compilada.arbol):
+            if (
+                isinstance(nodo, ast.Call)
+                and nodo.func.id in AGREGACIONES
+                and AGREGACIONES[nodo.func.id] != "sum"
+            ):
+                raise ErrorFormula(
+                    "Sobre los agregados solo se pueden calcular sumas y sus cocientes."
+                )
+        columnas = "periodo, grupo" if por_grupo else "periodo"
+        with sqlite3.connect(self.db_path) as conn:
+            sumas = pd.read_sql_query(
+                f"""
+                SELECT {columnas}, medida, SUM(suma) AS suma FROM agregados
+                WHERE serie = ? GROUP BY {columnas}, medida
+                """,
+                conn,
+                params=(nombre,),
+            )
+        claves = columnas.split(", ")
+        ancho = sumas.pivot(index=claves, columns="medida", values="suma").reset_index()
+        grupos = [ancho[clave] for clave in claves]
+        valor = compilada.evaluar(ancho, grupos)
+        return valor.rename("valor").reset_index()
+
+
+# Almacén global, creado en el primer uso
+_aggregate_store: Optional[AlmacenAgregados] = None
+_aggregate_store_lock = threading.Lock()
+
+
+def get_aggregate_store() -> AlmacenAgregados:
+    """Retorna el almacén global de agregados, creándolo la primera vez."""
+    global _aggregate_store
+    if _aggregate_store is None:
+        with _aggregate_store_lock:
+            if _aggregate_store is None:
+                _aggregate_store = AlmacenAgregados()
+    return _aggregate_store
+
+
+if __name__ == "__main__":
+    # Simula la carga mes a mes de avance_obra.csv y compara la actualización
+    # incremental con recalcular el indicador sobre el dataset completo.
+    # Uso: python -m backend.aggregate_store
+    import tempfile
+    import time
+
+    import pandas as pd
+
+    from backend.formula_engine import calcular_indicador
+
+    formula = "sum(avance_real) / sum(avance_programado) * 100"
+    ruta = os.path.join(os.path.dirname(__file__), "..", "dataset", "avance_obra.csv")
+    base = pd.read_csv(ruta)
+    # Se repite el dataset como si cada frente reportara avances diarios
+    df = pd.concat([base] * 2000, ignore_index=True)
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenAgregados(os.path.join(directorio, "agregados.db"))
+        almacen.definir_serie(
+            "avance_obra",
+            "mes",
+            ["avance_real", "avance_programado"],
+            columna_grupo="frente_obra",
+        )
+        print(
+            f"{'Mes':8} {'Filas nuevas':>12} {'Incremental (ms)':>17} {'Completo (ms)':>14}"
+        )
+        for mes in sorted(df["mes"].unique()):
+            hasta = df[df["mes"] <= mes]
+            inicio = time.perf_counter()
+            filas = almacen.actualizar("avance_obra", hasta)["filas_nuevas"]
+            serie = almacen.calcular("avance_obra", formula)
+            incremental = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            completo = calcular_indicador(hasta, formula)
+            tiempo_completo = time.perf_counter() - inicio
+            assert abs(serie["valor"].values - completo["valor"].values).max() < 1e-9
+            print(
+                f"{mes:8} {filas:>12} {incremental * 1000:>17.1f} "
+                f"{tiempo_completo * 1000:>14.1f}"
+            )
@@ -1,183 +1,555 @@
 import io
 import sys
+import reprlib
 import contextlib
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-from typing import Dict, Any, List, Tuple
+from types import CodeType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 import base64
 import warnings
-import tempfile
 import os
-from datetime import datetime
+import time
+from backend.code_validator import (
+    MODULOS_PERMITIDOS,
+    ModuloRestringido,
+    importar_restringido,
+    validar_codigo,
+)
+from backend.execution_profiler import PerfilEjecucion
+from backend.figure_store import get_figure_store
+from backend.result_cache import get_result_cache, huella_dataframe
+from backend.shared_frames import DataFrameCompartido, adjuntar_dataframe
+from backend.sandbox_pool import (
+    get_sandbox_pool,
+    limites_configurados,
+    pool_habilitado,
+    resultado_error,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 warnings.filterwarnings("ignore")
 
 
+def _cargar_librerias() -> Dict[str, Any]:
+    """
+    Importa las librerías de análisis en el primer uso.
+    pandas, matplotlib, seaborn y plotly suman varios segundos de arranque,
+    así que solo se cargan cuando realmente se ejecuta código.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    # IDs estables en SVG para que figuras idénticas produzcan los mismos bytes
+    matplotlib.rcParams["svg.hashsalt"] = "indicadores"
+    import matplotlib.pyplot as plt
+    import pandas as pd
+    import numpy as np
+    import seaborn as sns
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    return {"pd": pd, "np": np, "plt": plt, "sns": sns, "px": px, "go": go}
+
+
+# Formatos de imagen admitidos para las figuras generadas
+FORMATOS_FIGURA = ("png", "webp", "svg")
+
+
+def opciones_figuras_configuradas() -> Dict[str, Any]:
+    """
+    Opciones de renderizado por defecto, configurables por variables de
+    entorno: formato (FIGURAS_FORMATO), resolución (FIGURAS_DPI) y si se
+    devuelve además la imagen en base64 (FIGURAS_BASE64).
+    """
+    return {
+        "formato": os.getenv("FIGURAS_FORMATO", "png").lower(),
+        "dpi": int(os.getenv("FIGURAS_DPI", "150")),
+        "incluir_base64": os.getenv("FIGURAS_BASE64", "0") == "1",
+    }
+
+
+def renderizar_figura(fig, formato: str = "png", dpi: int = 150) -> bytes:
+    """Rasteriza (o serializa, para SVG) una figura de matplotlib una sola vez."""
+    if formato not in FORMATOS_FIGURA:
+        raise ValueError(
+            f"Formato de figura no soportado: {formato}. "
+            f"Use uno de: {', '.join(FORMATOS_FIGURA)}"
+        )
+    # Sin fecha en los metadatos SVG, para que el contenido sea determinista
+    metadata = {"Date": None} if formato == "svg" else None
+    buf = io.BytesIO()
+    fig.savefig(buf, format=formato, bbox_inches="tight", dpi=dpi, metadata=metadata)
+    return buf.getvalue()
+
+
+@contextlib.contextmanager
+def _capturar_plotly(mostradas: List[Any]):
+    """
+    Sustituye temporalmente `plotly.io.show` (al que delega `fig.show()`)
+    para registrar las figuras mostradas en lugar de abrir un navegador.
+    """
+    import plotly.io as pio
+
+    original = pio.show
+
+    def registrar(fig, *args, **kwargs):
+        mostradas.append(fig)
+
+    pio.show = registrar
+    try:
+        yield
+    finally:
+        pio.show = original
+
+
+def figuras_plotly(mostradas: List[Any], namespace: Dict[str, Any]) -> List[Any]:
+    """
+    Figuras de Plotly de una ejecución: las mostradas con `show()`, en orden,
+    y después las que quedaron asignadas a una variable sin mostrarse.
+    """
+    from plotly.basedatatypes import BaseFigure
+
+    figuras = []
+    vistas = set()
+    candidatas = list(mostradas) + [
+        valor for nombre, valor in namespace.items() if not nombre.startswith("_")
+    ]
+    for fig in candidatas:
+        if isinstance(fig, BaseFigure) and id(fig) not in vistas:
+            vistas.add(id(fig))
+            figuras.append(fig)
+    return figuras
+
+
+def serializar_figura_plotly(fig) -> str:
+    """JSON compacto de una figura de Plotly, listo para `gr.Plot` en el cliente."""
+    import plotly.io as pio
+
+    return pio.to_json(fig, validate=False, pretty=False, remove_uids=True)
+
+
+# Nombres que el ejecutor inyecta en el namespace (no son variables creadas)
+NOMBRES_INYECTADOS = {"pd", "np", "plt", "sns", "px", "go", "df", "print"}
+
+_repr_corto = reprlib.Repr()
+_repr_corto.maxstring = 60
+_repr_corto.maxother = 60
+
+
+def _memoria_objeto(valor) -> int:
+    """Tamaño aproximado en bytes de un objeto, sin recorrer su contenido."""
+    memory_usage = getattr(valor, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            uso = memory_usage(index=True, deep=False)
+            return int(uso.sum()) if hasattr(uso, "sum") else int(uso)
+        except TypeError:
+            pass
+    nbytes = getattr(valor, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(valor)
+
+
+def resumir_variable(valor) -> Dict[str, Any]:
+    """Resumen ligero de una variable: tipo, forma, memoria y repr corto."""
+    forma = getattr(valor, "shape", None)
+    if forma is None and isinstance(valor, (list, tuple, dict, set, str)):
+        forma = (len(valor),)
+    tipo = type(valor).__name__
+    if forma is not None and hasattr(valor, "memory_usage"):
+        # El repr completo de un DataFrame es caro y no aporta en un resumen
+        representacion = f"<{tipo} {forma}>"
+    else:
+        representacion = _repr_corto.repr(valor)
+    return {
+        "tipo": tipo,
+        "forma": tuple(forma) if forma is not None else None,
+        "memoria_bytes": _memoria_objeto(valor),
+        "repr": representacion,
+    }
+
+
+class LimiteRecursosExcedido(Exception):
+    """Se lanza cuando una ejecución supera uno de sus límites de recursos."""
+
+    def __init__(self, recurso: str, mensaje: str):
+        super().__init__(mensaje)
+        self.recurso = recurso
+
+
+def _tiempo_cpu() -> float:
+    """Tiempo de CPU (usuario + sistema) consumido por el proceso actual."""
+    tiempos = os.times()
+    return tiempos.user + tiempos.system
+
+
+def ejecutar_codigo(
+    code: Union[str, CodeType],
+    df: "pd.DataFrame" = None,
+    max_figuras: Optional[int] = None,
+    opciones_figuras: Optional[Dict[str, Any]] = None,
+    conservar_variables: Optional[Iterable[str]] = None,
+    presupuesto_variables_mb: float = 50,
+    perfilar: bool = False,
+    al_renderizar: Optional[Callable[[str, str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Ejecuta código Python en el proceso actual y captura outputs y gráficas.
+    Es el núcleo compartido por la ejecución local y los trabajadores del pool.
+
+    Args:
+        code: Código Python a ejecutar, como texto o ya compilado
+        df: DataFrame opcional para pasar al código (o un DataFrameCompartido,
+            que se reconstruye desde memoria compartida)
+        max_figuras: Número máximo de figuras permitidas (None = sin límite)
+        opciones_figuras: "formato", "dpi" e "incluir_base64"; ver
+            `opciones_figuras_configuradas`
+        conservar_variables: Nombres de variables cuyo objeto se devuelve en
+            `objetos`, mientras quepan en `presupuesto_variables_mb`
+        perfilar: Si es True, `perfil` trae el tiempo por línea, las funciones
+            más costosas y el pico de memoria (ver `PerfilEjecucion`)
+        al_renderizar: Se llama con ("imagen", ruta) o ("plotly", json) en
+            cuanto cada figura está lista, antes de terminar la ejecución
+
+    Returns:
+        Diccionario con resultados, outputs y gráficas. Las figuras de
+        matplotlib se guardan como imagen (`figure_files`) y las de Plotly se
+        devuelven como JSON en `plotly_figures`. `variables` contiene
+        un resumen de cada variable creada (ver `resumir_variable`),
+        `limite_excedido` indica el recurso violado ("tiempo", "cpu",
+        "memoria" o "figuras") y `recursos` el tiempo, CPU y figuras consumidos.
+        El namespace de ejecución se libera antes de retornar.
+    """
+    libs = _cargar_librerias()
+    plt = libs["plt"]
+    opciones = {**opciones_figuras_configuradas(), **(opciones_figuras or {})}
+    if isinstance(df, DataFrameCompartido):
+        # Los buffers mapeados son de solo lectura: con una vista superficial
+        # (y el original vivo durante la ejecución) copy-on-write copia cada
+        # bloque antes de modificarlo en lugar de fallar
+        df_compartido = adjuntar_dataframe(df)
+        df = df_compartido.copy(deep=False)
+
+    # Limpiar figuras anteriores
+    plt.close("all")
+    figures = []
+    figure_files = []
+    plotly_mostradas: List[Any] = []
+    figs_plotly: List[Any] = []
+
+    # Capturar stdout
+    old_stdout = sys.stdout
+    captured_output = io.StringIO()
+
+    # Namespace seguro para ejecución: los módulos llegan como vistas
+    # restringidas y las importaciones pasan por la misma lista del validador
+    safe_namespace = {
+        **{nombre: ModuloRestringido(modulo) for nombre, modulo in libs.items()},
+        "df": df,
+        "print": print,
+        "__builtins__": {
+            "len": len,
+            "range": range,
+            "enumerate": enumerate,
+            "zip": zip,
+            "sum": sum,
+            "max": max,
+            "min": min,
+            "abs": abs,
+            "round": round,
+            "sorted": sorted,
+            "type": type,
+            "str": str,
+            "int": int,
+            "float": float,
+            "list": list,
+            "dict": dict,
+            "tuple": tuple,
+            "set": set,
+            "__import__": importar_restringido,
+        },
+    }
+
+    result = {
+        "success": False,
+        "output": "",
+        "error": "",
+        "figures": [],
+        "figure_files": [],
+        "plotly_figures": [],
+        "variables": {},
+        "objetos": {},
+        "limite_excedido": None,
+        "recursos": {},
+        "perfil": None,
+    }
+    perfil = PerfilEjecucion() if perfilar else None
+    inicio = time.perf_counter()
+    inicio_cpu = _tiempo_cpu()
+
+    try:
+        # Redirigir stdout
+        sys.stdout = captured_output
+
+        # Ejecutar código
+        with _capturar_plotly(plotly_mostradas):
+            with perfil.ejecucion() if perfil else contextlib.nullcontext():
+                exec(code, safe_namespace)
+
+        fig_nums = plt.get_fignums()
+        figs_plotly.extend(figuras_plotly(plotly_mostradas, safe_namespace))
+        total_figuras = len(fig_nums) + len(figs_plotly)
+        if max_figuras is not None and total_figuras > max_figuras:
+            raise LimiteRecursosExcedido(
+                "figuras",
+                f"El código generó {total_figuras} figuras; el máximo es {max_figuras}",
+            )
+
+        with perfil.renderizado() if perfil else contextlib.nullcontext():
+            # Capturar figuras de matplotlib: cada figura se renderiza una sola
+            # vez y el archivo (y el base64, si se pide) salen de los mismos bytes
+            for fig_num in fig_nums:
+                datos = renderizar_figura(
+                    plt.figure(fig_num), opciones["formato"], opciones["dpi"]
+                )
+                figure_files.append(
+                    get_figure_store().guardar(datos, opciones["formato"])
+                )
+                if opciones["incluir_base64"]:
+                    figures.append(base64.b64encode(datos).decode("utf-8"))
+                if al_renderizar:
+                    al_renderizar("imagen", figure_files[-1])
+
+            # Las figuras de Plotly no se rasterizan: se envían como JSON y el
+            # navegador las dibuja
+            for fig in figs_plotly:
+                result["plotly_figures"].append(serializar_figura_plotly(fig))
+                if al_renderizar:
+                    al_renderizar("plotly", result["plotly_figures"][-1])
+
+        result["success"] = True
+        result["output"] = captured_output.getvalue()
+        result["figures"] = figures
+        result["figure_files"] = figure_files
+
+        # Resumir las variables creadas; solo se conservan los objetos pedidos
+        conservar = set(conservar_variables or ())
+        presupuesto = presupuesto_variables_mb * 1024 * 1024
+        for nombre, valor in safe_namespace.items():
+            if nombre.startswith("_") or nombre in NOMBRES_INYECTADOS:
+                continue
+            if isinstance(valor, (type(sys), ModuloRestringido)):
+                continue
+            resumen = resumir_variable(valor)
+            resumen["conservado"] = False
+            if nombre in conservar and resumen["memoria_bytes"] <= presupuesto:
+                result["objetos"][nombre] = valor
+                resumen["conservado"] = True
+                presupuesto -= resumen["memoria_bytes"]
+            result["variables"][nombre] = resumen
+
+    except LimiteRecursosExcedido as e:
+        result["error"] = str(e)
+        result["limite_excedido"] = e.recurso
+        result["output"] = captured_output.getvalue()
+
+    except MemoryError:
+        result["error"] = "La ejecución superó el límite de memoria"
+        result["limite_excedido"] = "memoria"
+        result["output"] = captured_output.getvalue()
+
+    except Exception as e:
+        result["error"] = str(e)
+        result["output"] = captured_output.getvalue()
+
+    finally:
+        # Restaurar stdout
+        sys.stdout = old_stdout
+        result["recursos"] = {
+            "tiempo_s": round(time.perf_counter() - inicio, 3),
+            "cpu_s": round(_tiempo_cpu() - inicio_cpu, 3),
+            "figuras": len(plt.get_fignums()) + len(figs_plotly or plotly_mostradas),
+        }
+        plotly_mostradas.clear()
+        figs_plotly.clear()
+        if perfil:
+            # También en errores: el perfil muestra dónde se fue el tiempo
+            result["perfil"] = perfil.reporte()
+        plt.close("all")
+        # Liberar el namespace (y con él los DataFrames intermedios) ya mismo
+        safe_namespace.clear()
+
+    return result
+
+
 class SafeCodeExecutor:
     """Ejecutor seguro de código Python para análisis de datos y visualización"""
 
-    def __init__(self):
-        self.allowed_imports = {
-            "pandas",
-            "numpy",
-            "matplotlib",
-            "seaborn",
-            "plotly",
-            "scipy",
-            "sklearn",
-            "math",
-            "datetime",
-            "json",
+    def __init__(
+        self,
+        usar_pool: Optional[bool] = None,
+        limites: Optional[Dict[str, float]] = None,
+        opciones_figuras: Optional[Dict[str, Any]] = None,
+        usar_cache: bool = True,
+        conservar_variables: Optional[Iterable[str]] = None,
+        presupuesto_variables_mb: float = 50,
+        perfilar: bool = False,
+    ):
+        """
+        usar_pool: Si es True, el código se ejecuta en el pool de procesos
+            trabajadores; si es False, en el proceso actual. Por defecto se usa
+            el pool salvo que SANDBOX_POOL_SIZE sea 0.
+        limites: Límites por ejecución ("tiempo_s", "cpu_s", "memoria_mb",
+            "max_figuras"); los que falten se toman de `limites_configurados`.
+            Tiempo, CPU y memoria solo se pueden imponer en el pool.
+        opciones_figuras: Formato ("png", "webp" o "svg"), DPI y si se
+            incluye base64; los que falten se toman de
+            `opciones_figuras_configuradas`.
+        usar_cache: Si es True, un mismo código sobre los mismos datos
+            devuelve el resultado guardado sin volver a ejecutarse.
+        conservar_variables: Variables cuyo objeto se devuelve en
+            `objetos` (por defecto ninguna: solo resúmenes ligeros), hasta
+            `presupuesto_variables_mb` en total.
+        perfilar: Si es True, cada resultado incluye un `perfil` de la
+            ejecución. Perfilar la hace más lenta y omite la caché.
+        """
+        self.allowed_imports = set(MODULOS_PERMITIDOS)
+        self.usar_pool = pool_habilitado() if usar_pool is None else usar_pool
+        self.limites = {**limites_configurados(), **(limites or {})}
+        self.opciones_figuras = {
+            **opciones_figuras_configuradas(),
+            **(opciones_figuras or {}),
         }
+        if self.opciones_figuras["formato"] not in FORMATOS_FIGURA:
+            raise ValueError(
+                f"Formato de figura no soportado: {self.opciones_figuras['formato']}"
+            )
+        self.usar_cache = usar_cache
+        self.conservar_variables = list(conservar_variables or [])
+        self.presupuesto_variables_mb = presupuesto_variables_mb
+        self.perfilar = perfilar
         self.figures = []
         self.figure_files = []
-
-    def execute_code(self, code: str, df: pd.DataFrame = None) -> Dict[str, Any]:
+        self.plotly_figures = []
+
+    def _clave_cache(self, huella_codigo: str, df) -> tuple:
+        """Clave de la caché de resultados: código, datos y opciones."""
+        if df is None:
+            huella_df = None
+        elif isinstance(df, DataFrameCompartido) and df.huella:
+            huella_df = df.huella
+        elif isinstance(df, DataFrameCompartido):
+            huella_df = df.ruta
+        else:
+            huella_df = huella_dataframe(df)
+        return (
+            huella_codigo,
+            huella_df,
+            tuple(sorted(self.opciones_figuras.items())),
+            self.limites.get("max_figuras"),
+        )
+
+    def execute_code(
+        self,
+        code: str,
+        df: "pd.DataFrame" = None,
+        sesion: Optional[str] = None,
+        al_renderizar: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, Any]:
         """
         Ejecuta código Python de forma segura y captura outputs y gráficas
 
         Args:
             code: Código Python a ejecutar
-            df: DataFrame opcional para pasar al código
+            df: DataFrame opcional para pasar al código, o un
+                DataFrameCompartido publicado con `publicar_dataframe`
+            sesion: Sesión de Gradio dueña de las figuras generadas; sus
+                archivos se eliminan cuando la sesión termina
+            al_renderizar: Aviso por cada figura lista (ver `ejecutar_codigo`);
+                no se llama si el resultado sale de la caché
 
         Returns:
-            Diccionario con resultados, outputs y gráficas
+            Diccionario con resultados, outputs y gráficas; `desde_cache`
+            indica si el resultado salió de la caché de resultados
         """
-        # Limpiar figuras anteriores
-        plt.close("all")
-        self.figures = []
-        self.figure_files = []
-
-        # Capturar stdout
-        old_stdout = sys.stdout
-        captured_output = io.StringIO()
-
-        # Namespace seguro para ejecución
-        safe_namespace = {
-            "pd": pd,
-            "np": np,
-            "plt": plt,
-            "sns": sns,
-            "px": px,
-            "go": go,
-            "df": df,
-            "print": print,
-            "__builtins__": {
-                "len": len,
-                "range": range,
-                "enumerate": enumerate,
-                "zip": zip,
-                "sum": sum,
-                "max": max,
-                "min": min,
-                "abs": abs,
-                "round": round,
-                "sorted": sorted,
-                "type": type,
-                "str": str,
-                "int": int,
-                "float": float,
-                "list": list,
-                "dict": dict,
-                "tuple": tuple,
-                "set": set,
-                "__import__": __import__,
-            },
-        }
-
-        result = {
-            "success": False,
-            "output": "",
-            "error": "",
-            "figures": [],
-            "figure_files": [],
-            "variables": {},
-        }
-
-        try:
-            # Redirigir stdout
-            sys.stdout = captured_output
-
-            # Ejecutar código
-            exec(code, safe_namespace)
-
-            # Capturar figuras de matplotlib
-            for fig_num in plt.get_fignums():
-                fig = plt.figure(fig_num)
-
-                # Guardar como base64 (para mostrar)
-                buf = io.BytesIO()
-                fig.savefig(buf, format="png", bbox_inches="tight", dpi=150)
-                buf.seek(0)
-                img_base64 = base64.b64encode(buf.read()).decode("utf-8")
-                self.figures.append(img_base64)
-                buf.close()
-
-                # Guardar como archivo temporal (para descarga)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                temp_file = tempfile.NamedTemporaryFile(
-                    delete=False,
-                    suffix=f"_grafica_{fig_num}_{timestamp}.png",
-                    prefix="indicadores_",
-                )
-                fig.savefig(temp_file.name, format="png", bbox_inches="tight", dpi=150)
-                self.figure_files.append(temp_file.name)
-                temp_file.close()
-
-            result["success"] = True
-            result["output"] = captured_output.getvalue()
-            result["figures"] = self.figures
-            result["figure_files"] = self.figure_files
-
-            # Capturar variables creadas (opcional)
-            result["variables"] = {
-                k: v
-                for k, v in safe_namespace.items()
-                if not k.startswith("_")
-                and k not in ["pd", "np", "plt", "sns", "px", "go"]
-            }
-
-        except Exception as e:
-            result["error"] = str(e)
-            result["output"] = captured_output.getvalue()
-
-        finally:
-            # Restaurar stdout
-            sys.stdout = old_stdout
-
+        # La validación y la compilación se cachean por hash del código
+        validado = validar_codigo(code, self.allowed_imports)
+        if not validado.valido:
+            return resultado_error(f"Código no seguro: {validado.mensaje}")
+        code = validado.codigo
+
+        # Los objetos conservados no se guardan en la caché de resultados, y un
+        # resultado cacheado no tendría un perfil de esta ejecución
+        usar_cache = (
+            self.usar_cache and not self.conservar_variables and not self.perfilar
+        )
+        clave = self._clave_cache(validado.huella, df) if usar_cache else None
+        result = get_result_cache().obtener(clave) if clave else None
+        if result is not None:
+            result["desde_cache"] = True
+        elif self.usar_pool:
+            result = get_sandbox_pool().ejecutar(
+                code,
+                df,
+                limites=self.limites,
+                opciones_figuras=self.opciones_figuras,
+                conservar_variables=self.conservar_variables,
+                presupuesto_variables_mb=self.presupuesto_variables_mb,
+                perfilar=self.perfilar,
+                al_renderizar=al_renderizar,
+            )
+        else:
+            result = ejecutar_codigo(
+                code,
+                df,
+                max_figuras=self.limites.get("max_figuras"),
+                opciones_figuras=self.opciones_figuras,
+                conservar_variables=self.conservar_variables,
+                presupuesto_variables_mb=self.presupuesto_variables_mb,
+                perfilar=self.perfilar,
+                al_renderizar=al_renderizar,
+            )
+        if not result.get("desde_cache"):
+            result["desde_cache"] = False
+            if clave:
+                get_result_cache().guardar(clave, result)
+
+        if sesion:
+            store = get_figure_store()
+            for ruta in result["figure_files"]:
+                store.registrar(ruta, sesion)
+
+        self.figures = result["figures"]
+        self.figure_files = result["figure_files"]
+        self.plotly_figures = result["plotly_figures"]
         return result
 
     def validate_code(self, code: str) -> Tuple[bool, str]:
-        """Valida que el código sea seguro de ejecutar"""
-        dangerous_keywords = [
-            "import os",
-            "import subprocess",
-            "import sys",
-            "exec(",
-            "eval(",
-            "open(",
-            "__import__",
-            "compile(",
-            "globals()",
-            "locals()",
-            "file",
-            "input(",
-            "raw_input(",
-        ]
-
-        for keyword in dangerous_keywords:
-            if keyword in code:
-                return False, f"Código contiene operación peligrosa: {keyword}"
-
-        return True, "Código válido"
+        """
+        Valida que el código sea seguro de ejecutar.
+        Retorna (es_valido, mensaje); el mensaje lista cada violación con su
+        número de línea.
+        """
+        validado = validar_codigo(code, self.allowed_imports)
+        return validado.valido, validado.mensaje
 
 
 # Ejemplo de uso
 if __name__ == "__main__":
+    import pandas as pd
+
     executor = SafeCodeExecutor()
 
     # Crear datos de ejemplo
@@ -218,6 +590,7 @@ plt.show()
     if result["success"]:
         print("Código ejecutado exitosamente!")
         print("Output:", result["output"])
-        print(f"Se generaron {len(result['figures'])} gráficas")
+        print(f"Se generaron {len(result['figure_files'])} gráficas")
+        print(f"Figuras de Plotly: {len(result['plotly_figures'])}")
     else:
         print("Error:", result["error"])
@@ -0,0 +1,956 @@
+import ast
+import re
+import sys
+import builtins
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from types import CodeType, ModuleType
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Nombre de archivo con el que se compila el código generado (aparece en
+# tracebacks y lo usan los perfiles de ejecución)
+NOMBRE_CODIGO_GENERADO = "<codigo_generado>"
+
+# Módulos de primer nivel que el código generado puede importar
+MODULOS_PERMITIDOS = frozenset(
+    {
+        "pandas",
+        "numpy",
+        "matplotlib",
+        "seaborn",
+        "plotly",
+        "scipy",
+        "sklearn",
+        "math",
+        "datetime",
+        "json",
+        "warnings",
+        "statistics",
+        "collections",
+        "itertools",
+        "functools",
+        "calendar",
+    }
+)
+
+# Submódulos (con sus descendientes) que habilita cada módulo permitido, por
+# su nombre real: son los únicos que se pueden importar o alcanzar desde un
+# atributo. Cualquier otro, como pandas.io o numpy.lib, queda fuera
+SUBMODULOS_PERMITIDOS: Dict[str, Tuple[str, ...]] = {
+    "pandas": (
+        "pandas.api",
+        "pandas.arrays",
+        "pandas.errors",
+        "pandas.plotting",
+        "pandas.tseries.offsets",
+    ),
+    "numpy": (
+        "numpy.random",
+        "numpy.linalg",
+        "numpy.fft",
+        "numpy.ma",
+        "numpy.polynomial",
+        "numpy.char",
+        "numpy.strings",
+        "numpy.dtypes",
+        "numpy.lib.scimath",
+    ),
+    "matplotlib": (
+        "matplotlib.pyplot",
+        "matplotlib.cm",
+        "matplotlib.colors",
+        "matplotlib.ticker",
+        "matplotlib.dates",
+        "matplotlib.patches",
+        "matplotlib.gridspec",
+        "matplotlib.lines",
+        "matplotlib.markers",
+        "matplotlib.style",
+    ),
+    "plotly": (
+        "plotly.express",
+        "plotly.graph_objects",
+        "plotly.graph_objs",
+        "plotly.subplots",
+        "plotly.colors",
+        "plotly.figure_factory",
+        # Paletas a las que apunta plotly.express.colors
+        "_plotly_utils.colors",
+    ),
+    "scipy": (
+        "scipy.stats",
+        "scipy.optimize",
+        "scipy.interpolate",
+        "scipy.signal",
+        "scipy.cluster",
+        "scipy.spatial",
+        "scipy.special",
+        "scipy.linalg",
+    ),
+    "sklearn": (
+        "sklearn.linear_model",
+        "sklearn.cluster",
+        "sklearn.preprocessing",
+        "sklearn.metrics",
+        "sklearn.model_selection",
+        "sklearn.decomposition",
+        "sklearn.ensemble",
+        "sklearn.tree",
+        "sklearn.neighbors",
+        "sklearn.pipeline",
+        "sklearn.impute",
+        "sklearn.feature_selection",
+    ),
+    "collections": ("collections.abc",),
+}
+
+# Atributos en minúscula que se pueden recorrer (seguidos de otro atributo)
+# en una cadena que empieza en un módulo de cada raíz, p. ej. `np.random.rand`
+# o `pd.options.display.max_rows`. Un atributo con mayúscula inicial es una
+# clase (`pd.DataFrame.from_dict`) y termina la parte del módulo
+RECORRIDOS_PERMITIDOS: Dict[str, FrozenSet[str]] = {
+    "pandas": frozenset(
+        {
+            "api",
+            "types",
+            "extensions",
+            "arrays",
+            "errors",
+            "plotting",
+            "tseries",
+            "offsets",
+            "options",
+            "display",
+            "mode",
+        }
+    ),
+    "numpy": frozenset(
+        {
+            "random",
+            "linalg",
+            "fft",
+            "ma",
+            "polynomial",
+            "char",
+            "strings",
+            "dtypes",
+            "emath",
+        }
+    ),
+    "matplotlib": frozenset(
+        {
+            "pyplot",
+            "cm",
+            "colors",
+            "ticker",
+            "dates",
+            "patches",
+            "gridspec",
+            "lines",
+            "markers",
+            "style",
+            "rcParams",
+        }
+    ),
+    "plotly": frozenset(
+        {
+            "express",
+            "graph_objects",
+            "graph_objs",
+            "subplots",
+            "figure_factory",
+            "colors",
+            "qualitative",
+            "sequential",
+            "diverging",
+            "cyclical",
+            "layout",
+            "scatter",
+            "bar",
+            "pie",
+            "histogram",
+            "box",
+            "heatmap",
+            "indicator",
+            "table",
+            "funnel",
+            "waterfall",
+            "treemap",
+            "sunburst",
+            "violin",
+        }
+    ),
+    "scipy": frozenset(
+        {
+            "stats",
+            "optimize",
+            "interpolate",
+            "signal",
+            "cluster",
+            "spatial",
+            "special",
+            "linalg",
+            "mstats",
+            # Distribuciones de scipy.stats
+            "norm",
+            "t",
+            "chi2",
+            "f",
+            "binom",
+            "poisson",
+            "expon",
+            "uniform",
+            "lognorm",
+            "gamma",
+            "beta",
+        }
+    ),
+    "sklearn": frozenset(
+        {
+            "linear_model",
+            "cluster",
+            "preprocessing",
+            "metrics",
+            "model_selection",
+            "decomposition",
+            "ensemble",
+            "tree",
+            "neighbors",
+            "pipeline",
+            "impute",
+            "feature_selection",
+        }
+    ),
+    "datetime": frozenset({"datetime", "date", "time", "timedelta", "timezone"}),
+    "collections": frozenset({"abc"}),
+}
+
+# Módulos que el ejecutor inyecta en el namespace, por nombre de variable
+MODULOS_INYECTADOS = {
+    "pd": "pandas",
+    "np": "numpy",
+    "plt": "matplotlib.pyplot",
+    "sns": "seaborn",
+    "px": "plotly.express",
+    "go": "plotly.graph_objects",
+}
+
+# Funciones que permiten escapar del namespace restringido o tocar el sistema
+NOMBRES_PROHIBIDOS = {
+    "eval",
+    "exec",
+    "compile",
+    "open",
+    "input",
+    "raw_input",
+    "globals",
+    "locals",
+    "vars",
+    "dir",
+    "getattr",
+    "setattr",
+    "delattr",
+    "breakpoint",
+    "help",
+    "exit",
+    "quit",
+    "memoryview",
+}
+
+# Atributos que el código generado puede usar, en cualquier objeto o
+# módulo, agrupados por la librería que los define. Todo lo que no está aquí
+# se rechaza: así quedan fuera los métodos que leen o escriben archivos
+# (`to_pickle`, `ndarray.dump`, `np.fromregex`, `canvas.print_png`...)
+# aunque una versión nueva de la librería agregue otros
+ATRIBUTOS_POR_LIBRERIA: Dict[str, FrozenSet[str]] = {
+    "str": frozenset("""
+        lower upper strip lstrip rstrip split rsplit join replace startswith
+        endswith format title capitalize center ljust rjust zfill count find
+        isdigit isnumeric isalpha isalnum isspace isupper islower splitlines
+        casefold partition removeprefix removesuffix
+        """.split()),
+    "colecciones": frozenset("""
+        append extend insert pop remove sort reverse copy index clear items keys
+        values get update setdefault popitem fromkeys add discard union
+        intersection difference symmetric_difference issubset issuperset
+        """.split()),
+    "numeros": frozenset("""
+        real imag is_integer
+        """.split()),
+    "pandas": frozenset("""
+        DataFrame Series Index MultiIndex DatetimeIndex Categorical
+        CategoricalDtype Timestamp Timedelta Period NaT NA Grouper NamedAgg
+        IndexSlice concat merge merge_asof pivot_table pivot crosstab cut qcut
+        melt get_dummies to_datetime to_numeric to_timedelta date_range
+        period_range timedelta_range isna isnull notna notnull unique factorize
+        set_option option_context from_dict from_records DateOffset MonthEnd
+        MonthBegin QuarterEnd YearEnd Week Day BDay
+        """.split()),
+    "pandas.api": frozenset("""
+        is_numeric_dtype is_datetime64_any_dtype is_string_dtype is_bool_dtype
+        is_object_dtype is_float_dtype is_integer_dtype max_rows max_columns
+        width precision float_format chained_assignment
+        """.split()),
+    "pandas.DataFrame": frozenset("""
+        head tail describe info sum mean median min max std var nunique unique
+        value_counts mode quantile prod cumsum cumprod cummax cummin rank abs
+        round clip idxmax idxmin nlargest nsmallest sort_values sort_index
+        groupby agg aggregate apply transform pipe map resample rolling
+        expanding ewm shift diff pct_change corr cov corrwith fillna dropna isin
+        ffill bfill interpolate astype rename rename_axis drop drop_duplicates
+        duplicated reset_index set_index reindex join stack unstack explode
+        assign where mask between filter select_dtypes loc iloc at iat columns
+        index dtypes dtype shape size ndim empty T transpose name names plot
+        hist boxplot style to_dict to_list tolist to_numpy to_frame to_period
+        to_timestamp to_string to_json to_html to_markdown to_latex to_xml
+        to_flat_index iterrows itertuples any all sample first_valid_index
+        last_valid_index dt str cat categories codes ordered sub mul div truediv
+        floordiv mod pow eq ne lt le gt ge sem skew kurt kurtosis squeeze
+        combine_first align is_unique is_monotonic_increasing
+        is_monotonic_decreasing hasnans array memory_usage convert_dtypes
+        infer_objects droplevel swaplevel set_axis axes xs asfreq tz_localize
+        tz_convert ngroups groups get_group cumcount ngroup nth first last ohlc
+        reorder_categories set_categories add_categories
+        remove_unused_categories as_ordered levels get_level_values argmax
+        argmin argsort searchsorted dot bar barh line pie box scatter area kde
+        density hexbin background_gradient highlight_max highlight_min
+        set_caption
+        """.split()),
+    "pandas.dt": frozenset("""
+        year month day hour minute second dayofweek day_of_week weekday
+        dayofyear day_of_year quarter isocalendar week month_name day_name date
+        time normalize strftime floor ceil days_in_month days seconds
+        total_seconds components is_month_end is_month_start is_quarter_end
+        is_year_end start_time end_time now today freq tz
+        """.split()),
+    "pandas.str": frozenset("""
+        contains len slice extract extractall findall match fullmatch pad cat
+        wrap
+        """.split()),
+    "numpy": frozenset("""
+        array asarray arange linspace logspace zeros ones full empty eye
+        zeros_like ones_like full_like average percentile nanmean nanmedian
+        nanstd nanvar nansum nanmin nanmax nanpercentile absolute sqrt exp log
+        log10 log2 log1p power square around isnan isinf isfinite nan inf pi e
+        histogram histogram_bin_edges digitize bincount corrcoef polyfit polyval
+        poly1d gradient convolve concatenate vstack hstack column_stack reshape
+        ravel flatten tile repeat meshgrid maximum minimum sign cos sin tan
+        arctan arctan2 radians degrees matmul outer interp trapezoid
+        count_nonzero nonzero logical_and logical_or logical_not intersect1d
+        union1d setdiff1d array_split float64 float32 int64 int32 bool_
+        datetime64 timedelta64 number integer floating newaxis nan_to_num
+        errstate isclose allclose array_equal ptp triu tril diag flip roll
+        select item fill issubdtype mean median std var amin amax
+        """.split()),
+    "numpy.random": frozenset("""
+        rand randn randint choice seed normal uniform default_rng integers
+        random shuffle permutation exponential poisson binomial lognormal norm
+        inv det eig eigvals solve lstsq svd pinv
+        """.split()),
+    "matplotlib.pyplot": frozenset("""
+        figure title xlabel ylabel xticks yticks xlim ylim legend grid
+        tight_layout show subplot subplots axhline axvline axhspan axvspan
+        annotate text fill_between errorbar stackplot step stem imshow colorbar
+        gca gcf close suptitle use get_cmap colormaps figtext margins twinx
+        twiny subplots_adjust semilogy semilogx loglog hlines vlines contour
+        contourf pcolormesh violinplot axis xscale yscale setp available
+        """.split()),
+    "matplotlib.Axes": frozenset("""
+        set_title set_xlabel set_ylabel set_xticks set_xticklabels set_yticks
+        set_yticklabels set_xlim set_ylim set tick_params invert_yaxis
+        invert_xaxis xaxis yaxis set_major_formatter set_major_locator
+        set_minor_locator get_xticklabels get_yticklabels
+        get_legend_handles_labels bar_label patches containers get_height
+        get_width get_x get_y set_rotation set_ha set_color spines set_visible
+        set_aspect transAxes add_subplot set_size_inches get_xlim get_ylim
+        set_label set_facecolor set_alpha lines set_yscale set_xscale get_legend
+        autofmt_xdate flat
+        """.split()),
+    "matplotlib.colors": frozenset("""
+        Normalize LinearSegmentedColormap ListedColormap to_hex to_rgba
+        PercentFormatter FuncFormatter MaxNLocator StrMethodFormatter
+        MultipleLocator DateFormatter MonthLocator YearLocator DayLocator
+        WeekdayLocator AutoDateLocator ConciseDateFormatter date2num num2date
+        viridis plasma inferno magma cividis Blues Greens Reds Oranges Purples
+        Greys RdYlGn coolwarm tab10 tab20 Set1 Set2 Set3 Pastel1 Pastel2 Paired
+        Dark2 Spectral YlOrRd YlGnBu RdBu
+        """.split()),
+    "seaborn": frozenset("""
+        barplot lineplot scatterplot histplot heatmap countplot pointplot
+        kdeplot displot catplot relplot pairplot jointplot lmplot regplot
+        stripplot swarmplot ecdfplot rugplot set_theme set_style set_palette
+        set_context color_palette despine move_legend light_palette dark_palette
+        diverging_palette FacetGrid map_dataframe add_legend set_axis_labels
+        set_titles fig ax
+        """.split()),
+    "plotly.express": frozenset("""
+        line funnel treemap sunburst density_heatmap scatter_matrix timeline
+        strip ecdf violin histogram Plotly D3 G10 T10 Alphabet Dark24 Light24
+        Pastel Bold Safe Vivid Prism Viridis Plasma Bluered Teal
+        """.split()),
+    "plotly.graph_objects": frozenset("""
+        Figure Bar Scatter Pie Histogram Box Violin Heatmap Indicator Table
+        Funnel Waterfall Treemap Sunburst Scatterpolar Layout Title Marker Line
+        update_layout update_traces update_xaxes update_yaxes add_trace
+        add_traces add_hline add_vline add_hrect add_vrect add_annotation
+        add_shape add_bar add_scatter data layout for_each_trace
+        update_annotations make_subplots n_colors sample_colorscale hex_to_rgb
+        """.split()),
+    "math": frozenset("""
+        fabs fsum comb factorial hypot trunc gcd atan2 atan stdev pstdev
+        variance pvariance quantiles fmean geometric_mean harmonic_mean
+        correlation linear_regression
+        """.split()),
+    "datetime": frozenset("""
+        datetime timedelta timezone utc strptime fromisoformat isoformat
+        isoweekday timestamp Counter defaultdict OrderedDict namedtuple deque
+        most_common elements chain combinations permutations product islice
+        accumulate zip_longest from_iterable reduce partial month_abbr day_abbr
+        monthrange isleap
+        """.split()),
+    "json": frozenset("""
+        dumps loads filterwarnings simplefilter catch_warnings warn
+        """.split()),
+    "scipy": frozenset("""
+        pearsonr spearmanr kendalltau ttest_ind ttest_rel ttest_1samp
+        chi2_contingency f_oneway mannwhitneyu kruskal shapiro normaltest
+        linregress zscore pdf cdf ppf sf rvs fit interval iqr skew
+        percentileofscore gaussian_kde wilcoxon levene trim_mean statistic
+        pvalue slope intercept rvalue curve_fit minimize interp1d savgol_filter
+        find_peaks
+        """.split()),
+    "sklearn": frozenset("""
+        LinearRegression LogisticRegression Ridge Lasso KMeans DBSCAN
+        StandardScaler MinMaxScaler LabelEncoder OneHotEncoder
+        PolynomialFeatures PCA train_test_split cross_val_score r2_score
+        mean_squared_error mean_absolute_error accuracy_score confusion_matrix
+        classification_report silhouette_score RandomForestRegressor
+        RandomForestClassifier DecisionTreeRegressor DecisionTreeClassifier
+        KNeighborsClassifier SimpleImputer Pipeline make_pipeline
+        IsolationForest predict predict_proba fit_transform inverse_transform
+        score coef_ intercept_ labels_ cluster_centers_
+        explained_variance_ratio_ components_ inertia_ feature_importances_
+        """.split()),
+}
+
+ATRIBUTOS_PERMITIDOS: FrozenSet[str] = frozenset().union(
+    *ATRIBUTOS_POR_LIBRERIA.values(), *RECORRIDOS_PERMITIDOS.values()
+)
+
+# Métodos que evalúan expresiones escritas en texto
+ATRIBUTOS_EVALUACION = {"eval", "query"}
+
+# Métodos que retornan o imprimen texto si no reciben una ruta, pero escriben
+# un archivo si la reciben (como primer argumento o con alguno de
+# ARGUMENTOS_RUTA)
+ESCRITURA_CON_RUTA = {
+    "to_json",
+    "to_html",
+    "to_latex",
+    "to_markdown",
+    "to_string",
+    "to_xml",
+    "info",
+}
+ARGUMENTOS_RUTA = {"buf", "path_or_buf", "path_or_buffer", "path"}
+
+# Métodos que reciben la función a aplicar y aceptan su nombre en texto
+# (`df.agg("sum")`): solo se pueden llamar directamente y con una función
+# segura (ver `_VisitanteSeguridad._funcion_segura`). pivot_table, crosstab y
+# NamedAgg reciben la suya en `aggfunc`, que se revisa en cualquier llamada
+ATRIBUTOS_DESPACHO = {"agg", "aggregate", "apply", "transform", "pipe"}
+FUNCIONES_DESPACHO = ATRIBUTOS_DESPACHO | {"pivot_table", "crosstab", "NamedAgg"}
+
+# Nombres que se pueden despachar en texto: los atributos permitidos salvo
+# los que escriben con una ruta y los propios métodos de despacho
+NOMBRES_DESPACHABLES = ATRIBUTOS_PERMITIDOS - ESCRITURA_CON_RUTA - FUNCIONES_DESPACHO
+
+# Funciones integradas que se pueden pasar a un método de despacho
+FUNCIONES_INTEGRADAS = {
+    "len",
+    "sum",
+    "max",
+    "min",
+    "abs",
+    "round",
+    "sorted",
+    "str",
+    "int",
+    "float",
+    "list",
+    "tuple",
+    "set",
+}
+
+# Opciones de pandas que se pueden cambiar con set_option/option_context (el
+# resto, como plotting.backend, importa módulos por nombre)
+PREFIJOS_OPCIONES = ("display.", "mode.chained_assignment")
+
+# `use` (plt.style.use, matplotlib.use) también acepta rutas y módulos: solo
+# se permiten nombres de estilo o backend escritos en el código
+_NOMBRE_ESTILO = re.compile(r"[\w-]+\Z")
+
+# Campo de str.format que accede a un atributo o índice, como "{0.attr}"
+_CAMPO_CON_ATRIBUTO = re.compile(r"\{[^{}:!]*[.\[][^{}]*\}")
+
+
+def modulo_permitido(
+    nombre: str, modulos_permitidos: Iterable[str] = MODULOS_PERMITIDOS
+) -> bool:
+    """
+    Indica si un módulo, por su nombre completo, es uno de los permitidos de
+    primer nivel o un submódulo que alguno de ellos habilita.
+    """
+    modulos_permitidos = set(modulos_permitidos)
+    if nombre in modulos_permitidos:
+        return True
+    return any(
+        nombre == submodulo or nombre.startswith(submodulo + ".")
+        for raiz in modulos_permitidos
+        for submodulo in SUBMODULOS_PERMITIDOS.get(raiz, ())
+    )
+
+
+class ModuloRestringido:
+    """
+    Vista de un módulo para el código generado. Niega los atributos privados
+    y los submódulos que no estén permitidos (ver `modulo_permitido`), y
+    envuelve los que sí lo están; no se puede modificar.
+    """
+
+    __slots__ = ("_modulo",)
+
+    def __init__(self, modulo: ModuleType):
+        object.__setattr__(self, "_modulo", modulo)
+
+    def __getattribute__(self, nombre: str):
+        if nombre.startswith("_"):
+            raise AttributeError(f"acceso a '{nombre}' no permitido")
+        modulo = object.__getattribute__(self, "_modulo")
+        valor = getattr(modulo, nombre)
+        if isinstance(valor, ModuleType):
+            return restringir_modulo(valor)
+        return valor
+
+    def __setattr__(self, nombre: str, valor):
+        raise AttributeError("los módulos no se pueden modificar")
+
+    def __delattr__(self, nombre: str):
+        raise AttributeError("los módulos no se pueden modificar")
+
+    def __dir__(self):
+        modulo = object.__getattribute__(self, "_modulo")
+        return [nombre for nombre in dir(modulo) if not nombre.startswith("_")]
+
+    def __repr__(self):
+        return f"<módulo {object.__getattribute__(self, '_modulo').__name__}>"
+
+
+def restringir_modulo(modulo: ModuleType) -> ModuloRestringido:
+    """Envuelve un módulo permitido; lanza AttributeError si no lo está."""
+    if not modulo_permitido(modulo.__name__):
+        raise AttributeError(f"acceso al módulo '{modulo.__name__}' no permitido")
+    return ModuloRestringido(modulo)
+
+
+def importar_restringido(nombre, globals=None, locals=None, fromlist=(), level=0):
+    """
+    Reemplazo de `__import__` para el código generado: aplica en ejecución
+    la misma lista de módulos que el validador y retorna vistas restringidas.
+    """
+    if isinstance(fromlist, list):
+        # Las librerías que importan desde C (PyImport_Import) usan el
+        # __import__ del frame en curso y pasan una lista; las sentencias
+        # import del código generado pasan None o una tupla, y el validador
+        # no deja llamar a __import__ directamente
+        return __import__(nombre, globals, locals, fromlist, level)
+    if level:
+        raise ImportError("importaciones relativas no permitidas")
+    if not modulo_permitido(nombre):
+        raise ImportError(f"importación no permitida: {nombre}")
+    modulo = importlib.import_module(nombre)
+    if not fromlist:
+        # `import a.b` enlaza el paquete de primer nivel
+        return ModuloRestringido(sys.modules[nombre.partition(".")[0]])
+    for nombre_importado in fromlist:
+        # `from a import b` con b submódulo aún no importado
+        submodulo = f"{nombre}.{nombre_importado}"
+        if not hasattr(modulo, nombre_importado) and modulo_permitido(submodulo):
+            try:
+                importlib.import_module(submodulo)
+            except ImportError:
+                pass
+    return ModuloRestringido(modulo)
+
+
+# Entradas en la caché de código validado y compilado
+MAX_CACHE_CODIGO = 256
+
+
+class CodigoValidado:
+    """Resultado de validar un código: errores con número de línea y bytecode."""
+
+    def __init__(self, huella: str, errores: List[str], codigo: Optional[CodeType]):
+        self.huella = huella
+        self.errores = errores
+        self.codigo = codigo
+
+    @property
+    def valido(self) -> bool:
+        return not self.errores
+
+    @property
+    def mensaje(self) -> str:
+        return "Código válido" if self.valido else "; ".join(self.errores)
+
+
+class _VisitanteSeguridad(ast.NodeVisitor):
+    """Recorre el AST una vez y acumula las violaciones encontradas."""
+
+    def __init__(self, modulos_permitidos: FrozenSet[str]):
+        self.modulos_permitidos = modulos_permitidos
+        self.errores: List[str] = []
+        # Variables enlazadas a un módulo: las inyectadas y las importadas
+        self.modulos: Dict[str, str] = dict(MODULOS_INYECTADOS)
+        # Nombres importados con `from m import x`: (módulo, atributo)
+        self.importados: Dict[str, Tuple[str, str]] = {}
+        # Funciones definidas con `def` y nombres enlazados de otra forma
+        # (asignaciones, parámetros, bucles...); los completa `visit_Module`
+        self.funciones: set = set()
+        self.reasignados: set = set()
+        self._cadenas_revisadas: set = set()
+        self._despachos: set = set()
+
+    def _error(self, nodo: ast.AST, mensaje: str):
+        self.errores.append(f"Línea {getattr(nodo, 'lineno', '?')}: {mensaje}")
+
+    def _validar_modulo(self, nodo: ast.AST, modulo: str) -> bool:
+        if not modulo_permitido(modulo, self.modulos_permitidos):
+            self._error(nodo, f"importación no permitida: {modulo}")
+            return False
+        return True
+
+    def _validar_nombre_atributo(self, nodo: ast.AST, nombre: str):
+        """Reglas que se aplican a cada atributo, en cualquier objeto."""
+        if nombre.startswith("__"):
+            self._error(nodo, f"acceso al atributo interno '{nombre}' no permitido")
+        elif nombre in ATRIBUTOS_EVALUACION:
+            self._error(
+                nodo,
+                f"'{nombre}' evalúa expresiones en texto y no está permitido; "
+                "usa indexación booleana",
+            )
+        elif nombre not in ATRIBUTOS_PERMITIDOS:
+            self._error(
+                nodo,
+                f"'{nombre}' no está entre los atributos permitidos (las "
+                'columnas se leen con df["columna"])',
+            )
+
+    def _validar_cadena_modulo(self, nodo: ast.Attribute):
+        """
+        Valida una cadena de atributos que empieza en un módulo contra la
+        lista de recorridos permitidos de su raíz.
+        """
+        atributos = []
+        actual: ast.AST = nodo
+        while isinstance(actual, ast.Attribute):
+            self._cadenas_revisadas.add(id(actual))
+            atributos.append(actual.attr)
+            actual = actual.value
+        if not isinstance(actual, ast.Name) or actual.id not in self.modulos:
+            return
+        atributos.reverse()
+        ruta = self.modulos[actual.id]
+        permitidos = RECORRIDOS_PERMITIDOS.get(ruta.partition(".")[0], frozenset())
+        recorrido = actual.id
+        for posicion, atributo in enumerate(atributos):
+            recorrido += f".{atributo}"
+            if atributo not in ATRIBUTOS_PERMITIDOS or atributo.startswith("__"):
+                # Ya lo reporta la regla de cada atributo
+                return
+            if atributo.startswith("_"):
+                self._error(nodo, f"acceso a '{recorrido}' no permitido")
+                return
+            es_ultimo = posicion == len(atributos) - 1
+            if es_ultimo or atributo[0].isupper():
+                return
+            if atributo not in permitidos:
+                self._error(
+                    nodo,
+                    f"'{recorrido}' no está entre los módulos y objetos permitidos",
+                )
+                return
+
+    def _resolver(self, nodo: ast.AST):
+        """
+        Objeto real al que se refiere un nombre importado, una función
+        integrada o una cadena de atributos desde un módulo (`np.mean`,
+        `pd.Series.sum`); lanza LookupError si no es uno de esos o si el
+        nombre se reasigna en el código.
+        """
+        atributos = []
+        while isinstance(nodo, ast.Attribute):
+            atributos.append(nodo.attr)
+            nodo = nodo.value
+        if not isinstance(nodo, ast.Name) or nodo.id in self.reasignados:
+            raise LookupError(nodo)
+        if nodo.id in self.modulos:
+            objeto = importlib.import_module(self.modulos[nodo.id])
+        elif nodo.id in self.importados:
+            modulo, nombre = self.importados[nodo.id]
+            objeto = getattr(importlib.import_module(modulo), nombre)
+        elif nodo.id in FUNCIONES_INTEGRADAS:
+            objeto = getattr(builtins, nodo.id)
+        else:
+            raise LookupError(nodo)
+        for atributo in reversed(atributos):
+            if atributo not in ATRIBUTOS_PERMITIDOS:
+                raise LookupError(atributo)
+            objeto = getattr(objeto, atributo)
+        return objeto
+
+    def _funcion_segura(self, nodo: ast.AST) -> bool:
+        """
+        Si lo que recibe un método de despacho no puede ser el nombre en
+        texto de un método no permitido: una lambda, una función definida
+        con `def`, una función de un módulo o integrada, el nombre escrito de
+        un método permitido, o listas y diccionarios de esas.
+        """
+        if isinstance(nodo, ast.Constant):
+            return nodo.value in NOMBRES_DESPACHABLES
+        if isinstance(nodo, ast.Lambda):
+            return True
+        if isinstance(nodo, (ast.List, ast.Tuple, ast.Set)):
+            return all(self._funcion_segura(elemento) for elemento in nodo.elts)
+        if isinstance(nodo, ast.Dict):
+            # {columna: función}: las claves son columnas
+            return None not in nodo.keys and all(
+                self._funcion_segura(valor) for valor in nodo.values
+            )
+        if isinstance(nodo, ast.Name) and nodo.id in self.funciones:
+            return nodo.id not in self.reasignados
+        try:
+            objeto = self._resolver(nodo)
+        except Exception:
+            return False
+        return callable(objeto) and not isinstance(objeto, str)
+
+    def _validar_despacho(self, nodo: ast.Call, nombre: str, es_metodo: bool):
+        """Revisa la función que recibe una llamada de despacho (o `aggfunc`)."""
+        funciones = [kw.value for kw in nodo.keywords if kw.arg == "aggfunc"]
+        if nombre in FUNCIONES_DESPACHO:
+            if any(isinstance(a, ast.Starred) for a in nodo.args) or any(
+                kw.arg is None for kw in nodo.keywords
+            ):
+                self._error(nodo, f"'{nombre}' no admite argumentos con * ni **")
+                return
+            if nombre == "NamedAgg":
+                funciones += nodo.args[1:2]
+            elif nombre in ("pivot_table", "crosstab") and len(nodo.args) > 3:
+                self._error(nodo, f"'{nombre}' recibe aggfunc por nombre")
+                return
+            elif es_metodo and nombre in ATRIBUTOS_DESPACHO:
+                funciones += nodo.args[:1]
+                funciones += [kw.value for kw in nodo.keywords if kw.arg == "func"]
+                if nombre in ("agg", "aggregate"):
+                    # Agregación con nombre: total=("columna", función) o NamedAgg
+                    for kw in nodo.keywords:
+                        if kw.arg in ("func", "axis"):
+                            continue
+                        valor = kw.value
+                        if isinstance(valor, ast.Tuple) and len(valor.elts) == 2:
+                            valor = valor.elts[1]
+                        elif self._nombre_llamada(valor) == "NamedAgg":
+                            continue
+                        funciones.append(valor)
+        for funcion in funciones:
+            if not self._funcion_segura(funcion):
+                self._error(
+                    nodo,
+                    f"'{nombre}' solo admite una función, una lambda o el "
+                    'nombre escrito de una agregación permitida (p. ej. "sum")',
+                )
+                return
+
+    def _nombre_llamada(self, nodo: ast.AST) -> Optional[str]:
+        """Nombre del método o función que se llama (el original si se importó)."""
+        if not isinstance(nodo, ast.Call):
+            return None
+        funcion = nodo.func
+        if isinstance(funcion, ast.Attribute):
+            return funcion.attr
+        if isinstance(funcion, ast.Name):
+            return self.importados.get(funcion.id, (None, funcion.id))[1]
+        return None
+
+    def visit_Module(self, nodo: ast.Module):
+        # Antes de recorrer: qué nombres son funciones y cuáles se reasignan
+        for hijo in ast.walk(nodo):
+            if isinstance(hijo, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self.funciones.add(hijo.name)
+            elif isinstance(hijo, ast.ClassDef):
+                self.reasignados.add(hijo.name)
+            elif isinstance(hijo, ast.Name) and not isinstance(hijo.ctx, ast.Load):
+                self.reasignados.add(hijo.id)
+            elif isinstance(hijo, ast.arg):
+                self.reasignados.add(hijo.arg)
+            elif isinstance(hijo, ast.ExceptHandler) and hijo.name:
+                self.reasignados.add(hijo.name)
+            elif isinstance(hijo, (ast.Global, ast.Nonlocal)):
+                self.reasignados.update(hijo.names)
+        self.generic_visit(nodo)
+
+    def visit_Import(self, nodo: ast.Import):
+        for alias in nodo.names:
+            if self._validar_modulo(nodo, alias.name):
+                if alias.asname:
+                    self.modulos[alias.asname] = alias.name
+                else:
+                    raiz = alias.name.partition(".")[0]
+                    self.modulos[raiz] = raiz
+        self.generic_visit(nodo)
+
+    def visit_ImportFrom(self, nodo: ast.ImportFrom):
+        if nodo.level:
+            self._error(nodo, "importaciones relativas no permitidas")
+            self.generic_visit(nodo)
+            return
+        modulo = nodo.module or ""
+        valido = self._validar_modulo(nodo, modulo)
+        for alias in nodo.names:
+            if alias.name == "*":
+                self._error(nodo, f"importación con * no permitida: {modulo}")
+            elif alias.name.startswith("_"):
+                self._error(nodo, f"importación no permitida: {alias.name}")
+            else:
+                self._validar_nombre_atributo(nodo, alias.name)
+                submodulo = f"{modulo}.{alias.name}"
+                if valido and modulo_permitido(submodulo, self.modulos_permitidos):
+                    self.modulos[alias.asname or alias.name] = submodulo
+                elif valido:
+                    self.importados[alias.asname or alias.name] = (modulo, alias.name)
+        self.generic_visit(nodo)
+
+    def visit_Name(self, nodo: ast.Name):
+        importado = self.importados.get(nodo.id, (None, None))[1]
+        if importado in FUNCIONES_DESPACHO and id(nodo) not in self._despachos:
+            self._error(nodo, f"'{importado}' solo se puede llamar directamente")
+        if nodo.id in NOMBRES_PROHIBIDOS:
+            self._error(nodo, f"uso de '{nodo.id}' no permitido")
+        elif nodo.id.startswith("__"):
+            self._error(nodo, f"acceso a nombre interno '{nodo.id}' no permitido")
+        self.generic_visit(nodo)
+
+    def visit_Attribute(self, nodo: ast.Attribute):
+        self._validar_nombre_atributo(nodo, nodo.attr)
+        if nodo.attr in FUNCIONES_DESPACHO and id(nodo) not in self._despachos:
+            # `f = df.agg` o `partial(df.apply, ...)` esquivarían la revisión
+            self._error(nodo, f"'{nodo.attr}' solo se puede llamar directamente")
+        if id(nodo) not in self._cadenas_revisadas:
+            self._validar_cadena_modulo(nodo)
+        self.generic_visit(nodo)
+
+    def visit_Call(self, nodo: ast.Call):
+        funcion = nodo.func
+        nombre = self._nombre_llamada(nodo)
+        es_metodo = isinstance(funcion, ast.Attribute)
+        if isinstance(funcion, (ast.Attribute, ast.Name)):
+            self._despachos.add(id(funcion))
+        if es_metodo and nombre in ESCRITURA_CON_RUTA:
+            if nodo.args or any(
+                kw.arg is None or kw.arg in ARGUMENTOS_RUTA for kw in nodo.keywords
+            ):
+                self._error(
+                    nodo,
+                    f"'{nombre}' solo se permite sin ruta de archivo "
+                    "(retorna el texto)",
+                )
+        self._validar_despacho(nodo, nombre, es_metodo)
+        if nombre in ("set_option", "option_context"):
+            claves = nodo.args[::2]
+            if nodo.keywords or not all(
+                isinstance(clave, ast.Constant)
+                and isinstance(clave.value, str)
+                and clave.value.startswith(PREFIJOS_OPCIONES)
+                for clave in claves
+            ):
+                self._error(
+                    nodo, f"'{nombre}' solo admite opciones de display escritas"
+                )
+        elif nombre == "use":
+            if nodo.keywords or not all(
+                isinstance(argumento, ast.Constant)
+                and isinstance(argumento.value, str)
+                and _NOMBRE_ESTILO.match(argumento.value)
+                for argumento in nodo.args
+            ):
+                self._error(nodo, "'use' solo admite el nombre escrito de un estilo")
+        elif (
+            es_metodo
+            and nombre in ("format", "format_map")
+            and not isinstance(funcion.value, ast.Constant)
+        ):
+            # Un formato armado en ejecución podría acceder a atributos
+            self._error(
+                nodo, "'format' solo se permite sobre un texto escrito; usa f-strings"
+            )
+        self.generic_visit(nodo)
+
+    def visit_Constant(self, nodo: ast.Constant):
+        if isinstance(nodo.value, str) and _CAMPO_CON_ATRIBUTO.search(nodo.value):
+            self._error(
+                nodo,
+                "las cadenas de formato no pueden acceder a atributos ni "
+                "índices; usa f-strings",
+            )
+
+
+_cache: "OrderedDict[tuple, CodigoValidado]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def huella_codigo(code: str) -> str:
+    """Hash SHA-256 del código fuente."""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def validar_codigo(code: str, modulos_permitidos: Iterable[str]) -> CodigoValidado:
+    """
+    Analiza el código una sola vez con `ast`, aplica las listas de módulos,
+    nombres y atributos permitidos y, si es válido, lo compila.
+
+    El resultado se guarda en una caché LRU por hash del código, de modo que
+    volver a ejecutar el mismo análisis no vuelve a analizar ni compilar.
+    """
+    modulos = frozenset(modulos_permitidos)
+    huella = huella_codigo(code)
+    clave = (huella, modulos)
+    with _cache_lock:
+        validado = _cache.get(clave)
+        if validado is not None:
+            _cache.move_to_end(clave)
+            return validado
+
+    try:
+        arbol = ast.parse(code, filename=NOMBRE_CODIGO_GENERADO)
+    except SyntaxError as e:
+        validado = CodigoValidado(
+            huella, [f"Línea {e.lineno}: error de sintaxis: {e.msg}"], None
+        )
+    else:
+        visitante = _VisitanteSeguridad(modulos)
+        visitante.visit(arbol)
+        codigo = None
+        if not visitante.errores:
+            codigo = compile(arbol, NOMBRE_CODIGO_GENERADO, "exec")
+        validado = CodigoValidado(huella, visitante.errores, codigo)
+
+    with _cache_lock:
+        _cache[clave] = validado
+        _cache.move_to_end(clave)
+        while len(_cache) > MAX_CACHE_CODIGO:
+            _cache.popitem(last=False)
+    return validado
@@ -0,0 +1,292 @@
+import io
+import os
+import csv
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ErrorIngesta(Exception):
+    """Error al leer un CSV subido, con un mensaje apto para el usuario."""
+
+
+def limites_ingesta_configurados() -> Dict[str, float]:
+    """
+    Límites de lectura de CSV, configurables por variables de entorno:
+    tamaño del archivo (INGESTA_MAX_MB), filas (INGESTA_MAX_FILAS), memoria
+    del DataFrame (INGESTA_MAX_MEMORIA_MB), filas por bloque
+    (INGESTA_FILAS_BLOQUE) y tamaño de la muestra (INGESTA_MUESTRA_FILAS).
+    """
+    return {
+        "max_mb": float(os.getenv("INGESTA_MAX_MB", "500")),
+        "max_filas": int(os.getenv("INGESTA_MAX_FILAS", "5000000")),
+        "max_memoria_mb": float(os.getenv("INGESTA_MAX_MEMORIA_MB", "1024")),
+        "filas_bloque": int(os.getenv("INGESTA_FILAS_BLOQUE", "100000")),
+        "muestra_filas": int(os.getenv("INGESTA_MUESTRA_FILAS", "1000")),
+    }
+
+
+def olfatear_csv(ruta: str, bytes_muestra: int = 64 * 1024) -> Dict[str, Any]:
+    """
+    Detecta codificación, separador y tipos de columna leyendo solo el
+    comienzo del archivo. Retorna las opciones para `pd.read_csv`.
+    """
+    import pandas as pd
+
+    with open(ruta, "rb") as archivo:
+        crudo = archivo.read(bytes_muestra)
+    if not crudo.strip():
+        raise ErrorIngesta("El archivo CSV está vacío.")
+    if len(crudo) == bytes_muestra and b"\n" in crudo:
+        # Descartar la última línea, que puede estar cortada
+        crudo = crudo[: crudo.rfind(b"\n") + 1]
+
+    try:
+        texto = crudo.decode("utf-8-sig")
+        codificacion = "utf-8-sig"
+    except UnicodeDecodeError:
+        texto = crudo.decode("latin-1")
+        codificacion = "latin-1"
+
+    try:
+        dialecto = csv.Sniffer().sniff(texto, delimiters=",;\t|")
+        separador, comillas = dialecto.delimiter, dialecto.quotechar
+    except csv.Error:
+        separador, comillas = ",", '"'
+
+    try:
+        cabeza = pd.read_csv(io.StringIO(texto), sep=separador, quotechar=comillas)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+        raise ErrorIngesta(f"No se pudo interpretar el archivo como CSV: {e}")
+
+    # Tipos explícitos a partir del comienzo del archivo: la lectura por
+    # bloques no vuelve a inferirlos (ni mezcla tipos entre bloques)
+    tipos = {}
+    for columna, tipo in cabeza.dtypes.items():
+        if tipo.kind in "iufb":
+            tipos[columna] = tipo.name
+        else:
+            tipos[columna] = "object"
+    return {
+        "encoding": codificacion,
+        "sep": separador,
+        "quotechar": comillas,
+        "dtype": tipos,
+    }
+
+
+def _memoria_estimada(bloque: "pd.DataFrame", filas_muestra: int = 1000) -> int:
+    """
+    Memoria de un bloque en bytes. Medir los textos de todas las filas
+    (`deep=True`) cuesta casi tanto como leerlas, así que para las columnas
+    de texto se extrapola desde las primeras `filas_muestra` filas.
+    """
+    total = int(bloque.memory_usage(index=True, deep=False).sum())
+    texto = bloque.select_dtypes(include="object")
+    if len(texto.columns) and len(bloque):
+        muestra = texto.iloc[:filas_muestra]
+        extra = muestra.memory_usage(index=False, deep=True).sum() - (
+            muestra.memory_usage(index=False, deep=False).sum()
+        )
+        total += int(extra * len(bloque) / len(muestra))
+    return total
+
+
+class IngestaCSV:
+    """
+    Lectura de un CSV por bloques en un hilo de fondo.
+
+    Mientras se lee, mantiene una muestra aleatoria uniforme (reservoir
+    sampling) de las filas vistas, disponible desde el primer bloque con
+    `esperar_muestra`, de modo que el perfil para el prompt se puede armar
+    antes de terminar la carga. `resultado` espera el DataFrame completo.
+    Los límites de filas y memoria se comprueban bloque a bloque.
+    """
+
+    def __init__(self, ruta: str, limites: Optional[Dict[str, float]] = None):
+        self.ruta = ruta
+        self.limites = {**limites_ingesta_configurados(), **(limites or {})}
+        self.formato: Dict[str, Any] = {}
+        self.filas_leidas = 0
+        self.memoria_bytes = 0
+        self._bloques: List["pd.DataFrame"] = []
+        self._muestra: List[int] = []
+        # Avisa a quien espera la muestra cada vez que llega un bloque
+        self._cambio = threading.Condition()
+        self._terminada = threading.Event()
+        self._cancelada = False
+        self._error: Optional[Exception] = None
+        self._df: Optional["pd.DataFrame"] = None
+        self._hilo: Optional[threading.Thread] = None
+
+    def iniciar(self) -> "IngestaCSV":
+        """Valida el tamaño, detecta el formato y lanza la lectura."""
+        tamano_mb = os.path.getsize(self.ruta) / (1024 * 1024)
+        if tamano_mb > self.limites["max_mb"]:
+            raise ErrorIngesta(
+                f"El archivo pesa {tamano_mb:,.0f} MB; el máximo permitido es "
+                f"{self.limites['max_mb']:,.0f} MB."
+            )
+        self.formato = olfatear_csv(self.ruta)
+        self._hilo = threading.Thread(target=self._leer, daemon=True)
+        self._hilo.start()
+        return self
+
+    def esperar_muestra(self, timeout: Optional[float] = None) -> "pd.DataFrame":
+        """Muestra de las filas leídas hasta ahora (al menos el primer bloque)."""
+        import numpy as np
+        import pandas as pd
+
+        with self._cambio:
+            # Si la lectura se reinicia, se espera al nuevo primer bloque
+            lista = self._cambio.wait_for(
+                lambda: self._muestra or self._terminada.is_set(), timeout
+            )
+            if not lista:
+                raise ErrorIngesta("La lectura del archivo está tardando demasiado.")
+            if self._cancelada:
+                raise ErrorIngesta("Lectura cancelada")
+            if self._error is not None:
+                raise self._error
+            indices = np.sort(np.array(self._muestra, dtype=np.int64))
+            bloques = [self._df] if self._df is not None else list(self._bloques)
+        if not len(indices):
+            return bloques[0].head(0) if bloques else pd.DataFrame()
+        # Cada índice global se traduce a su bloque y posición dentro de él
+        inicios = np.cumsum([0] + [len(b) for b in bloques[:-1]])
+        numero_bloque = np.searchsorted(inicios, indices, side="right") - 1
+        partes = [
+            bloque.iloc[indices[numero_bloque == n] - inicios[n]]
+            for n, bloque in enumerate(bloques)
+            if (numero_bloque == n).any()
+        ]
+        return pd.concat(partes, ignore_index=True)
+
+    def resultado(self, timeout: Optional[float] = None) -> "pd.DataFrame":
+        """Espera a que termine la lectura y retorna el DataFrame completo."""
+        if not self._terminada.wait(timeout):
+            raise ErrorIngesta("La lectura del archivo está tardando demasiado.")
+        if self._cancelada:
+            raise ErrorIngesta("Lectura cancelada")
+        if self._error is not None:
+            raise self._error
+        return self._df
+
+    def cancelar(self):
+        """
+        Detiene la lectura en el próximo bloque y libera lo leído; después
+        `resultado` y `esperar_muestra` lanzan ErrorIngesta.
+        """
+        self._cancelada = True
+
+    def _leer(self):
+        import pandas as pd
+
+        try:
+            try:
+                self._leer_bloques(self.formato["dtype"])
+            except (
+                pd.errors.ParserError,
+                pd.errors.EmptyDataError,
+                UnicodeDecodeError,
+            ):
+                raise
+            except (ValueError, TypeError):
+                # Los tipos inferidos del comienzo no valen para todo el
+                # archivo (p. ej. un entero con nulos más adelante): se vuelve
+                # a leer dejando que pandas infiera los tipos
+                self.formato["dtype"] = None
+                self._reiniciar()
+                self._leer_bloques(None)
+            if not self._cancelada:
+                df = (
+                    pd.concat(self._bloques, ignore_index=True)
+                    if self._bloques
+                    else pd.DataFrame()
+                )
+                with self._cambio:
+                    self._df, self._bloques = df, []
+        except ErrorIngesta as e:
+            self._error = e
+        except pd.errors.EmptyDataError:
+            self._error = ErrorIngesta("El archivo CSV está vacío.")
+        except (pd.errors.ParserError, UnicodeDecodeError) as e:
+            self._error = ErrorIngesta(f"Error al leer el CSV: {e}")
+        except MemoryError:
+            self._error = ErrorIngesta(
+                "No hay memoria suficiente para cargar el archivo completo."
+            )
+        finally:
+            if self._error is not None or self._cancelada:
+                self._reiniciar()
+            with self._cambio:
+                self._terminada.set()
+                self._cambio.notify_all()
+
+    def _reiniciar(self):
+        with self._cambio:
+            self._bloques = []
+            self._muestra = []
+        self.filas_leidas = 0
+        self.memoria_bytes = 0
+
+    def _leer_bloques(self, tipos: Optional[Dict[str, str]]):
+        import numpy as np
+        import pandas as pd
+
+        lector = pd.read_csv(
+            self.ruta,
+            sep=self.formato["sep"],
+            quotechar=self.formato["quotechar"],
+            encoding=self.formato["encoding"],
+            dtype=tipos,
+            chunksize=self.limites["filas_bloque"],
+        )
+        rng = np.random.default_rng()
+        max_memoria = self.limites["max_memoria_mb"] * 1024 * 1024
+        with lector:
+            for bloque in lector:
+                if self._cancelada:
+                    return
+                self.filas_leidas += len(bloque)
+                if self.filas_leidas > self.limites["max_filas"]:
+                    raise ErrorIngesta(
+                        f"El archivo tiene más de {self.limites['max_filas']:,} "
+                        "filas, el máximo permitido."
+                    )
+                self.memoria_bytes += _memoria_estimada(bloque)
+                if self.memoria_bytes > max_memoria:
+                    raise ErrorIngesta(
+                        "El archivo ocupa más de "
+                        f"{self.limites['max_memoria_mb']:,.0f} MB en memoria, "
+                        "el máximo permitido."
+                    )
+                with self._cambio:
+                    self._actualizar_muestra(len(bloque), rng)
+                    self._bloques.append(bloque)
+                    self._cambio.notify_all()
+
+    def _actualizar_muestra(self, filas_bloque: int, rng):
+        import numpy as np
+
+        # Algoritmo R: la fila global i entra con probabilidad k / (i + 1)
+        # reemplazando una posición al azar de la muestra
+        k = self.limites["muestra_filas"]
+        primera = self.filas_leidas - filas_bloque
+        faltan = max(0, min(k - len(self._muestra), filas_bloque))
+        self._muestra.extend(range(primera, primera + faltan))
+        if faltan == filas_bloque:
+            return
+        indices = np.arange(primera + faltan, self.filas_leidas)
+        destinos = rng.integers(0, indices + 1)
+        for indice, destino in zip(indices[destinos < k], destinos[destinos < k]):
+            self._muestra[destino] = int(indice)
+
+
+def iniciar_ingesta(
+    ruta: str, limites: Optional[Dict[str, float]] = None
+) -> IngestaCSV:
+    """Comienza a leer un CSV en segundo plano; ver `IngestaCSV`."""
+    return IngestaCSV(ruta, limites).iniciar()
@@ -1,39 +1,132 @@
 import sqlite3
 import json
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
 import os
 import re
+import threading
+from urllib.request import pathname2url
+
+# Esquema compartido por la base "caliente" y los archivos anuales de archivo
+ESQUEMA_EVALUACIONES = """
+    CREATE TABLE IF NOT EXISTS {tabla} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        objetivo_estrategico TEXT NOT NULL,
+        indicador TEXT NOT NULL,
+        meta TEXT NOT NULL,
+        fuente_dato TEXT NOT NULL,
+        formula TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        respuesta_gemini TEXT NOT NULL,
+        calificacion TEXT,
+        recomendaciones TEXT
+    )
+"""
+
+# Contador de modificaciones y borrados de evaluaciones (las inserciones se
+# detectan por el id, que con AUTOINCREMENT nunca se reutiliza). Permite a
+# las vistas incrementales saber si basta con leer las filas nuevas.
+ESQUEMA_CONTADORES = """
+    CREATE TABLE IF NOT EXISTS contadores (
+        nombre TEXT PRIMARY KEY,
+        valor INTEGER NOT NULL
+    );
+    INSERT OR IGNORE INTO contadores (nombre, valor) VALUES ('reescrituras', 0);
+    CREATE TRIGGER IF NOT EXISTS evaluaciones_modificada
+    AFTER UPDATE ON evaluaciones BEGIN
+        UPDATE contadores SET valor = valor + 1 WHERE nombre = 'reescrituras';
+    END;
+    CREATE TRIGGER IF NOT EXISTS evaluaciones_borrada
+    AFTER DELETE ON evaluaciones BEGIN
+        UPDATE contadores SET valor = valor + 1 WHERE nombre = 'reescrituras';
+    END;
+"""
+
+# Índices para filtrar y ordenar el historial. El nombre del índice lleva el
+# esquema ("arch_2024.") cuando se crea en un archivo adjunto.
+ESQUEMA_INDICES = """
+    CREATE INDEX IF NOT EXISTS {esquema}idx_evaluaciones_fecha
+        ON evaluaciones (fecha_creacion, id);
+    CREATE INDEX IF NOT EXISTS {esquema}idx_evaluaciones_tipo
+        ON evaluaciones (tipo, fecha_creacion, id);
+    CREATE INDEX IF NOT EXISTS {esquema}idx_evaluaciones_calificacion
+        ON evaluaciones (calificacion, fecha_creacion, id);
+    CREATE INDEX IF NOT EXISTS {esquema}idx_evaluaciones_tipo_calificacion
+        ON evaluaciones (tipo, calificacion, fecha_creacion, id);
+"""
+
+# Patrones para extraer datos de la respuesta de Gemini. Se compilan una vez
+# y los comparten el guardado de cada evaluación y la reextracción masiva.
+# Calificación, tras el encabezado y en orden de preferencia: el número junto
+# al emoji ("🟧 2. Medio-bajo"), el primero con la forma "N." o "N - ", y
+# solo si no hay ninguno, el primer dígito. Un texto previo como "(escala
+# 1-4)" no debe ganarle al valor. Cada opción es un grupo opcional; se usa el
+# primero que haya coincidido (ver `_calificacion`).
+PATRON_CALIFICACION = re.compile(
+    r"\*\*Calificación:\*\*"
+    r"(?=(?:.*?[🟢🟩🟨🟧🟥⚪]\s*(?P<emoji>\d+)(?:\.|\s+[-–]))?)"
+    r"(?=(?:.*?(?P<numero>\d+)(?:\.|\s+[-–]))?)"
+    r"(?=(?:\D*(?P<digito>\d+))?)",
+    re.DOTALL,
+)
+# Recomendaciones: desde su encabezado hasta la calificación o el final
+PATRON_RECOMENDACIONES = re.compile(
+    r"\*\*Recomendaciones:\*\*(.*?)(?:\*\*Calificación:\*\*|\Z)", re.DOTALL
+)
+
+
+def _calificacion(grupos) -> Optional[str]:
+    """Primer grupo de PATRON_CALIFICACION que coincidió."""
+    return next((grupo for grupo in grupos if grupo is not None), None)
+
+
+# Columnas por las que se puede ordenar el historial (se interpolan en el SQL)
+COLUMNAS_ORDENABLES = ("fecha_creacion", "id", "indicador", "tipo", "calificacion")
+
+# SQLite admite 10 bases adjuntas por conexión por defecto
+MAX_ARCHIVOS_ADJUNTOS = 10
 
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "evaluaciones.db"):
+    def __init__(
+        self,
+        db_path: str = "evaluaciones.db",
+        archivo_dir: Optional[str] = None,
+        meses_retencion: int = 12,
+    ):
         """
         Inicializa el gestor de base de datos.
         db_path: Ruta al archivo de base de datos SQLite
+        archivo_dir: Carpeta de los archivos anuales (por defecto "archivo"
+            junto a db_path)
+        meses_retencion: Antigüedad en meses a partir de la cual una
+            evaluación se mueve al archivo
         """
         self.db_path = db_path
+        self.archivo_dir = archivo_dir or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), "archivo"
+        )
+        self.meses_retencion = meses_retencion
+        # Conexión persistente solo para leer PRAGMA data_version
+        self._conexion_version: Optional[sqlite3.Connection] = None
+        self._version_lock = threading.Lock()
+        self._detener_archivado = threading.Event()
+        self._hilo_archivado: Optional[threading.Thread] = None
         self.init_database()
 
     def init_database(self):
         """Crea la tabla si no existe"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS evaluaciones (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    objetivo_estrategico TEXT NOT NULL,
-                    indicador TEXT NOT NULL,
-                    meta TEXT NOT NULL,
-                    fuente_dato TEXT NOT NULL,
-                    formula TEXT NOT NULL,
-                    tipo TEXT NOT NULL,
-                    respuesta_gemini TEXT NOT NULL,
-                    calificacion TEXT,
-                    recomendaciones TEXT
-                )
-            """)
+            # Solo tiene efecto en bases nuevas; permite devolver al sistema
+            # las páginas liberadas por el archivado sin un VACUUM completo
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL permite archivar en línea sin bloquear a los lectores
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute(ESQUEMA_EVALUACIONES.format(tabla="evaluaciones"))
+            cursor.executescript(ESQUEMA_CONTADORES)
+            cursor.executescript(ESQUEMA_INDICES.format(esquema=""))
             conn.commit()
 
     def guardar_evaluacion(
@@ -84,105 +177,649 @@ class DatabaseManager:
         Extrae la calificación y recomendaciones de la respuesta de Gemini.
         Retorna una tupla (calificacion, recomendaciones)
         """
-        calificacion = None
-        recomendaciones = None
+        calificacion = PATRON_CALIFICACION.search(respuesta_gemini)
+        recomendaciones = PATRON_RECOMENDACIONES.search(respuesta_gemini)
+        return (
+            _calificacion(calificacion.groups()) if calificacion else None,
+            recomendaciones.group(1).strip() if recomendaciones else None,
+        )
 
-        # Buscar la calificación (nuevo formato numérico)
-        if "**Calificación:**" in respuesta_gemini:
-            try:
-                calificacion_parte = respuesta_gemini.split("**Calificación:**")[
-                    1
-                ].strip()
-                # Buscar el número en la respuesta (formato: "🟧 2. Medio-bajo")
-                patron_numero = r"[🟢🟨🟧🟥⚪]\s*(\d+)\."
-                match = re.search(patron_numero, calificacion_parte)
-                if match:
-                    calificacion = match.group(1)  # Solo el número
-                else:
-                    # Fallback: buscar cualquier número al inicio de la línea
-                    patron_simple = r"(\d+)\."
-                    match_simple = re.search(patron_simple, calificacion_parte)
-                    if match_simple:
-                        calificacion = match_simple.group(1)
-                    else:
-                        # Último fallback: buscar cualquier dígito
-                        patron_digito = r"(\d+)"
-                        match_digito = re.search(patron_digito, calificacion_parte)
-                        if match_digito:
-                            calificacion = match_digito.group(1)
-            except Exception as e:
-                print(f"Error extrayendo calificación: {e}")
-                pass
-
-        # Buscar las recomendaciones
-        if "**Recomendaciones:**" in respuesta_gemini:
-            try:
-                recomendaciones_parte = respuesta_gemini.split("**Recomendaciones:**")[
-                    1
-                ]
-                if "**Calificación:**" in recomendaciones_parte:
-                    recomendaciones = recomendaciones_parte.split("**Calificación:**")[
-                        0
-                    ].strip()
-                else:
-                    recomendaciones = recomendaciones_parte.strip()
-            except Exception as e:
-                print(f"Error extrayendo recomendaciones: {e}")
-                pass
+    def reextraer_calificaciones(
+        self, tamano_lote: int = 5000, incluir_archivo: bool = True
+    ) -> Dict[str, int]:
+        """
+        Vuelve a extraer calificación y recomendaciones de las respuestas ya
+        guardadas, con los patrones actuales (p. ej. después de cambiarlos).
+        Recorre la base caliente y, si se pide, los archivos anuales.
+        Retorna {"revisadas": ..., "actualizadas": ...}.
+        """
+        rutas = [self.db_path]
+        if incluir_archivo:
+            rutas += [self.ruta_archivo(anio) for anio in self.listar_archivos()]
+        totales = {"revisadas": 0, "actualizadas": 0}
+        for ruta in rutas:
+            for clave, cantidad in self._reextraer_base(ruta, tamano_lote).items():
+                totales[clave] += cantidad
+        return totales
 
-        return calificacion, recomendaciones
+    def _reextraer_base(self, ruta: str, tamano_lote: int) -> Dict[str, int]:
+        """
+        Reextrae una base por lotes de `tamano_lote` filas, recorridos por id.
+        Cada lote se procesa vectorizado con pandas y sus cambios se escriben
+        en una sola transacción; las filas que no cambian no se tocan.
+        """
+        import pandas as pd
 
-    def obtener_evaluaciones(self, limit: int = 100) -> List[Dict]:
+        revisadas = actualizadas = 0
+        ultimo_id = 0
+        campos = ["calificacion", "recomendaciones"]
+        conn = sqlite3.connect(ruta, timeout=30)
+        try:
+            while True:
+                lote = pd.read_sql_query(
+                    """
+                    SELECT id, respuesta_gemini, calificacion, recomendaciones
+                    FROM evaluaciones
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                    conn,
+                    params=(ultimo_id, tamano_lote),
+                )
+                if lote.empty:
+                    break
+                ultimo_id = int(lote["id"].iloc[-1])
+                respuestas = lote["respuesta_gemini"].astype(str)
+                grupos = respuestas.str.extract(
+                    PATRON_CALIFICACION.pattern, flags=PATRON_CALIFICACION.flags
+                )
+                nuevos = pd.DataFrame(
+                    {
+                        # Primer grupo que coincidió, como `_calificacion`
+                        "calificacion": grupos["emoji"]
+                        .combine_first(grupos["numero"])
+                        .combine_first(grupos["digito"]),
+                        "recomendaciones": respuestas.str.extract(
+                            PATRON_RECOMENDACIONES.pattern,
+                            flags=PATRON_RECOMENDACIONES.flags,
+                            expand=False,
+                        ).str.strip(),
+                    }
+                )
+                # NULL y texto vacío son distintos: se comparan con un centinela
+                actuales = lote[campos].astype(object).fillna("\0").astype(str)
+                cambiadas = (nuevos.fillna("\0") != actuales).any(axis=1)
+                nuevos = nuevos[cambiadas].astype(object)
+                filas = [
+                    (
+                        None if pd.isna(calificacion) else calificacion,
+                        None if pd.isna(recomendaciones) else recomendaciones,
+                        evaluacion_id,
+                    )
+                    for calificacion, recomendaciones, evaluacion_id in zip(
+                        nuevos["calificacion"],
+                        nuevos["recomendaciones"],
+                        lote.loc[cambiadas, "id"].tolist(),
+                    )
+                ]
+                if filas:
+                    with conn:
+                        conn.executemany(
+                            """
+                            UPDATE evaluaciones
+                            SET calificacion = ?, recomendaciones = ?
+                            WHERE id = ?
+                        """,
+                            filas,
+                        )
+                revisadas += len(lote)
+                actualizadas += len(filas)
+        finally:
+            conn.close()
+        return {"revisadas": revisadas, "actualizadas": actualizadas}
+
+    def obtener_evaluaciones(
+        self, limit: int = 100, incluir_archivo: bool = False
+    ) -> List[Dict]:
         """
         Obtiene las evaluaciones más recientes.
+        incluir_archivo: Si es True, también consulta los archivos anuales.
+        """
+        return self._mas_recientes("1", [], limit, incluir_archivo)
+
+    def obtener_evaluaciones_desde(
+        self, ultimo_id: int, limit: int = 100
+    ) -> List[Dict]:
+        """
+        Evaluaciones de la base caliente con id mayor que `ultimo_id`, de la
+        más reciente a la más antigua. El costo depende solo de las filas nuevas.
         """
         with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row  # Para obtener resultados como diccionarios
+            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
             cursor.execute(
                 """
-                SELECT * FROM evaluaciones 
-                ORDER BY fecha_creacion DESC 
+                SELECT * FROM evaluaciones
+                WHERE id > ?
+                ORDER BY id DESC
                 LIMIT ?
             """,
-                (limit,),
+                (ultimo_id, limit),
             )
             return [dict(row) for row in cursor.fetchall()]
 
-    def obtener_estadisticas(self) -> Dict:
+    def buscar_evaluaciones(
+        self, texto: str, limit: int = 100, incluir_archivo: bool = False
+    ) -> List[Dict]:
+        """
+        Busca evaluaciones cuyo indicador u objetivo estratégico contenga el texto.
+        incluir_archivo: Si es True, también busca en los archivos anuales.
+        """
+        patron = f"%{texto}%"
+        return self._mas_recientes(
+            "indicador LIKE ? OR objetivo_estrategico LIKE ?",
+            [patron, patron],
+            limit,
+            incluir_archivo,
+        )
+
+    def _mas_recientes(
+        self, filtro: str, parametros: List, limit: int, incluir_archivo: bool
+    ) -> List[Dict]:
+        """
+        Las `limit` evaluaciones más recientes que cumplen `filtro`. Con
+        `incluir_archivo`, los archivos que no caben en una conexión se
+        consultan en lotes, del año más reciente al más antiguo, y se
+        combinan las mejores de cada lote. Un archivo solo tiene filas de su
+        año, así que los lotes se cortan cuando ninguno puede aportar
+        evaluaciones más recientes que las ya reunidas.
+        """
+        filas: List[Dict] = []
+        for numero, anios_lote in enumerate(self._lotes_archivo(incluir_archivo)):
+            if (
+                len(filas) >= limit
+                and anios_lote
+                and (filas[limit - 1]["fecha_creacion"] or "") >= str(anios_lote[0] + 1)
+            ):
+                break
+            with self._conectar_lectura(incluir_archivo, anios_lote) as conn:
+                # Para obtener resultados como diccionarios
+                conn.row_factory = sqlite3.Row
+                fuente = self._fuente_evaluaciones(
+                    conn, incluir_archivo, incluir_principal=numero == 0
+                )
+                filas += [
+                    dict(row)
+                    for row in conn.execute(
+                        f"""
+                        SELECT * FROM {fuente}
+                        WHERE {filtro}
+                        ORDER BY fecha_creacion DESC, id DESC
+                        LIMIT ?
+                    """,
+                        (*parametros, limit),
+                    )
+                ]
+            filas.sort(
+                key=lambda fila: (fila["fecha_creacion"] or "", fila["id"]),
+                reverse=True,
+            )
+            del filas[limit:]
+        return filas
+
+    def filtrar_evaluaciones(
+        self,
+        tipo: Optional[str] = None,
+        calificacion: Optional[str] = None,
+        desde: Optional[str] = None,
+        hasta: Optional[str] = None,
+        texto: Optional[str] = None,
+        orden: str = "fecha_creacion",
+        descendente: bool = True,
+        pagina: int = 1,
+        por_pagina: int = 100,
+        incluir_archivo: bool = False,
+    ) -> Tuple[List[Dict], int]:
+        """
+        Obtiene una página de evaluaciones filtradas y ordenadas en SQL.
+        Los filtros vacíos no se aplican; desde y hasta son fechas
+        "AAAA-MM-DD" inclusive; texto se busca en el indicador y el objetivo
+        estratégico. Retorna (evaluaciones de la página, total que coincide).
+        Lanza ValueError si una fecha o el orden no son válidos.
+        """
+        if orden not in COLUMNAS_ORDENABLES:
+            raise ValueError(f"No se puede ordenar por {orden!r}")
+        condiciones, parametros = [], []
+        if tipo:
+            condiciones.append("tipo = ?")
+            parametros.append(tipo)
+        if calificacion:
+            condiciones.append("calificacion = ?")
+            parametros.append(str(calificacion))
+        if desde:
+            condiciones.append("fecha_creacion >= ?")
+            parametros.append(_validar_fecha(desde))
+        if hasta:
+            condiciones.append("fecha_creacion < date(?, '+1 day')")
+            parametros.append(_validar_fecha(hasta))
+        if texto:
+            patron = "%" + re.sub(r"([\\%_])", r"\\\1", texto.strip()) + "%"
+            condiciones.append(
+                "(indicador LIKE ? ESCAPE '\\'"
+                " OR objetivo_estrategico LIKE ? ESCAPE '\\')"
+            )
+            parametros += [patron, patron]
+        filtro = " AND ".join(condiciones) or "1"
+        direccion = "DESC" if descendente else "ASC"
+        # Los empates se desempatan por fecha e id, como en los índices, para
+        # que el orden se lea del índice sin ordenar las filas aparte
+        criterios = [orden] + [c for c in ("fecha_creacion", "id") if c != orden]
+        if orden == "id":
+            criterios = ["id"]
+        orden_sql = ", ".join(f"{c} {direccion}" for c in criterios)
+        pagina = max(1, int(pagina))
+        # Solo se adjuntan los archivos de los años del rango pedido; si aun
+        # así no caben todos, `anios_archivo` informa cuáles quedan fuera
+        anios = self.anios_archivo(desde, hasta)[0] if incluir_archivo else None
+
+        with self._conectar_lectura(incluir_archivo, anios) as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            fuente = self._fuente_evaluaciones(conn, incluir_archivo)
+            cursor.execute(f"SELECT COUNT(*) FROM {fuente} WHERE {filtro}", parametros)
+            total = cursor.fetchone()[0]
+            cursor.execute(
+                f"""
+                SELECT * FROM {fuente}
+                WHERE {filtro}
+                ORDER BY {orden_sql}
+                LIMIT ? OFFSET ?
+            """,
+                parametros + [por_pagina, (pagina - 1) * por_pagina],
+            )
+            return [dict(row) for row in cursor.fetchall()], total
+
+    def obtener_estadisticas(
+        self,
+        incluir_archivo: bool = False,
+        desde_id: Optional[int] = None,
+        hasta_id: Optional[int] = None,
+    ) -> Dict:
         """
         Obtiene estadísticas básicas de las evaluaciones.
+        incluir_archivo: Si es True, también cuenta las evaluaciones archivadas.
+        desde_id, hasta_id: Si se indican, solo cuenta las evaluaciones con
+            desde_id < id <= hasta_id (para actualizar conteos ya calculados).
+        """
+        condiciones, parametros = [], []
+        if desde_id is not None:
+            condiciones.append("id > ?")
+            parametros.append(desde_id)
+        if hasta_id is not None:
+            condiciones.append("id <= ?")
+            parametros.append(hasta_id)
+        filtro = " AND ".join(condiciones) or "1"
+
+        # Los conteos se suman, así que los archivos que no caben en una
+        # conexión se cuentan en conexiones adicionales
+        total = 0
+        calificaciones: Dict[str, int] = {}
+        tipos: Dict[str, int] = {}
+        for numero, anios_lote in enumerate(self._lotes_archivo(incluir_archivo)):
+            with self._conectar_lectura(incluir_archivo, anios_lote) as conn:
+                cursor = conn.cursor()
+                fuente = self._fuente_evaluaciones(
+                    conn, incluir_archivo, incluir_principal=numero == 0
+                )
+
+                # Total de evaluaciones
+                cursor.execute(
+                    f"SELECT COUNT(*) as total FROM {fuente} WHERE {filtro}",
+                    parametros,
+                )
+                total += cursor.fetchone()[0]
+
+                # Distribución por calificación
+                cursor.execute(
+                    f"""
+                    SELECT calificacion, COUNT(*) as cantidad 
+                    FROM {fuente} 
+                    WHERE calificacion IS NOT NULL AND {filtro}
+                    GROUP BY calificacion
+                """,
+                    parametros,
+                )
+                for calificacion, cantidad in cursor.fetchall():
+                    calificaciones[calificacion] = (
+                        calificaciones.get(calificacion, 0) + cantidad
+                    )
+
+                # Distribución por tipo
+                cursor.execute(
+                    f"""
+                    SELECT tipo, COUNT(*) as cantidad 
+                    FROM {fuente} 
+                    WHERE {filtro}
+                    GROUP BY tipo
+                """,
+                    parametros,
+                )
+                for tipo, cantidad in cursor.fetchall():
+                    tipos[tipo] = tipos.get(tipo, 0) + cantidad
+
+        return {
+            "total_evaluaciones": total,
+            "por_calificacion": calificaciones,
+            "por_tipo": tipos,
+        }
+
+    def version_datos(self) -> int:
+        """
+        Marca de cambios de la base caliente: cambia cada vez que cualquier
+        conexión, de este u otro proceso, confirma una escritura. Sirve para
+        invalidar resultados derivados con una sola consulta mínima.
+
+        Usa PRAGMA data_version, que solo es comparable dentro de una misma
+        conexión; por eso se lee siempre desde una conexión persistente en la
+        que nunca se escribe.
+        """
+        with self._version_lock:
+            if self._conexion_version is None:
+                self._conexion_version = sqlite3.connect(
+                    self.db_path, check_same_thread=False
+                )
+            return self._conexion_version.execute("PRAGMA data_version").fetchone()[0]
+
+    def estado_cambios(self) -> tuple:
+        """
+        Retorna (reescrituras, ultimo_id) de la base caliente: el contador de
+        modificaciones y borrados, y el id más alto. Si las reescrituras no
+        cambiaron, todo lo nuevo son las filas con id mayor al ya visto.
         """
         with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("""
+                SELECT
+                    (SELECT valor FROM contadores WHERE nombre = 'reescrituras'),
+                    (SELECT COALESCE(MAX(id), 0) FROM evaluaciones)
+            """).fetchone()
+
+    # ------------------------------------------------------------------
+    # Retención y archivado
+    # ------------------------------------------------------------------
+
+    def ruta_archivo(self, anio: int) -> str:
+        """Ruta del archivo SQLite que guarda las evaluaciones de un año."""
+        return os.path.join(self.archivo_dir, f"evaluaciones_{anio}.db")
+
+    def listar_archivos(self) -> List[int]:
+        """Años que tienen archivo de evaluaciones, del más reciente al más antiguo."""
+        if not os.path.isdir(self.archivo_dir):
+            return []
+        anios = []
+        for nombre in os.listdir(self.archivo_dir):
+            match = re.fullmatch(r"evaluaciones_(\d{4})\.db", nombre)
+            if match:
+                anios.append(int(match.group(1)))
+        return sorted(anios, reverse=True)
+
+    def archivar_evaluaciones(
+        self, meses: Optional[int] = None, tamano_lote: int = 500
+    ) -> Dict[int, int]:
+        """
+        Mueve al archivo anual las evaluaciones con más de `meses` de antigüedad.
+
+        Trabaja en lotes cortos para no bloquear a los escritores durante
+        mucho tiempo. SQLite no garantiza atomicidad entre bases adjuntas
+        cuando alguna usa WAL, así que cada lote se mueve en dos transacciones:
+        primero se copia al archivo y se confirma, y después se borran de la
+        base caliente solo los ids que ya están en el archivo. Si el proceso
+        se interrumpe entre ambas, la siguiente ejecución completa el borrado
+        (la copia ignora los ids ya archivados), sin perder ni duplicar filas.
+
+        Las evaluaciones con fecha_creacion nula o que SQLite no interpreta
+        como fecha no tienen año de archivo: quedan en la base caliente.
+        Retorna un diccionario {año: evaluaciones archivadas}.
+        """
+        meses = self.meses_retencion if meses is None else meses
+        corte = f"-{int(meses)} months"
+        archivadas: Dict[int, int] = {}
+        os.makedirs(self.archivo_dir, exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
             cursor = conn.cursor()
+            ultimo_id = 0
+            while True:
+                cursor.execute(
+                    """
+                    SELECT id, CAST(strftime('%Y', fecha_creacion) AS INTEGER)
+                    FROM evaluaciones
+                    WHERE id > ?
+                      AND fecha_creacion < datetime('now', ?)
+                      AND strftime('%Y', fecha_creacion) IS NOT NULL
+                    ORDER BY id
+                    LIMIT ?
+                """,
+                    (ultimo_id, corte, tamano_lote),
+                )
+                lote = cursor.fetchall()
+                if not lote:
+                    break
+                ultimo_id = lote[-1][0]
 
-            # Total de evaluaciones
-            cursor.execute("SELECT COUNT(*) as total FROM evaluaciones")
-            total = cursor.fetchone()[0]
+                ids_por_anio: Dict[int, List[int]] = {}
+                for evaluacion_id, anio in lote:
+                    ids_por_anio.setdefault(anio, []).append(evaluacion_id)
+
+                for anio, ids in ids_por_anio.items():
+                    movidas = self._archivar_lote(cursor, anio, ids)
+                    if movidas:
+                        archivadas[anio] = archivadas.get(anio, 0) + movidas
+
+            if archivadas:
+                # Devuelve las páginas libres al sistema (bases con auto_vacuum)
+                cursor.execute("PRAGMA incremental_vacuum")
+        finally:
+            conn.close()
+
+        return archivadas
+
+    def _archivar_lote(self, cursor: sqlite3.Cursor, anio: int, ids: List[int]) -> int:
+        """
+        Copia al archivo de `anio` las evaluaciones `ids` y las borra de la
+        base caliente. Retorna cuántas se borraron.
+        """
+        esquema = f"arch_{int(anio)}"
+        marcadores = ",".join("?" * len(ids))
+        # ATTACH no se permite dentro de una transacción
+        cursor.execute(f"ATTACH DATABASE ? AS {esquema}", (self.ruta_archivo(anio),))
+        try:
+            cursor.execute(ESQUEMA_EVALUACIONES.format(tabla=f"{esquema}.evaluaciones"))
+            cursor.executescript(ESQUEMA_INDICES.format(esquema=f"{esquema}."))
+
+            # 1. Copia: solo escribe en el archivo
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute(
+                    f"""
+                    INSERT OR IGNORE INTO {esquema}.evaluaciones
+                    SELECT * FROM main.evaluaciones WHERE id IN ({marcadores})
+                """,
+                    ids,
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+            # 2. Borrado: solo escribe en la base caliente, y solo lo que el
+            # archivo ya tiene confirmado
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.execute(
+                    f"""
+                    DELETE FROM main.evaluaciones
+                    WHERE id IN ({marcadores})
+                      AND id IN (SELECT id FROM {esquema}.evaluaciones)
+                """,
+                    ids,
+                )
+                borradas = cursor.rowcount
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            return borradas
+        finally:
+            cursor.execute(f"DETACH DATABASE {esquema}")
+
+    def iniciar_archivado_periodico(self, intervalo_s: Optional[float] = None):
+        """
+        Lanza (una sola vez) un hilo que archiva al iniciar y luego cada
+        `intervalo_s` segundos (ARCHIVADO_INTERVALO_HORAS, 24 h).
+        """
+        if self._hilo_archivado is not None:
+            return
+        if intervalo_s is None:
+            intervalo_s = float(os.getenv("ARCHIVADO_INTERVALO_HORAS", "24")) * 3600
+
+        def bucle():
+            while True:
+                try:
+                    archivadas = self.archivar_evaluaciones()
+                    if archivadas:
+                        print(f"Evaluaciones archivadas por año: {archivadas}")
+                except Exception as e:
+                    print(f"Error al archivar evaluaciones: {e}")
+                if self._detener_archivado.wait(intervalo_s):
+                    break
+
+        self._hilo_archivado = threading.Thread(target=bucle, daemon=True)
+        self._hilo_archivado.start()
+
+    def detener_archivado(self):
+        """Detiene el archivado periódico."""
+        self._detener_archivado.set()
+
+    def anios_archivo(
+        self, desde: Optional[str] = None, hasta: Optional[str] = None
+    ) -> Tuple[List[int], List[int]]:
+        """
+        Años de archivo que puede contener el rango de fechas, del más
+        reciente al más antiguo, repartidos en (adjuntables, omitidos): una
+        consulta adjunta a lo sumo MAX_ARCHIVOS_ADJUNTOS - 1 archivos.
+        """
+        anios = self.listar_archivos()
+        if desde:
+            anios = [a for a in anios if a >= int(_validar_fecha(desde)[:4])]
+        if hasta:
+            anios = [a for a in anios if a <= int(_validar_fecha(hasta)[:4])]
+        limite = MAX_ARCHIVOS_ADJUNTOS - 1
+        return anios[:limite], anios[limite:]
+
+    def _lotes_archivo(self, incluir_archivo: bool) -> List[Optional[List[int]]]:
+        """
+        Años de archivo repartidos en lotes que caben en una conexión, del
+        más reciente al más antiguo. La base caliente va con el primer lote.
+        """
+        if not incluir_archivo:
+            return [None]
+        anios = self.listar_archivos()
+        limite = MAX_ARCHIVOS_ADJUNTOS - 1
+        lotes = [anios[i : i + limite] for i in range(0, len(anios), limite)]
+        return lotes or [[]]
+
+    def _conectar_lectura(
+        self, incluir_archivo: bool, anios: Optional[List[int]] = None
+    ) -> sqlite3.Connection:
+        """
+        Abre una conexión a la base caliente y, si se pide, adjunta en solo
+        lectura los archivos de `anios` (por defecto, los más recientes que
+        caben; ver `anios_archivo`).
+        """
+        conn = sqlite3.connect(self.db_path, uri=True)
+        if incluir_archivo:
+            if anios is None:
+                anios = self.anios_archivo()[0]
+            for anio in anios:
+                ruta = pathname2url(os.path.abspath(self.ruta_archivo(anio)))
+                conn.execute(
+                    f"ATTACH DATABASE ? AS arch_{int(anio)}", (f"file:{ruta}?mode=ro",)
+                )
+        return conn
+
+    def _fuente_evaluaciones(
+        self,
+        conn: sqlite3.Connection,
+        incluir_archivo: bool,
+        incluir_principal: bool = True,
+    ) -> str:
+        """
+        Devuelve la expresión FROM con las evaluaciones a consultar: solo la
+        tabla caliente o su unión con los archivos adjuntos a la conexión.
+        incluir_principal: Si es False, solo los archivos adjuntos.
+        """
+        if not incluir_archivo:
+            return "evaluaciones"
+        esquemas = [
+            fila[1]
+            for fila in conn.execute("PRAGMA database_list")
+            if fila[1].startswith("arch_")
+        ]
+        if not esquemas:
+            return "evaluaciones"
+        partes = (["SELECT * FROM main.evaluaciones"] if incluir_principal else []) + [
+            f"SELECT * FROM {esquema}.evaluaciones" for esquema in esquemas
+        ]
+        return "(" + " UNION ALL ".join(partes) + ")"
+
+
+def _validar_fecha(fecha: str) -> str:
+    """Normaliza una fecha "AAAA-MM-DD" (admite hora al final, que se ignora)."""
+    try:
+        return datetime.strptime(str(fecha).strip()[:10], "%Y-%m-%d").strftime(
+            "%Y-%m-%d"
+        )
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {fecha!r} (se espera AAAA-MM-DD)")
+
+
+# Instancia global del gestor de base de datos, creada en el primer uso
+_db_manager: Optional[DatabaseManager] = None
+_db_manager_lock = threading.Lock()
+
+
+def get_db_manager() -> DatabaseManager:
+    """Retorna la instancia global del gestor, creándola la primera vez."""
+    global _db_manager
+    if _db_manager is None:
+        with _db_manager_lock:
+            if _db_manager is None:
+                _db_manager = DatabaseManager(
+                    meses_retencion=int(os.getenv("MESES_RETENCION_EVALUACIONES", "12"))
+                )
+    return _db_manager
+
+
+def __getattr__(name):
+    # Compatibilidad con `from backend.database import db_manager`
+    if name == "db_manager":
+        return get_db_manager()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == "__main__":
+    # Reextrae calificación y recomendaciones de todas las evaluaciones
+    # guardadas (base caliente y archivos) tras cambiar los patrones.
+    # Uso: python -m backend.database
+    import time
 
-            # Distribución por calificación
-            cursor.execute("""
-                SELECT calificacion, COUNT(*) as cantidad 
-                FROM evaluaciones 
-                WHERE calificacion IS NOT NULL
-                GROUP BY calificacion
-            """)
-            calificaciones = dict(cursor.fetchall())
-
-            # Distribución por tipo
-            cursor.execute("""
-                SELECT tipo, COUNT(*) as cantidad 
-                FROM evaluaciones 
-                GROUP BY tipo
-            """)
-            tipos = dict(cursor.fetchall())
-
-            return {
-                "total_evaluaciones": total,
-                "por_calificacion": calificaciones,
-                "por_tipo": tipos,
-            }
-
-
-# Instancia global del gestor de base de datos
-db_manager = DatabaseManager()
+    inicio = time.perf_counter()
+    resultado = get_db_manager().reextraer_calificaciones()
+    duracion = time.perf_counter() - inicio
+    print(
+        f"{resultado['revisadas']} evaluaciones revisadas, "
+        f"{resultado['actualizadas']} actualizadas en {duracion:.1f} s "
+        f"({resultado['revisadas'] / max(duracion, 1e-9):,.0f} filas/s)"
+    )
@@ -0,0 +1,244 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def huella_archivo(ruta: str, tamano_bloque: int = 1024 * 1024) -> str:
+    """Hash del contenido de un archivo, leído por bloques."""
+    # Basta una huella rápida del contenido; no se necesita resistencia criptográfica
+    hasher = hashlib.sha1()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b""):
+            hasher.update(bloque)
+    return hasher.hexdigest()
+
+
+class DatasetCache:
+    """
+    Caché en disco de CSV ya leídos y con tipos optimizados.
+
+    Cada archivo subido se identifica por el hash de su contenido; el
+    DataFrame se guarda en formato Feather (Arrow IPC sin compresión, que
+    se lee mapeando el archivo en memoria) junto con un JSON con el formato
+    detectado y el reporte de tipos. Si la carpeta supera la cuota, se
+    eliminan los datasets usados hace más tiempo.
+    """
+
+    def __init__(
+        self, directorio: Optional[str] = None, cuota_mb: Optional[float] = None
+    ):
+        """
+        directorio: Carpeta de la caché (DATASETS_CACHE_DIR, por defecto
+            "indicadores_datasets" en la carpeta temporal del sistema)
+        cuota_mb: Tamaño máximo de la carpeta (DATASETS_CACHE_MB, 1024 MB)
+        """
+        self.directorio = directorio or os.getenv(
+            "DATASETS_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "indicadores_datasets"),
+        )
+        if cuota_mb is None:
+            cuota_mb = float(os.getenv("DATASETS_CACHE_MB", "1024"))
+        self.cuota_bytes = cuota_mb * 1024 * 1024
+        os.makedirs(self.directorio, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _rutas(self, huella: str):
+        base = os.path.join(self.directorio, huella)
+        return f"{base}.feather", f"{base}.json"
+
+    def obtener(self, huella: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna {"df", "formato", "reporte_tipos"} del dataset cacheado, o
+        None si no está (o no se puede leer).
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+        except ImportError:
+            return None
+        ruta_datos, ruta_meta = self._rutas(huella)
+        try:
+            with open(ruta_meta, encoding="utf-8") as archivo:
+                metadatos = json.load(archivo)
+            tabla = feather.read_table(ruta_datos, memory_map=True)
+            # Se materializa en bloques propios (escribibles): el código
+            # generado puede modificar el DataFrame
+            df = tabla.to_pandas()
+        except (OSError, ValueError, pa.ArrowException):
+            return None
+        for ruta in (ruta_datos, ruta_meta):
+            self._tocar(ruta)
+        return {**metadatos, "df": df}
+
+    def guardar(self, huella: str, df: "pd.DataFrame", metadatos: Dict[str, Any]):
+        """Guarda el DataFrame y sus metadatos, y aplica la cuota."""
+        try:
+            import pyarrow as pa
+            import pyarrow.feather as feather
+        except ImportError:
+            return
+        ruta_datos, ruta_meta = self._rutas(huella)
+        # Escritura atómica: un lector concurrente nunca ve un archivo a medias
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+        os.close(fd)
+        try:
+            feather.write_feather(df, temporal, compression="uncompressed")
+            os.replace(temporal, ruta_datos)
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as archivo:
+                json.dump(metadatos, archivo, ensure_ascii=False, default=str)
+            os.replace(temporal, ruta_meta)
+        except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+            print(f"No se pudo guardar el dataset en la caché: {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        self.limpiar()
+
+    def limpiar(self) -> int:
+        """Elimina los datasets menos usados hasta respetar la cuota."""
+        with self._lock:
+            datasets: Dict[str, list] = {}
+            for entrada in os.scandir(self.directorio):
+                huella, extension = os.path.splitext(entrada.name)
+                if extension not in (".feather", ".json"):
+                    continue
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                actual = datasets.setdefault(huella, [0.0, 0])
+                actual[0] = max(actual[0], info.st_mtime)
+                actual[1] += info.st_size
+            total = sum(tamano for _, tamano in datasets.values())
+            eliminados = 0
+            for huella, (_, tamano) in sorted(datasets.items(), key=lambda d: d[1][0]):
+                if total <= self.cuota_bytes:
+                    break
+                for ruta in self._rutas(huella):
+                    try:
+                        os.remove(ruta)
+                    except FileNotFoundError:
+                        pass
+                total -= tamano
+                eliminados += 1
+            return eliminados
+
+    def _tocar(self, ruta: str):
+        # La fecha de modificación hace de "último uso" para la cuota
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            pass
+
+
+# Caché global, creada en el primer uso
+_dataset_cache: Optional[DatasetCache] = None
+_dataset_cache_lock = threading.Lock()
+
+
+def get_dataset_cache() -> DatasetCache:
+    """Retorna la caché global de datasets, creándola la primera vez."""
+    global _dataset_cache
+    if _dataset_cache is None:
+        with _dataset_cache_lock:
+            if _dataset_cache is None:
+                _dataset_cache = DatasetCache()
+    return _dataset_cache
+
+
+class CargaDataset:
+    """
+    Carga de un CSV subido, desde la fuente más barata disponible:
+
+    1. el estado de la sesión, si es el mismo archivo de la ejecución anterior
+    2. la caché en disco, si ya se leyó un archivo con el mismo contenido
+    3. la lectura por bloques del CSV (ver `IngestaCSV`), cuyo resultado
+       optimizado se guarda en la caché
+
+    `muestra` está disponible antes que `resultado` solo en el tercer caso.
+    El DataFrame final queda además en `estado` (un `gr.State` por sesión).
+    """
+
+    def __init__(self, ruta: str, estado: Optional[Dict[str, Any]] = None):
+        from backend.csv_ingestion import iniciar_ingesta
+
+        self.ruta = ruta
+        self.estado = estado if estado is not None else {}
+        info = os.stat(ruta)
+        self._firma = (ruta, info.st_size, info.st_mtime)
+        self._ingesta = None
+        self._plan = None
+        if self.estado.get("firma") == self._firma:
+            self.origen = "sesion"
+            self.huella = self.estado["huella"]
+            self._cargado = self.estado
+        else:
+            self.huella = huella_archivo(ruta)
+            self._cargado = get_dataset_cache().obtener(self.huella)
+            if self._cargado is not None:
+                self.origen = "cache"
+                self._actualizar_estado()
+            else:
+                self.origen = "csv"
+                self._ingesta = iniciar_ingesta(ruta)
+
+    @property
+    def formato(self) -> Dict[str, Any]:
+        if self._cargado is not None:
+            return self._cargado["formato"]
+        return self._ingesta.formato
+
+    def muestra(self) -> "pd.DataFrame":
+        """Filas de muestra, ya con los tipos optimizados, para el prompt."""
+        from backend.csv_ingestion import limites_ingesta_configurados
+        from backend.dtype_optimizer import optimizar_tipos, planear_tipos
+
+        if self._cargado is not None:
+            df = self._cargado["df"]
+            n = min(len(df), limites_ingesta_configurados()["muestra_filas"])
+            return df.sample(n, random_state=0).sort_index()
+        # Los tipos se deciden con la muestra y se aplican igual al archivo
+        # completo, así el modelo ve los mismos tipos con los que se ejecuta
+        muestra = self._ingesta.esperar_muestra()
+        self._plan = planear_tipos(muestra)
+        return optimizar_tipos(muestra, self._plan)[0]
+
+    def resultado(self):
+        """Espera el DataFrame completo. Retorna (df, reporte de tipos)."""
+        from backend.dtype_optimizer import optimizar_tipos
+
+        if self._cargado is None:
+            df, reporte = optimizar_tipos(self._ingesta.resultado(), self._plan)
+            self._cargado = {
+                "df": df,
+                "formato": self._ingesta.formato,
+                "reporte_tipos": reporte,
+            }
+            get_dataset_cache().guardar(
+                self.huella,
+                df,
+                {"formato": self._ingesta.formato, "reporte_tipos": reporte},
+            )
+            self._actualizar_estado()
+        return self._cargado["df"], self._cargado["reporte_tipos"]
+
+    def cancelar(self):
+        if self._ingesta is not None:
+            self._ingesta.cancelar()
+
+    def _actualizar_estado(self):
+        # Un solo dataset por sesión: el último archivo usado
+        self.estado.clear()
+        self.estado.update(self._cargado, firma=self._firma, huella=self.huella)
+
+
+def abrir_dataset(ruta: str, estado: Optional[Dict[str, Any]] = None) -> CargaDataset:
+    """Comienza a cargar un CSV subido; ver `CargaDataset`."""
+    return CargaDataset(ruta, estado)
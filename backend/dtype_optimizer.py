@@ -0,0 +1,155 @@
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Textos que se interpretan como booleanos
+VALORES_BOOLEANOS = {"true": True, "false": False, "verdadero": True, "falso": False}
+
+# Fechas ISO (con hora opcional) y meses "YYYY-MM", como en los datasets incluidos
+PATRON_FECHA = re.compile(r"\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2})?)?")
+PATRON_MES = re.compile(r"\d{4}-\d{2}")
+
+# Filas que se inspeccionan para decidir el tipo de una columna de texto
+FILAS_INSPECCION = 1000
+
+
+def _tipo_texto(columna: "pd.Series", umbral_categoria: float) -> Optional[str]:
+    """Decide la conversión de una columna de texto a partir de sus valores."""
+    valores = columna.dropna()
+    if valores.empty or not all(isinstance(v, str) for v in valores.iloc[:100]):
+        return None
+    inspeccion = valores.iloc[:FILAS_INSPECCION].str.strip()
+    if inspeccion.str.lower().isin(VALORES_BOOLEANOS).all():
+        return "booleano"
+    if inspeccion.str.fullmatch(PATRON_FECHA).all():
+        return "fecha"
+    if inspeccion.str.fullmatch(PATRON_MES).all():
+        return "mes"
+    unicos = valores.nunique()
+    if unicos < len(valores) and unicos <= umbral_categoria * len(valores):
+        return "categoria"
+    return None
+
+
+def planear_tipos(df: "pd.DataFrame", umbral_categoria: float = 0.5) -> Dict[str, str]:
+    """
+    Conversión propuesta para cada columna de texto: "booleano", "fecha",
+    "mes" o "categoria". Las columnas numéricas no se incluyen porque su
+    reducción depende del rango de todos los valores.
+
+    Se puede calcular sobre una muestra y aplicar después al DataFrame
+    completo con `optimizar_tipos`, para que ambos queden con los mismos tipos.
+    """
+    plan = {}
+    for nombre, columna in df.items():
+        if columna.dtype == object:
+            tipo = _tipo_texto(columna, umbral_categoria)
+            if tipo:
+                plan[nombre] = tipo
+    return plan
+
+
+def _convertir_texto(columna: "pd.Series", tipo: str) -> "pd.Series":
+    import pandas as pd
+
+    if tipo == "booleano":
+        convertida = columna.str.strip().str.lower().map(VALORES_BOOLEANOS)
+        if convertida[columna.notna()].isna().any():
+            raise ValueError("valores no booleanos")
+        return convertida.astype("boolean" if convertida.isna().any() else bool)
+    if tipo == "fecha":
+        return pd.to_datetime(columna, format="ISO8601")
+    if tipo == "mes":
+        # Primer día del mes: se grafica y ordena como fecha
+        return pd.to_datetime(columna, format="%Y-%m")
+    if tipo == "categoria":
+        return columna.astype("category")
+    raise ValueError(f"Conversión desconocida: {tipo}")
+
+
+def _reducir_numero(columna: "pd.Series", entero_minimo: str) -> "pd.Series":
+    import numpy as np
+
+    if columna.dtype.kind in "iu":
+        # Nunca por debajo de `entero_minimo`: en tipos muy chicos una
+        # multiplicación del código generado podría desbordarse sin aviso
+        minimo, maximo = columna.min(), columna.max()
+        for tipo in ("int8", "int16", "int32"):
+            if np.dtype(tipo).itemsize < np.dtype(entero_minimo).itemsize:
+                continue
+            info = np.iinfo(tipo)
+            if info.min <= minimo and maximo <= info.max:
+                return columna.astype(tipo)
+        return columna
+    if columna.dtype == np.float64:
+        # float32 solo si no se pierde ningún valor
+        reducida = columna.astype(np.float32)
+        if np.array_equal(
+            reducida.to_numpy(np.float64), columna.to_numpy(), equal_nan=True
+        ):
+            return reducida
+    return columna
+
+
+def optimizar_tipos(
+    df: "pd.DataFrame",
+    plan: Optional[Dict[str, str]] = None,
+    umbral_categoria: float = 0.5,
+    entero_minimo: str = "int32",
+) -> Tuple["pd.DataFrame", List[Dict[str, Any]]]:
+    """
+    Reduce la memoria de un DataFrame:
+
+    - textos de baja cardinalidad a `category`
+    - fechas ISO y meses "YYYY-MM" a datetime64
+    - "True"/"False" a bool (o `boolean` si hay nulos)
+    - enteros al tipo más chico que los contiene (desde `entero_minimo`) y
+      float64 a float32 cuando la conversión no pierde precisión
+
+    Args:
+        df: DataFrame a optimizar (no se modifica)
+        plan: Conversiones de texto de `planear_tipos`; si falta, se calcula.
+            Una conversión que no vale para todos los valores se omite.
+        umbral_categoria: Proporción máxima de valores únicos para `category`
+        entero_minimo: Tipo entero más chico permitido
+
+    Returns:
+        (DataFrame optimizado, reporte por columna con tipo y bytes antes y
+        después, solo de las columnas que cambiaron)
+    """
+    import pandas as pd
+
+    if df.columns.has_duplicates:
+        return df, []
+    if plan is None:
+        plan = planear_tipos(df, umbral_categoria)
+    columnas = {}
+    reporte = []
+    for nombre, columna in df.items():
+        nueva = columna
+        try:
+            if nombre in plan and columna.dtype == object:
+                nueva = _convertir_texto(columna, plan[nombre])
+            elif columna.dtype.kind in "iuf":
+                nueva = _reducir_numero(columna, entero_minimo)
+        except (ValueError, TypeError):
+            nueva = columna
+        columnas[nombre] = nueva
+        if nueva is not columna:
+            reporte.append(
+                {
+                    "columna": nombre,
+                    "tipo_antes": str(columna.dtype),
+                    "tipo_despues": str(nueva.dtype),
+                    "bytes_antes": int(columna.memory_usage(index=False, deep=True)),
+                    "bytes_despues": int(nueva.memory_usage(index=False, deep=True)),
+                }
+            )
+    return pd.DataFrame(columnas, index=df.index), reporte
+
+
+def bytes_ahorrados(reporte: List[Dict[str, Any]]) -> int:
+    """Total de bytes ahorrados según un reporte de `optimizar_tipos`."""
+    return sum(fila["bytes_antes"] - fila["bytes_despues"] for fila in reporte)
@@ -0,0 +1,131 @@
+import sys
+import time
+import pstats
+import cProfile
+import tracemalloc
+from typing import Any, Dict
+
+from backend.code_validator import NOMBRE_CODIGO_GENERADO
+
+# Entradas que se reportan en cada sección del perfil
+MAX_LINEAS_PERFIL = 15
+MAX_FUNCIONES_PERFIL = 15
+
+
+class PerfilEjecucion:
+    """
+    Perfil de una ejecución de código generado.
+
+    - Tiempo real por línea del código generado (incluye lo que tarden las
+      llamadas a pandas, seaborn, etc. hechas desde esa línea).
+    - Funciones con mayor tiempo acumulado, según cProfile.
+    - Pico de memoria asignada desde Python, según tracemalloc.
+
+    Se usa en dos fases: `ejecucion()` envuelve el `exec` y `renderizado()`
+    la captura de figuras, para separar el tiempo de dibujo del de análisis.
+    """
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self._lineas: Dict[int, list] = {}
+        # Por frame del código generado: (línea en curso, instante en que empezó)
+        self._en_curso: Dict[int, tuple] = {}
+        self._tiempos = {"ejecucion_s": 0.0, "renderizado_s": 0.0}
+        self._tracemalloc_propio = False
+
+    def _traza(self, frame, evento, arg):
+        # Solo se trazan línea a línea los frames del código generado
+        if frame.f_code.co_filename != NOMBRE_CODIGO_GENERADO:
+            return None
+        if evento == "exception":
+            # La línea en curso sigue acumulando tiempo hasta el próximo evento
+            return self._traza
+        ahora = time.perf_counter()
+        clave = id(frame)
+        anterior = self._en_curso.pop(clave, None)
+        if anterior is not None:
+            linea, inicio = anterior
+            acumulado = self._lineas.setdefault(linea, [0.0, 0])
+            acumulado[0] += ahora - inicio
+            acumulado[1] += 1
+        if evento == "line":
+            self._en_curso[clave] = (frame.f_lineno, ahora)
+        return self._traza
+
+    def _iniciar(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracemalloc_propio = True
+        tracemalloc.reset_peak()
+        self._traza_previa = sys.gettrace()
+        sys.settrace(self._traza)
+        self._profiler.enable()
+
+    def _detener(self):
+        self._profiler.disable()
+        sys.settrace(self._traza_previa)
+        self._memoria_pico = tracemalloc.get_traced_memory()[1]
+        if self._tracemalloc_propio:
+            tracemalloc.stop()
+            self._tracemalloc_propio = False
+
+    def ejecucion(self) -> "_Fase":
+        return _Fase(self, "ejecucion_s", trazar=True)
+
+    def renderizado(self) -> "_Fase":
+        return _Fase(self, "renderizado_s", trazar=False)
+
+    def reporte(self) -> Dict[str, Any]:
+        """Reporte serializable: tiempos por fase, líneas, funciones y memoria."""
+        lineas = sorted(self._lineas.items(), key=lambda item: -item[1][0])
+        funciones = []
+        estadisticas = pstats.Stats(self._profiler).stats
+        ordenadas = sorted(estadisticas.items(), key=lambda item: -item[1][3])
+        for (archivo, linea, nombre), (_, llamadas, total, acumulado, _) in ordenadas:
+            if nombre.startswith("<method 'disable'"):
+                continue
+            funciones.append(
+                {
+                    "funcion": nombre,
+                    "ubicacion": f"{archivo}:{linea}" if linea else archivo,
+                    "llamadas": llamadas,
+                    "tiempo_propio_s": round(total, 4),
+                    "tiempo_acumulado_s": round(acumulado, 4),
+                }
+            )
+            if len(funciones) >= MAX_FUNCIONES_PERFIL:
+                break
+        return {
+            **{fase: round(t, 4) for fase, t in self._tiempos.items()},
+            "memoria_pico_mb": round(getattr(self, "_memoria_pico", 0) / 2**20, 2),
+            "lineas": [
+                {"linea": linea, "tiempo_s": round(t, 4), "ejecuciones": veces}
+                for linea, (t, veces) in lineas[:MAX_LINEAS_PERFIL]
+            ],
+            "funciones": funciones,
+        }
+
+
+class _Fase:
+    """Contexto que mide una fase del perfil (con o sin traza por línea)."""
+
+    def __init__(self, perfil: PerfilEjecucion, nombre: str, trazar: bool):
+        self.perfil = perfil
+        self.nombre = nombre
+        self.trazar = trazar
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        if self.trazar:
+            self.perfil._iniciar()
+        else:
+            self.perfil._profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.trazar:
+            self.perfil._detener()
+        else:
+            self.perfil._profiler.disable()
+        self.perfil._tiempos[self.nombre] += time.perf_counter() - self._inicio
+        return False
@@ -0,0 +1,220 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from typing import Dict, Optional, Set
+
+
+class FigureStore:
+    """
+    Almacén de figuras generadas en una carpeta dedicada.
+
+    - Los archivos se nombran por el hash de su contenido, así que una misma
+      gráfica se guarda una sola vez.
+    - Cada sesión de Gradio registra los archivos que usa; al cerrar la
+      sesión se borran los que ninguna otra sesión necesita.
+    - Una limpieza periódica elimina los archivos sin uso más antiguos que el
+      TTL y, si la carpeta supera la cuota, los usados hace más tiempo (LRU).
+
+    Los procesos trabajadores del pool solo escriben (`guardar`); la
+    propiedad por sesión y la limpieza viven en el proceso del servidor.
+    """
+
+    def __init__(
+        self,
+        directorio: Optional[str] = None,
+        cuota_mb: Optional[float] = None,
+        ttl_horas: Optional[float] = None,
+        gracia_s: Optional[float] = None,
+    ):
+        """
+        directorio: Carpeta de las figuras (FIGURAS_DIR, por defecto
+            "indicadores_figuras" en la carpeta temporal del sistema)
+        cuota_mb: Tamaño máximo de la carpeta (FIGURAS_CUOTA_MB, 500 MB)
+        ttl_horas: Antigüedad máxima de una figura sin uso (FIGURAS_TTL_HORAS, 24 h)
+        gracia_s: La cuota nunca borra figuras usadas hace menos de esto
+            (FIGURAS_GRACIA_S, 600 s): pueden pertenecer a una respuesta que
+            todavía se está enviando y aún no tiene sesión registrada
+        """
+        self.directorio = directorio or os.getenv(
+            "FIGURAS_DIR", os.path.join(tempfile.gettempdir(), "indicadores_figuras")
+        )
+        self.cuota_bytes = (
+            (
+                float(os.getenv("FIGURAS_CUOTA_MB", "500"))
+                if cuota_mb is None
+                else cuota_mb
+            )
+            * 1024
+            * 1024
+        )
+        self.ttl_s = (
+            float(os.getenv("FIGURAS_TTL_HORAS", "24"))
+            if ttl_horas is None
+            else ttl_horas
+        ) * 3600
+        self.gracia_s = (
+            float(os.getenv("FIGURAS_GRACIA_S", "600"))
+            if gracia_s is None
+            else gracia_s
+        )
+        os.makedirs(self.directorio, exist_ok=True)
+        self._por_sesion: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo_limpieza: Optional[threading.Thread] = None
+
+    def guardar(self, datos: bytes, formato: str, sesion: Optional[str] = None) -> str:
+        """
+        Guarda los bytes de una figura y retorna su ruta.
+        Si ya existe una figura idéntica, se reutiliza y se marca como usada.
+        """
+        nombre = f"{hashlib.sha256(datos).hexdigest()}.{formato}"
+        ruta = os.path.join(self.directorio, nombre)
+        if os.path.exists(ruta):
+            self._tocar(ruta)
+        else:
+            # Escritura atómica: otro proceso nunca ve un archivo a medias
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix=".tmp")
+            with os.fdopen(fd, "wb") as archivo:
+                archivo.write(datos)
+            os.replace(temporal, ruta)
+        if sesion:
+            self.registrar(ruta, sesion)
+        return ruta
+
+    def registrar(self, ruta: str, sesion: str):
+        """Marca una figura como usada por una sesión."""
+        with self._lock:
+            self._por_sesion.setdefault(sesion, set()).add(ruta)
+        self._tocar(ruta)
+
+    def liberar(self, rutas, sesion: str) -> int:
+        """
+        Quita a una sesión la propiedad de algunas figuras y borra las que
+        ya no usa nadie. Retorna el número de archivos eliminados.
+        """
+        with self._lock:
+            propias = self._por_sesion.get(sesion, set())
+            propias.difference_update(rutas)
+            if not propias:
+                self._por_sesion.pop(sesion, None)
+            en_uso = self._rutas_en_uso()
+        eliminados = 0
+        for ruta in set(rutas) - en_uso:
+            if self._eliminar(ruta):
+                eliminados += 1
+        return eliminados
+
+    def liberar_sesion(self, sesion: str) -> int:
+        """
+        Borra las figuras de una sesión que ya no usa ninguna otra.
+        Retorna el número de archivos eliminados.
+        """
+        with self._lock:
+            rutas = self._por_sesion.pop(sesion, set())
+            en_uso = self._rutas_en_uso()
+        eliminados = 0
+        for ruta in rutas - en_uso:
+            if self._eliminar(ruta):
+                eliminados += 1
+        return eliminados
+
+    def limpiar(self) -> int:
+        """
+        Aplica el TTL y la cuota de disco. Retorna el número de archivos eliminados.
+
+        La cuota no toca los temporales (.tmp) que otro proceso puede estar
+        escribiendo ni las figuras más recientes que el periodo de gracia; los
+        temporales abandonados los elimina el TTL.
+        """
+        with self._lock:
+            en_uso = self._rutas_en_uso()
+        ahora = time.time()
+        archivos = []
+        for entrada in os.scandir(self.directorio):
+            if not entrada.is_file():
+                continue
+            try:
+                info = entrada.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+
+        eliminados = 0
+        restantes = []
+        for mtime, tamano, ruta in archivos:
+            if ruta not in en_uso and ahora - mtime > self.ttl_s:
+                if self._eliminar(ruta):
+                    eliminados += 1
+                continue
+            restantes.append((mtime, tamano, ruta))
+
+        total = sum(tamano for _, tamano, _ in restantes)
+        if total > self.cuota_bytes:
+            # LRU: primero las figuras sin sesión activa, luego las demás
+            restantes.sort(key=lambda item: (item[2] in en_uso, item[0]))
+            for mtime, tamano, ruta in restantes:
+                if total <= self.cuota_bytes:
+                    break
+                if ruta.endswith(".tmp") or ahora - mtime < self.gracia_s:
+                    continue
+                if self._eliminar(ruta):
+                    eliminados += 1
+                    total -= tamano
+        return eliminados
+
+    def iniciar_limpieza_periodica(self, intervalo_s: float = 300):
+        """Lanza (una sola vez) un hilo que ejecuta `limpiar` periódicamente."""
+        if self._hilo_limpieza is not None:
+            return
+
+        def bucle():
+            while not self._detener.wait(intervalo_s):
+                try:
+                    self.limpiar()
+                except Exception as e:
+                    print(f"Error limpiando figuras: {e}")
+
+        self._hilo_limpieza = threading.Thread(target=bucle, daemon=True)
+        self._hilo_limpieza.start()
+
+    def detener(self):
+        """Detiene la limpieza periódica."""
+        self._detener.set()
+
+    def _rutas_en_uso(self) -> Set[str]:
+        en_uso: Set[str] = set()
+        for rutas in self._por_sesion.values():
+            en_uso |= rutas
+        return en_uso
+
+    def _tocar(self, ruta: str):
+        # La fecha de modificación hace de "último uso" para TTL y LRU
+        try:
+            os.utime(ruta)
+        except FileNotFoundError:
+            pass
+
+    def _eliminar(self, ruta: str) -> bool:
+        try:
+            os.remove(ruta)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+# Almacén global, creado en el primer uso
+_figure_store: Optional[FigureStore] = None
+_figure_store_lock = threading.Lock()
+
+
+def get_figure_store() -> FigureStore:
+    """Retorna el almacén global de figuras, creándolo la primera vez."""
+    global _figure_store
+    if _figure_store is None:
+        with _figure_store_lock:
+            if _figure_store is None:
+                _figure_store = FigureStore()
+    return _figure_store
@@ -0,0 +1,433 @@
+import ast
+import re
+import operator
+import unicodedata
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class ErrorFormula(Exception):
+    """Fórmula inválida o no aplicable al dataset, con un mensaje apto para el usuario."""
+
+
+# Agregaciones por grupo (nombre en la fórmula -> método de pandas)
+AGREGACIONES = {
+    "sum": "sum",
+    "suma": "sum",
+    "mean": "mean",
+    "promedio": "mean",
+    "median": "median",
+    "mediana": "median",
+    "min": "min",
+    "max": "max",
+    "count": "count",
+    "contar": "count",
+}
+
+# Funciones fila a fila
+FUNCIONES_FILA = {"abs", "dias", "col"}
+
+OPERADORES = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+    ast.Mod: operator.mod,
+}
+
+COMPARACIONES = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+
+# Periodos de agrupación (alias de pandas para `to_period`)
+PERIODOS = {"dia": "D", "semana": "W", "mes": "M", "trimestre": "Q", "anio": "Y"}
+
+# Fórmulas compiladas que se conservan en memoria
+MAX_CACHE_FORMULAS = 256
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """Nombre comparable: minúsculas, sin tildes y con "_" en lugar de espacios."""
+    sin_tildes = unicodedata.normalize("NFKD", str(nombre)).encode("ascii", "ignore")
+    return re.sub(r"\W+", "_", sin_tildes.decode().strip().lower()).strip("_")
+
+
+def _constante(nodo: ast.Constant) -> Any:
+    # Los enteros se evalúan como float: la potencia y la repetición de textos
+    # con enteros de Python no tienen límite ("9**9**9**9" o "'a' * 10**10"
+    # bloquearían el proceso), mientras que con float desbordan enseguida
+    valor = nodo.value
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return float(valor)
+    return valor
+
+
+class _Validador(ast.NodeVisitor):
+    """Acepta solo aritmética, comparaciones, lógica y las funciones permitidas."""
+
+    PERMITIDOS = (
+        ast.Expression,
+        ast.BinOp,
+        ast.UnaryOp,
+        ast.BoolOp,
+        ast.Compare,
+        ast.Call,
+        ast.Name,
+        ast.Constant,
+        ast.Load,
+        ast.USub,
+        ast.UAdd,
+        ast.Not,
+        ast.And,
+        ast.Or,
+        *OPERADORES,
+        *COMPARACIONES,
+    )
+
+    def __init__(self):
+        self.columnas: List[str] = []
+
+    def generic_visit(self, nodo):
+        if not isinstance(nodo, self.PERMITIDOS):
+            raise ErrorFormula(
+                f"Elemento no permitido en la fórmula: {type(nodo).__name__}"
+            )
+        super().generic_visit(nodo)
+
+    def visit_Constant(self, nodo):
+        if not isinstance(nodo.value, (int, float, str, bool)):
+            raise ErrorFormula(f"Valor no permitido en la fórmula: {nodo.value!r}")
+        try:
+            _constante(nodo)
+        except OverflowError:
+            raise ErrorFormula("Número demasiado grande en la fórmula.")
+
+    def visit_Name(self, nodo):
+        if nodo.id in AGREGACIONES or nodo.id in FUNCIONES_FILA:
+            raise ErrorFormula(f"Falta abrir paréntesis después de {nodo.id}")
+        self.columnas.append(nodo.id)
+
+    def visit_Call(self, nodo):
+        if not isinstance(nodo.func, ast.Name):
+            raise ErrorFormula("Solo se pueden llamar las funciones permitidas.")
+        nombre = nodo.func.id
+        if nombre not in AGREGACIONES and nombre not in FUNCIONES_FILA:
+            raise ErrorFormula(
+                f"Función desconocida: {nombre}. Disponibles: "
+                + ", ".join(sorted({*AGREGACIONES, *FUNCIONES_FILA}))
+            )
+        if nodo.keywords or len(nodo.args) > 1:
+            raise ErrorFormula(f"{nombre} recibe un solo argumento.")
+        if not nodo.args and nombre not in ("count", "contar"):
+            raise ErrorFormula(f"{nombre} necesita un argumento.")
+        if nombre == "col":
+            argumento = nodo.args[0]
+            if not (
+                isinstance(argumento, ast.Constant) and isinstance(argumento.value, str)
+            ):
+                raise ErrorFormula("col recibe el nombre de la columna entre comillas.")
+            self.columnas.append(argumento.value)
+            return
+        for argumento in nodo.args:
+            self.visit(argumento)
+
+
+class Formula:
+    """
+    Fórmula de indicador compilada a un AST seguro.
+
+    Sintaxis: expresiones aritméticas sobre nombres de columna (se comparan
+    sin tildes ni mayúsculas; `col("nombre raro")` para cualquier otro),
+    comparaciones (`estado == "Abierto"`), `and`/`or`/`not`, y funciones:
+
+    - agregaciones por grupo: sum/suma, mean/promedio, median/mediana, min,
+      max y count/contar (`count()` cuenta filas; `count(condición)` las
+      filas donde se cumple; `count(columna)` los valores no nulos)
+    - fila a fila: abs, dias (diferencia de fechas en días) y col
+
+    Una columna fuera de una agregación se suma dentro de cada grupo, así
+    "avance_real / avance_programado * 100" es el cociente de las sumas del
+    período. Todo se evalúa con operaciones vectorizadas de pandas.
+    """
+
+    def __init__(self, texto: str):
+        self.texto = texto
+        normalizada = texto.replace("×", "*").replace("÷", "/").strip()
+        try:
+            self.arbol = ast.parse(normalizada, mode="eval")
+        except SyntaxError as e:
+            raise ErrorFormula(f"Fórmula con sintaxis inválida: {e.msg}")
+        validador = _Validador()
+        validador.visit(self.arbol)
+        self.columnas = list(dict.fromkeys(validador.columnas))
+
+    def evaluar(self, df: "pd.DataFrame", grupos: Optional["pd.Series"] = None) -> Any:
+        """
+        Evalúa la fórmula sobre `df`. Con `grupos` (una clave por fila)
+        retorna una Series con un valor por grupo; sin él, un escalar.
+        """
+        return _Evaluacion(df, grupos).agregado(self.arbol.body)
+
+
+class _Evaluacion:
+    def __init__(self, df: "pd.DataFrame", grupos: Optional["pd.Series"]):
+        self.df = df
+        self.grupos = grupos
+        self._nombres = {normalizar_nombre(c): c for c in df.columns}
+        self._columnas: Dict[str, "pd.Series"] = {}
+
+    def columna(self, nombre: str) -> "pd.Series":
+        if nombre in self._columnas:
+            return self._columnas[nombre]
+        real = nombre if nombre in self.df.columns else None
+        if real is None:
+            real = self._nombres.get(normalizar_nombre(nombre))
+        if real is None:
+            raise ErrorFormula(
+                f"La columna '{nombre}' no existe. Columnas disponibles: "
+                + ", ".join(map(str, self.df.columns))
+            )
+        serie = self.df[real]
+        if serie.dtype == object:
+            # Textos con fechas, meses o booleanos se convierten como al
+            # cargar un CSV (ver optimizar_tipos)
+            from backend.dtype_optimizer import optimizar_tipos, planear_tipos
+
+            plan = {
+                k: v
+                for k, v in planear_tipos(serie.to_frame()).items()
+                if v != "categoria"
+            }
+            if plan:
+                serie = optimizar_tipos(serie.to_frame(), plan)[0][real]
+        self._columnas[nombre] = serie
+        return serie
+
+    def agrupar(self, serie: Any, metodo: str) -> Any:
+        import pandas as pd
+
+        if not isinstance(serie, pd.Series):
+            # Constante dentro de una agregación: se repite en cada fila
+            serie = pd.Series(serie, index=self.df.index)
+        if metodo in ("sum", "mean", "median") and serie.dtype.kind not in "biufm":
+            raise ErrorFormula(
+                f"No se puede calcular {metodo} de valores no numéricos"
+                f" ({serie.name or 'expresión'}: {serie.dtype})."
+            )
+        if metodo == "count" and serie.dtype.kind == "b":
+            # count(condición): filas donde se cumple
+            metodo, serie = "sum", serie.fillna(False).astype("int64")
+        elif serie.dtype == bool or serie.dtype == "boolean":
+            serie = serie.astype("float64")
+        if self.grupos is None:
+            return getattr(serie, metodo)()
+        return getattr(serie.groupby(self.grupos, observed=True), metodo)()
+
+    def agregado(self, nodo) -> Any:
+        """Valor por grupo: las columnas sueltas se suman en cada grupo."""
+        if isinstance(nodo, ast.Constant):
+            return _constante(nodo)
+        if isinstance(nodo, (ast.Name,)) or (
+            isinstance(nodo, ast.Call) and nodo.func.id in FUNCIONES_FILA
+        ):
+            return self.agrupar(self.fila(nodo), "sum")
+        if isinstance(nodo, ast.Call):
+            metodo = AGREGACIONES[nodo.func.id]
+            if not nodo.args:
+                # count(): filas por grupo
+                return self.agrupar(1, "sum")
+            return self.agrupar(self.fila(nodo.args[0]), metodo)
+        return self._operar(nodo, self.agregado)
+
+    def fila(self, nodo) -> Any:
+        """Valor fila a fila (Series alineada con el DataFrame)."""
+        if isinstance(nodo, ast.Constant):
+            return _constante(nodo)
+        if isinstance(nodo, ast.Name):
+            return self.columna(nodo.id)
+        if isinstance(nodo, ast.Call):
+            nombre = nodo.func.id
+            if nombre in AGREGACIONES:
+                raise ErrorFormula("No se puede anidar una agregación dentro de otra.")
+            if nombre == "col":
+                return self.columna(nodo.args[0].value)
+            valor = self.fila(nodo.args[0])
+            if nombre == "abs":
+                return abs(valor)
+            # dias: diferencia de fechas (Timedelta) a días con decimales
+            try:
+                return valor.dt.total_seconds() / 86400
+            except AttributeError:
+                raise ErrorFormula("dias espera una diferencia entre dos fechas.")
+        return self._operar(nodo, self.fila)
+
+    def _operar(self, nodo, evaluar) -> Any:
+        import numpy as np
+
+        if isinstance(nodo, ast.BinOp):
+            izquierda, derecha = evaluar(nodo.left), evaluar(nodo.right)
+            if isinstance(izquierda, str) or isinstance(derecha, str):
+                # Un texto por un total ("'a' * suma") lo repetiría sin límite
+                raise ErrorFormula(
+                    "Los textos entre comillas solo se pueden comparar o usar en col()."
+                )
+            try:
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    resultado = OPERADORES[type(nodo.op)](izquierda, derecha)
+            except (ZeroDivisionError, OverflowError):
+                return np.nan
+            except TypeError as e:
+                raise ErrorFormula(f"Operación entre tipos incompatibles: {e}")
+            # Divisiones por cero: sin valor en lugar de infinito
+            if hasattr(resultado, "replace") and hasattr(resultado, "dtype"):
+                if resultado.dtype.kind == "f":
+                    return resultado.replace([np.inf, -np.inf], np.nan)
+            elif isinstance(resultado, float) and np.isinf(resultado):
+                return np.nan
+            return resultado
+        if isinstance(nodo, ast.UnaryOp):
+            valor = evaluar(nodo.operand)
+            if isinstance(nodo.op, ast.Not):
+                return ~valor if hasattr(valor, "dtype") else not valor
+            return -valor if isinstance(nodo.op, ast.USub) else valor
+        if isinstance(nodo, ast.BoolOp):
+            valores = [evaluar(v) for v in nodo.values]
+            combinar = operator.and_ if isinstance(nodo.op, ast.And) else operator.or_
+            resultado = valores[0]
+            for valor in valores[1:]:
+                resultado = combinar(resultado, valor)
+            return resultado
+        if isinstance(nodo, ast.Compare):
+            resultado = None
+            izquierda = evaluar(nodo.left)
+            for op, comparador in zip(nodo.ops, nodo.comparators):
+                derecha = evaluar(comparador)
+                try:
+                    parcial = COMPARACIONES[type(op)](izquierda, derecha)
+                except TypeError as e:
+                    raise ErrorFormula(f"Comparación entre tipos incompatibles: {e}")
+                resultado = parcial if resultado is None else resultado & parcial
+                izquierda = derecha
+            return resultado
+        raise ErrorFormula(f"Elemento no soportado: {type(nodo).__name__}")
+
+
+@lru_cache(maxsize=MAX_CACHE_FORMULAS)
+def compilar_formula(texto: str) -> Formula:
+    """Compila (y cachea) una fórmula; lanza ErrorFormula si no es válida."""
+    return Formula(texto)
+
+
+def interpretar_meta(texto: Any) -> Optional[float]:
+    """Primer número de una meta escrita como texto ("95% mensual" -> 95.0)."""
+    if texto is None:
+        return None
+    if isinstance(texto, (int, float)):
+        return float(texto)
+    match = re.search(r"-?\d+(?:[.,]\d+)?", str(texto))
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def columna_de_fecha(df: "pd.DataFrame") -> Optional[str]:
+    """Primera columna con fechas (datetime64, o texto de fechas o meses)."""
+    from backend.dtype_optimizer import planear_tipos
+
+    for nombre, serie in df.items():
+        if serie.dtype.kind == "M":
+            return nombre
+    plan = planear_tipos(df.select_dtypes(include="object"))
+    for nombre, tipo in plan.items():
+        if tipo in ("fecha", "mes"):
+            return nombre
+    return None
+
+
+def calcular_indicador(
+    df: "pd.DataFrame",
+    formula: str,
+    periodo: Optional[str] = "mes",
+    columna_fecha: Optional[str] = None,
+    meta: Any = None,
+    sentido: str = "mayor",
+    por: Optional[str] = None,
+) -> "pd.DataFrame":
+    """
+    Calcula un indicador por período a partir de su fórmula (ver `Formula`).
+
+    Args:
+        df: Dataset sobre el que se calcula
+        formula: Fórmula del indicador
+        periodo: "dia", "semana", "mes", "trimestre", "anio" o None para un
+            único valor con todo el dataset
+        columna_fecha: Columna que define el período; si falta, la primera
+            columna de fechas
+        meta: Valor objetivo (número o texto como "95%")
+        sentido: "mayor" si la meta se cumple con valores mayores o iguales,
+            "menor" si con valores menores o iguales
+        por: Columna adicional de agrupación (p. ej. un rubro o una unidad)
+
+    Returns:
+        DataFrame con columnas periodo, `por` si se indicó, valor y, si hay
+        meta, meta, desviacion y cumple
+    """
+    import pandas as pd
+
+    compilada = compilar_formula(formula)
+    evaluacion = _Evaluacion(df, None)
+    grupos = []
+    if periodo is not None:
+        if periodo not in PERIODOS:
+            raise ErrorFormula(
+                f"Período desconocido: {periodo}. Opciones: {', '.join(PERIODOS)}"
+            )
+        columna_fecha = columna_fecha or columna_de_fecha(df)
+        if columna_fecha is None:
+            raise ErrorFormula(
+                "El dataset no tiene una columna de fechas para agrupar."
+            )
+        fechas = evaluacion.columna(columna_fecha)
+        if fechas.dtype.kind != "M":
+            raise ErrorFormula(f"La columna '{columna_fecha}' no contiene fechas.")
+        grupos.append(fechas.dt.to_period(PERIODOS[periodo]).rename("periodo"))
+    if por is not None:
+        grupos.append(evaluacion.columna(por).rename(por))
+
+    valor = compilada.evaluar(df, grupos or None)
+    if isinstance(valor, pd.Series):
+        resultado = valor.rename("valor").reset_index()
+        if periodo is None:
+            resultado.insert(0, "periodo", "Total")
+        resultado["periodo"] = resultado["periodo"].astype(str)
+    else:
+        resultado = pd.DataFrame({"periodo": ["Total"], "valor": [valor]})
+    return aplicar_meta(resultado, meta, sentido)
+
+
+def aplicar_meta(
+    resultado: "pd.DataFrame", meta: Any = None, sentido: str = "mayor"
+) -> "pd.DataFrame":
+    """
+    Convierte la columna valor a número y, si hay meta, agrega meta,
+    desviacion y cumple (ver `calcular_indicador`).
+    """
+    import pandas as pd
+
+    resultado["valor"] = pd.to_numeric(resultado["valor"], errors="coerce")
+    meta_valor = interpretar_meta(meta)
+    if meta_valor is not None:
+        resultado["meta"] = meta_valor
+        resultado["desviacion"] = resultado["valor"] - meta_valor
+        if sentido == "menor":
+            resultado["cumple"] = resultado["valor"] <= meta_valor
+        else:
+            resultado["cumple"] = resultado["valor"] >= meta_valor
+    return resultado
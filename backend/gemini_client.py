@@ -1,17 +1,32 @@
 import os
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from backend.database import db_manager
-import pandas as pd
+from backend.database import get_db_manager
+from backend.scheduler import INTERACTIVA, MASIVA, get_scheduler
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 load_dotenv()
 
 
-def get_indicator_evaluation(objetivo, indicador, meta, fuente, formula, tipo):
+def _cargar_genai():
+    """Importa el SDK de Gemini en el primer uso (es lento de importar)."""
+    from google import genai
+    from google.genai import types
+
+    return genai, types
+
+
+def get_indicator_evaluation(
+    objetivo, indicador, meta, fuente, formula, tipo, sesion=None
+):
     """
     Llama a la API de Gemini para evaluar un indicador de gestión y guarda el resultado.
+    La llamada tiene prioridad interactiva en el planificador (ver Planificador).
     """
+    genai, types = _cargar_genai()
+
     # Create GenAI client
     client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 
@@ -84,16 +99,18 @@ def get_indicator_evaluation(objetivo, indicador, meta, fuente, formula, tipo):
             response_mime_type="text/plain",
         )
 
-        response = client.models.generate_content(
-            model=model_name,
-            contents=contents,
-            config=generate_content_config,
-        )
+        with get_scheduler().turno(INTERACTIVA, sesion):
+            response = client.models.generate_content(
+                model=model_name,
+                contents=contents,
+                config=generate_content_config,
+            )
+        print(f"Turnos de Gemini: {get_scheduler().resumen_metricas()}")
         respuesta_texto = response.text
 
         # Guardar en la base de datos
         try:
-            evaluacion_id = db_manager.guardar_evaluacion(
+            evaluacion_id = get_db_manager().guardar_evaluacion(
                 objetivo_estrategico=objetivo,
                 indicador=indicador,
                 meta=meta,
@@ -112,10 +129,18 @@ def get_indicator_evaluation(objetivo, indicador, meta, fuente, formula, tipo):
         return f"An error occurred: {e}"
 
 
-def generate_code_from_prompt(user_prompt: str, df: pd.DataFrame) -> str:
+def generate_code_from_prompt(
+    user_prompt: str,
+    df: "pd.DataFrame",
+    sesion: Optional[str] = None,
+    prioridad: str = MASIVA,
+) -> str:
     """
     Genera código Python basado en un prompt de usuario y un DataFrame.
+    Por defecto la llamada es masiva en el planificador: cede el turno a las
+    evaluaciones interactivas en cola.
     """
+    genai, types = _cargar_genai()
     client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
     model_name = "gemini-2.5-flash"  # Bueno para generación de código
 
@@ -138,8 +163,8 @@ def generate_code_from_prompt(user_prompt: str, df: pd.DataFrame) -> str:
     {df_info}
 
     **Requisitos del código:**
-    1. Usa las librerías `pandas`, `matplotlib.pyplot` as `plt`, y `seaborn` as `sns`.
-    2. El DataFrame ya está cargado en una variable llamada `df`. NO incluyas código para cargar datos.
+    1. Usa las librerías `pandas`, `matplotlib.pyplot` as `plt`, y `seaborn` as `sns`. Para gráficas interactivas puedes usar `plotly.express` as `px` o `plotly.graph_objects` as `go`, terminando cada figura con `fig.show()` (nunca `write_html` ni `write_image`). No leas ni escribas archivos (`savefig`, `to_csv`, `read_*`) ni uses `query` o `eval`: filtra con indexación booleana. Lee las columnas con `df["columna"]` (no `df.columna`) y pasa a `agg`, `apply` o `transform` una función, una lambda o el nombre escrito de la agregación (`"sum"`), nunca una variable con texto.
+    2. El DataFrame ya está cargado en una variable llamada `df`. NO incluyas código para cargar datos. Respeta los tipos de datos indicados: las columnas `category` se agrupan con `groupby(..., observed=True)` y las fechas ya son `datetime64` (usa `.dt`, no `.str`).
     3. El código debe ser completo y ejecutable.
     4. Genera al menos una visualización (gráfica).
     5. **IMPORTANTE**: Si necesitas crear múltiples gráficos, usa `plt.figure()` para cada gráfico individual en lugar de `plt.subplot()` o `plt.subplots()`. Cada gráfico debe ser una figura separada.
@@ -161,11 +186,13 @@ def generate_code_from_prompt(user_prompt: str, df: pd.DataFrame) -> str:
         generate_content_config = types.GenerateContentConfig(
             response_mime_type="text/plain",
         )
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt,
-            config=generate_content_config,
-        )
+        with get_scheduler().turno(prioridad, sesion):
+            response = client.models.generate_content(
+                model=model_name,
+                contents=prompt,
+                config=generate_content_config,
+            )
+        print(f"Turnos de Gemini: {get_scheduler().resumen_metricas()}")
 
         code = response.text
         # Limpia la respuesta para obtener solo el código
@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Estados de un trabajo
+EN_COLA = "en_cola"
+EJECUTANDO = "ejecutando"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+ESTADOS_FINALES = (COMPLETADO, FALLIDO)
+
+ESQUEMA_TRABAJOS = """
+    CREATE TABLE IF NOT EXISTS trabajos (
+        id TEXT PRIMARY KEY,
+        tipo TEXT NOT NULL,
+        usuario TEXT NOT NULL,
+        estado TEXT NOT NULL,
+        parametros TEXT NOT NULL,
+        progreso TEXT,
+        resultado TEXT,
+        error TEXT,
+        registro TEXT NOT NULL DEFAULT '',
+        creado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        iniciado TIMESTAMP,
+        terminado TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado);
+    CREATE INDEX IF NOT EXISTS idx_trabajos_usuario ON trabajos (usuario, creado);
+"""
+
+# Intervalo mínimo entre escrituras del progreso de un trabajo
+INTERVALO_PROGRESO_S = 0.25
+
+
+def _ahora() -> str:
+    # Mismo formato y zona (UTC) que CURRENT_TIMESTAMP de SQLite
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+
+
+class ContextoTrabajo:
+    """
+    Lo que recibe el manejador de un trabajo para informar su avance:
+    `publicar` guarda una instantánea del progreso (la UI la lee al
+    consultar el trabajo), `registrar` agrega una línea al registro y
+    `directorio` es una carpeta propia para guardar archivos de salida.
+    """
+
+    def __init__(self, cola: "ColaTrabajos", id_trabajo: str):
+        self.cola = cola
+        self.id = id_trabajo
+        self.directorio = os.path.join(cola.directorio, id_trabajo)
+        self._ultima_publicacion = 0.0
+        self._pendiente: Optional[Dict[str, Any]] = None
+
+    def publicar(self, progreso: Dict[str, Any], forzar: bool = False):
+        # Las instantáneas muy seguidas se agrupan: solo se escribe la última
+        self._pendiente = progreso
+        ahora = time.monotonic()
+        if forzar or ahora - self._ultima_publicacion >= INTERVALO_PROGRESO_S:
+            self.cola._actualizar(self.id, progreso=json.dumps(progreso, default=str))
+            self._ultima_publicacion = ahora
+            self._pendiente = None
+
+    def registrar(self, linea: str):
+        marca = time.strftime("%H:%M:%S")
+        with self.cola._conectar() as conn:
+            conn.execute(
+                "UPDATE trabajos SET registro = registro || ? WHERE id = ?",
+                (f"[{marca}] {linea}\n", self.id),
+            )
+
+    def _vaciar(self):
+        if self._pendiente is not None:
+            self.publicar(self._pendiente, forzar=True)
+
+
+class ColaTrabajos:
+    """
+    Cola local de trabajos persistida en SQLite y ejecutada por hilos.
+
+    Cada trabajo tiene un ID, un tipo (con un manejador registrado con
+    `registrar_tipo`), un usuario y un estado: en_cola, ejecutando,
+    completado o fallido. Un hilo despachador inicia los trabajos en orden
+    de llegada respetando un máximo global de trabajos simultáneos y un
+    máximo por usuario, de modo que pocos usuarios no acaparan el servidor.
+    El progreso, el resultado y el registro quedan en la base, así que la UI
+    puede consultar un trabajo o volver a él después de cerrar la pestaña.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        directorio: Optional[str] = None,
+        max_simultaneos: Optional[int] = None,
+        max_por_usuario: Optional[int] = None,
+        dias_retencion: Optional[float] = None,
+        intervalo_purga_s: Optional[float] = None,
+    ):
+        """
+        db_path: Base de los trabajos (TRABAJOS_DB, "trabajos.db")
+        directorio: Carpeta de las salidas de cada trabajo (TRABAJOS_DIR, por
+            defecto "trabajos" junto a db_path)
+        max_simultaneos: Trabajos en ejecución a la vez (TRABAJOS_MAX_SIMULTANEOS, 4)
+        max_por_usuario: Trabajos en ejecución por usuario
+            (TRABAJOS_MAX_POR_USUARIO, 1)
+        dias_retencion: Días que se conservan los trabajos terminados y sus
+            archivos (TRABAJOS_RETENCION_DIAS, 7)
+        intervalo_purga_s: Cada cuánto el despachador elimina los trabajos
+            vencidos (TRABAJOS_PURGA_HORAS, 1 h)
+        """
+        self.db_path = db_path or os.getenv("TRABAJOS_DB", "trabajos.db")
+        self.directorio = directorio or os.getenv(
+            "TRABAJOS_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(self.db_path)), "trabajos"),
+        )
+        self.max_simultaneos = max_simultaneos or int(
+            os.getenv("TRABAJOS_MAX_SIMULTANEOS", "4")
+        )
+        self.max_por_usuario = max_por_usuario or int(
+            os.getenv("TRABAJOS_MAX_POR_USUARIO", "1")
+        )
+        self.dias_retencion = (
+            float(os.getenv("TRABAJOS_RETENCION_DIAS", "7"))
+            if dias_retencion is None
+            else dias_retencion
+        )
+        self.intervalo_purga_s = (
+            float(os.getenv("TRABAJOS_PURGA_HORAS", "1")) * 3600
+            if intervalo_purga_s is None
+            else intervalo_purga_s
+        )
+        self._ultima_purga: Optional[float] = None
+        os.makedirs(self.directorio, exist_ok=True)
+        self._tipos: Dict[str, Callable] = {}
+        self._en_ejecucion: Dict[str, str] = {}
+        self._cambio = threading.Condition()
+        self._detener = threading.Event()
+        self._hilos: Optional[ThreadPoolExecutor] = None
+        self._despachador: Optional[threading.Thread] = None
+        self.init_database()
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_database(self):
+        """Crea la tabla si no existe"""
+        with self._conectar() as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(ESQUEMA_TRABAJOS)
+
+    def registrar_tipo(
+        self,
+        tipo: str,
+        manejador: Callable[[Dict[str, Any], ContextoTrabajo], Dict[str, Any]],
+    ):
+        """
+        Asocia un tipo de trabajo con su manejador solo en esta cola (ver la
+        función `registrar_tipo`, que lo hace para todas).
+        """
+        self._tipos[tipo] = manejador
+
+    def _manejador(self, tipo: str) -> Optional[Callable]:
+        return self._tipos.get(tipo) or _manejadores.get(tipo)
+
+    def iniciar(self):
+        """Lanza (una sola vez) el despachador y los hilos de ejecución."""
+        with self._cambio:
+            if self._despachador is not None:
+                return
+            # Lo que quedó "ejecutando" es de un proceso anterior que terminó
+            with self._conectar() as conn:
+                conn.execute(
+                    """
+                    UPDATE trabajos SET estado = ?, error = ?,
+                        terminado = CURRENT_TIMESTAMP
+                    WHERE estado = ?
+                    """,
+                    (
+                        FALLIDO,
+                        "El servidor se reinició durante la ejecución",
+                        EJECUTANDO,
+                    ),
+                )
+            self._hilos = ThreadPoolExecutor(
+                max_workers=self.max_simultaneos, thread_name_prefix="trabajo"
+            )
+            self._despachador = threading.Thread(target=self._despachar, daemon=True)
+            self._despachador.start()
+
+    def detener(self):
+        """Detiene el despachador; los trabajos en ejecución terminan solos."""
+        self._detener.set()
+        with self._cambio:
+            self._cambio.notify_all()
+
+    def enviar(
+        self, tipo: str, parametros: Dict[str, Any], usuario: str = "anonimo"
+    ) -> str:
+        """Encola un trabajo y retorna su ID."""
+        if self._manejador(tipo) is None:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        self.iniciar()
+        id_trabajo = uuid.uuid4().hex
+        with self._conectar() as conn:
+            conn.execute(
+                """
+                INSERT INTO trabajos (id, tipo, usuario, estado, parametros)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (id_trabajo, tipo, usuario, EN_COLA, json.dumps(parametros)),
+            )
+        with self._cambio:
+            self._cambio.notify_all()
+        return id_trabajo
+
+    def obtener(self, id_trabajo: str) -> Optional[Dict[str, Any]]:
+        """Retorna el trabajo con sus campos JSON ya decodificados, o None."""
+        with self._conectar() as conn:
+            fila = conn.execute(
+                "SELECT * FROM trabajos WHERE id = ?", (id_trabajo,)
+            ).fetchone()
+        if fila is None:
+            return None
+        trabajo = dict(fila)
+        for campo in ("parametros", "progreso", "resultado"):
+            if trabajo[campo] is not None:
+                trabajo[campo] = json.loads(trabajo[campo])
+        return trabajo
+
+    def listar(self, usuario: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Trabajos más recientes de un usuario (sin progreso ni resultado), con
+        la fecha de creación en hora local.
+        """
+        with self._conectar() as conn:
+            filas = conn.execute(
+                """
+                SELECT id, tipo, estado, parametros, error,
+                    datetime(creado, 'localtime') AS creado, iniciado, terminado
+                FROM trabajos WHERE usuario = ?
+                ORDER BY creado DESC, rowid DESC LIMIT ?
+                """,
+                (usuario, limit),
+            ).fetchall()
+        trabajos = []
+        for fila in filas:
+            trabajo = dict(fila)
+            trabajo["parametros"] = json.loads(trabajo["parametros"])
+            trabajos.append(trabajo)
+        return trabajos
+
+    def posicion_en_cola(self, id_trabajo: str) -> Optional[int]:
+        """Posición (desde 1) de un trabajo en cola, o None si ya no está en cola."""
+        with self._conectar() as conn:
+            fila = conn.execute(
+                """
+                SELECT COUNT(*) FROM trabajos
+                WHERE estado = ? AND rowid <= (
+                    SELECT rowid FROM trabajos WHERE id = ? AND estado = ?
+                )
+                """,
+                (EN_COLA, id_trabajo, EN_COLA),
+            ).fetchone()
+        return fila[0] or None
+
+    def cancelar(self, id_trabajo: str) -> bool:
+        """Cancela un trabajo que todavía está en cola."""
+        with self._conectar() as conn:
+            cursor = conn.execute(
+                """
+                UPDATE trabajos SET estado = ?, error = 'Cancelado',
+                    terminado = CURRENT_TIMESTAMP
+                WHERE id = ? AND estado = ?
+                """,
+                (FALLIDO, id_trabajo, EN_COLA),
+            )
+            return cursor.rowcount > 0
+
+    def purgar(self, dias: Optional[float] = None) -> int:
+        """
+        Elimina los trabajos terminados hace más de `dias` (por defecto
+        `dias_retencion`) y sus archivos. El despachador la ejecuta solo.
+        """
+        dias = self.dias_retencion if dias is None else dias
+        with self._conectar() as conn:
+            ids = [
+                fila[0]
+                for fila in conn.execute(
+                    """
+                    SELECT id FROM trabajos
+                    WHERE estado IN (?, ?) AND terminado < datetime('now', ?)
+                    """,
+                    (*ESTADOS_FINALES, f"-{dias} days"),
+                )
+            ]
+            conn.executemany("DELETE FROM trabajos WHERE id = ?", [(i,) for i in ids])
+        for id_trabajo in ids:
+            shutil.rmtree(os.path.join(self.directorio, id_trabajo), ignore_errors=True)
+        return len(ids)
+
+    def _actualizar(self, id_trabajo: str, **campos):
+        columnas = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._conectar() as conn:
+            conn.execute(
+                f"UPDATE trabajos SET {columnas} WHERE id = ?",
+                (*campos.values(), id_trabajo),
+            )
+
+    def _siguiente(self) -> Optional[sqlite3.Row]:
+        # Primero en llegar cuyo usuario no haya alcanzado su límite
+        if len(self._en_ejecucion) >= self.max_simultaneos:
+            return None
+        ocupados = {}
+        for usuario in self._en_ejecucion.values():
+            ocupados[usuario] = ocupados.get(usuario, 0) + 1
+        with self._conectar() as conn:
+            for fila in conn.execute(
+                """
+                SELECT id, tipo, usuario, parametros FROM trabajos
+                WHERE estado = ? ORDER BY creado, rowid
+                """,
+                (EN_COLA,),
+            ):
+                if ocupados.get(fila["usuario"], 0) < self.max_por_usuario:
+                    return fila
+        return None
+
+    def _purgar_si_toca(self):
+        # Al iniciar y luego cada `intervalo_purga_s`, mientras el servidor siga activo
+        ahora = time.monotonic()
+        if (
+            self._ultima_purga is not None
+            and ahora - self._ultima_purga < self.intervalo_purga_s
+        ):
+            return
+        self._ultima_purga = ahora
+        try:
+            purgados = self.purgar()
+            if purgados:
+                print(f"Trabajos antiguos eliminados: {purgados}")
+        except Exception as e:
+            print(f"Error al eliminar trabajos antiguos: {e}")
+
+    def _despachar(self):
+        while not self._detener.is_set():
+            self._purgar_si_toca()
+            with self._cambio:
+                fila = self._siguiente()
+                if fila is None:
+                    # Se despierta al encolar o terminar un trabajo
+                    self._cambio.wait(timeout=5)
+                    continue
+                self._en_ejecucion[fila["id"]] = fila["usuario"]
+            self._actualizar(
+                fila["id"],
+                estado=EJECUTANDO,
+                iniciado=_ahora(),
+            )
+            self._hilos.submit(
+                self._correr, fila["id"], fila["tipo"], fila["parametros"]
+            )
+
+    def _correr(self, id_trabajo: str, tipo: str, parametros: str):
+        contexto = ContextoTrabajo(self, id_trabajo)
+        os.makedirs(contexto.directorio, exist_ok=True)
+        campos: Dict[str, Any] = {}
+        try:
+            resultado = self._manejador(tipo)(json.loads(parametros), contexto)
+            campos["resultado"] = json.dumps(resultado, default=str)
+            exito = (
+                resultado.get("exito", True) if isinstance(resultado, dict) else True
+            )
+            campos["estado"] = COMPLETADO if exito else FALLIDO
+            if not exito:
+                campos["error"] = resultado.get("error") or "El trabajo falló"
+        except Exception as e:
+            campos.update(estado=FALLIDO, error=str(e))
+            contexto.registrar(f"Error: {e}")
+        finally:
+            contexto._vaciar()
+            campos["terminado"] = _ahora()
+            if "estado" not in campos:
+                campos["estado"] = FALLIDO
+            self._actualizar(id_trabajo, **campos)
+            with self._cambio:
+                self._en_ejecucion.pop(id_trabajo, None)
+                self._cambio.notify_all()
+
+
+# Manejadores por tipo de trabajo, compartidos por todas las colas
+_manejadores: Dict[str, Callable] = {}
+
+
+def registrar_tipo(
+    tipo: str,
+    manejador: Callable[[Dict[str, Any], ContextoTrabajo], Dict[str, Any]],
+):
+    """
+    Asocia un tipo de trabajo con la función que lo ejecuta, sin crear la
+    cola (que crea su base y su carpeta). El manejador recibe los parámetros
+    y un `ContextoTrabajo`, y retorna el resultado (serializable a JSON). Si
+    lanza una excepción o el resultado tiene "exito": False, el trabajo
+    queda fallido.
+    """
+    _manejadores[tipo] = manejador
+
+
+# Cola global, creada en el primer uso (al iniciarla o al enviar un trabajo)
+_job_queue: Optional[ColaTrabajos] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> ColaTrabajos:
+    """Retorna la cola global de trabajos, creándola la primera vez."""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = ColaTrabajos()
+    return _job_queue
@@ -0,0 +1,449 @@
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from backend.formula_engine import (
+    ErrorFormula,
+    aplicar_meta,
+    calcular_indicador,
+    normalizar_nombre,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from backend.aggregate_store import AlmacenAgregados
+
+
+class PlantillaKPI:
+    """
+    Análisis estándar de un dataset conocido: sus indicadores se calculan
+    con el motor de fórmulas y se grafican con Plotly, sin generar código
+    con IA ni ejecutarlo en el sandbox.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        archivo: str,
+        columnas: Iterable[str],
+        palabras_clave: Iterable[str],
+        indicadores: List[Dict[str, Any]],
+        serie: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        nombre: Nombre del análisis
+        archivo: Dataset incluido del que sale el esquema (solo informativo)
+        columnas: Columnas que debe tener el CSV para usar la plantilla
+        palabras_clave: Términos de las instrucciones que piden estos
+            indicadores (además del nombre); sin ninguno, se usa la IA
+        indicadores: Un dict por indicador con titulo, formula y, opcionales,
+            los argumentos de `calcular_indicador` (periodo, columna_fecha,
+            meta, sentido, por) y la unidad
+        serie: Para datasets que crecen por mes, la columna del mes
+            ("periodo"), las medidas y la columna de grupo de una serie de
+            `AlmacenAgregados`: los indicadores mensuales de sumas se leen de
+            sus agregados, que solo procesan las filas nuevas
+        """
+        self.nombre = nombre
+        self.archivo = archivo
+        self.columnas = {normalizar_nombre(c) for c in columnas}
+        self.palabras_clave = {normalizar_nombre(p) for p in [nombre, *palabras_clave]}
+        self.indicadores = indicadores
+        self.serie = serie
+
+    def aplica(self, columnas: Iterable[str]) -> bool:
+        return self.columnas <= {normalizar_nombre(c) for c in columnas}
+
+    def pedida(self, instrucciones: str) -> bool:
+        """Si las instrucciones mencionan el tema de la plantilla."""
+        texto = f"_{normalizar_nombre(instrucciones or '')}_"
+        return any(f"_{clave}_" in texto for clave in self.palabras_clave)
+
+
+PLANTILLAS = [
+    PlantillaKPI(
+        "Logística de entregas",
+        "datos_logisticos_entregas_viviendas.csv",
+        ["fecha_planificada", "entrega_completa_a_tiempo", "rotura_stock"],
+        ["otif", "logística", "entregas a tiempo", "rotura de stock", "stock"],
+        [
+            {
+                "titulo": "OTIF (entregas completas y a tiempo)",
+                "formula": "mean(entrega_completa_a_tiempo) * 100",
+                "columna_fecha": "fecha_planificada",
+                "meta": 95,
+                "unidad": "%",
+            },
+            {
+                "titulo": "Rotura de stock",
+                "formula": "mean(rotura_stock) * 100",
+                "columna_fecha": "fecha_planificada",
+                "meta": 5,
+                "sentido": "menor",
+                "unidad": "%",
+            },
+        ],
+    ),
+    PlantillaKPI(
+        "Ejecución presupuestal",
+        "presupuesto.csv",
+        ["mes", "rubro", "planificado", "ejecutado"],
+        ["presupuesto", "presupuestal", "gasto", "ejecución del presupuesto"],
+        [
+            {
+                "titulo": "Ejecución presupuestal",
+                "formula": "sum(ejecutado) / sum(planificado) * 100",
+                "meta": 100,
+                "sentido": "menor",
+                "unidad": "%",
+            },
+            {
+                "titulo": "Ejecución presupuestal por rubro",
+                "formula": "sum(ejecutado) / sum(planificado) * 100",
+                "por": "rubro",
+                "meta": 100,
+                "sentido": "menor",
+                "unidad": "%",
+            },
+        ],
+        serie={
+            "periodo": "mes",
+            "medidas": ["planificado", "ejecutado"],
+            "grupo": "rubro",
+        },
+    ),
+    PlantillaKPI(
+        "Avance de obra",
+        "avance_obra.csv",
+        ["mes", "frente_obra", "avance_real", "avance_programado"],
+        ["avance", "obra", "spi", "cronograma"],
+        [
+            {
+                "titulo": "Desempeño del cronograma (SPI)",
+                "formula": "sum(avance_real) / sum(avance_programado) * 100",
+                "meta": 100,
+                "unidad": "%",
+            },
+            {
+                "titulo": "SPI por frente de obra",
+                "formula": "sum(avance_real) / sum(avance_programado) * 100",
+                "por": "frente_obra",
+                "meta": 100,
+                "unidad": "%",
+            },
+        ],
+        serie={
+            "periodo": "mes",
+            "medidas": ["avance_real", "avance_programado"],
+            "grupo": "frente_obra",
+        },
+    ),
+    PlantillaKPI(
+        "Calidad",
+        "calidad.csv",
+        ["mes", "unidad", "tipo_defecto", "clasificación", "estado"],
+        ["defecto", "defectos", "calidad"],
+        [
+            {"titulo": "Defectos registrados", "formula": "count()"},
+            {
+                "titulo": "Defectos graves",
+                "formula": 'count(clasificacion == "Grave") / count() * 100',
+                "meta": 20,
+                "sentido": "menor",
+                "unidad": "%",
+            },
+            {
+                "titulo": "Defectos cerrados",
+                "formula": 'count(estado == "Cerrado") / count() * 100',
+                "meta": 80,
+                "unidad": "%",
+            },
+            {
+                "titulo": "Defectos por tipo",
+                "formula": "count()",
+                "periodo": None,
+                "por": "tipo_defecto",
+            },
+        ],
+    ),
+    PlantillaKPI(
+        "Puntualidad de entregas",
+        "tiempo_entrega.csv",
+        ["unidad_id", "fecha_programada", "fecha_real", "estado_entrega"],
+        [
+            "puntualidad",
+            "puntuales",
+            "retraso",
+            "retrasos",
+            "desvío",
+            "tiempo de entrega",
+        ],
+        [
+            {
+                "titulo": "Entregas puntuales",
+                "formula": 'count(estado_entrega == "Entregado" and '
+                "fecha_real <= fecha_programada) / count() * 100",
+                "columna_fecha": "fecha_programada",
+                "meta": 90,
+                "unidad": "%",
+            },
+            {
+                "titulo": "Desvío promedio (días)",
+                "formula": "mean(dias(fecha_real - fecha_programada))",
+                "columna_fecha": "fecha_programada",
+                "meta": 0,
+                "sentido": "menor",
+                "unidad": " días",
+            },
+        ],
+    ),
+    PlantillaKPI(
+        "Satisfacción de clientes",
+        "satisfaccion.csv",
+        ["fase", "cliente_id", "pregunta", "calificación"],
+        ["satisfacción", "encuesta", "encuestas"],
+        [
+            {
+                "titulo": "Satisfacción promedio por fase",
+                "formula": "mean(calificacion)",
+                "periodo": None,
+                "por": "fase",
+                "meta": 4,
+            },
+            {
+                "titulo": "Satisfacción promedio por pregunta",
+                "formula": "mean(calificacion)",
+                "periodo": None,
+                "por": "pregunta",
+                "meta": 4,
+            },
+        ],
+    ),
+]
+
+
+def detectar_plantilla(
+    columnas: Iterable[str], instrucciones: str
+) -> Optional[PlantillaKPI]:
+    """
+    Plantilla cuyo esquema está contenido en las columnas del CSV y cuyo
+    tema piden las instrucciones, o None. Que el dataset sea conocido no
+    basta: cualquier otro pedido se responde con código generado por la IA.
+    """
+    columnas = list(columnas)
+    candidatas = [
+        p for p in PLANTILLAS if p.aplica(columnas) and p.pedida(instrucciones)
+    ]
+    # Con varias, la más específica (la que exige más columnas)
+    return max(candidatas, key=lambda p: len(p.columnas), default=None)
+
+
+def _figura(indicador: Dict[str, Any], tabla: "pd.DataFrame"):
+    import plotly.graph_objects as go
+
+    por = indicador.get("por")
+    fig = go.Figure()
+    if indicador.get("periodo", "mes") is None:
+        fig.add_trace(go.Bar(x=tabla[por].astype(str), y=tabla["valor"]))
+    elif por:
+        for grupo, filas in tabla.groupby(por, observed=True, sort=True):
+            fig.add_trace(
+                go.Scatter(
+                    x=filas["periodo"],
+                    y=filas["valor"],
+                    mode="lines+markers",
+                    name=str(grupo),
+                )
+            )
+    else:
+        fig.add_trace(
+            go.Scatter(x=tabla["periodo"], y=tabla["valor"], mode="lines+markers")
+        )
+    if "meta" in tabla:
+        fig.add_hline(y=indicador["meta"], line_dash="dash", annotation_text="Meta")
+    fig.update_layout(
+        title=indicador["titulo"],
+        height=400,
+        xaxis=dict(type="category"),
+        showlegend=bool(por) and indicador.get("periodo", "mes") is not None,
+    )
+    return fig
+
+
+def _actualizar_serie(
+    plantilla: PlantillaKPI,
+    df: "pd.DataFrame",
+    almacen: Optional["AlmacenAgregados"],
+) -> Optional["AlmacenAgregados"]:
+    """
+    Incorpora las filas nuevas del dataset a la serie de la plantilla.
+    Retorna el almacén, o None si la plantilla no tiene serie o falló.
+    """
+    from backend.aggregate_store import get_aggregate_store
+
+    if plantilla.serie is None:
+        return None
+    # Nombres reales de las columnas del CSV (la plantilla los normaliza)
+    columnas = {normalizar_nombre(c): c for c in df.columns}
+    try:
+        almacen = almacen or get_aggregate_store()
+        almacen.definir_serie(
+            plantilla.archivo,
+            columnas[normalizar_nombre(plantilla.serie["periodo"])],
+            [columnas[normalizar_nombre(m)] for m in plantilla.serie["medidas"]],
+            columna_grupo=columnas[normalizar_nombre(plantilla.serie["grupo"])],
+        )
+        almacen.actualizar(plantilla.archivo, df)
+        return almacen
+    except Exception as e:
+        print(f"Error al actualizar los agregados de {plantilla.archivo}: {e}")
+        return None
+
+
+def _desde_agregados(
+    plantilla: PlantillaKPI, indicador: Dict[str, Any], almacen: "AlmacenAgregados"
+) -> Optional["pd.DataFrame"]:
+    """
+    Tabla de un indicador mensual calculada con los agregados de la serie,
+    o None si el indicador no se puede calcular así (ver
+    `AlmacenAgregados.calcular`).
+    """
+    por = indicador.get("por")
+    if (
+        indicador.get("periodo", "mes") != "mes"
+        or indicador.get("columna_fecha", plantilla.serie["periodo"])
+        != plantilla.serie["periodo"]
+        or por not in (None, plantilla.serie["grupo"])
+    ):
+        return None
+    try:
+        tabla = almacen.calcular(
+            plantilla.archivo, indicador["formula"], por_grupo=por is not None
+        )
+    except ErrorFormula:
+        return None
+    if por is not None:
+        tabla = tabla.rename(columns={"grupo": por})
+    return aplicar_meta(tabla, indicador.get("meta"), indicador.get("sentido", "mayor"))
+
+
+def ejecutar_plantilla(
+    plantilla: PlantillaKPI,
+    df: "pd.DataFrame",
+    almacen: Optional["AlmacenAgregados"] = None,
+) -> Dict[str, Any]:
+    """
+    Calcula los indicadores de la plantilla y arma sus gráficas. Si la
+    plantilla tiene serie, los indicadores mensuales de sumas salen de los
+    agregados incrementales (`almacen`, por defecto el global).
+
+    Returns:
+        dict con "tablas" (una por indicador), "plotly_figures" (JSON),
+        "resumen" (markdown con el último valor de cada indicador frente a
+        su meta), "codigo" (las llamadas equivalentes al motor de fórmulas)
+        y "tiempo_s"
+    """
+    from backend.code_executor import serializar_figura_plotly
+    from backend.dtype_optimizer import optimizar_tipos, planear_tipos
+
+    inicio = time.perf_counter()
+    # Fechas y booleanos en texto se convierten una sola vez para todos los
+    # indicadores (un CSV ya cargado con CargaDataset no tiene ninguno)
+    plan = {c: t for c, t in planear_tipos(df).items() if t != "categoria"}
+    if plan:
+        df = optimizar_tipos(df, plan)[0]
+    almacen = _actualizar_serie(plantilla, df, almacen)
+    tablas, figuras = [], []
+    resumen = [f"### 📐 {plantilla.nombre}", ""]
+    codigo = [
+        f"# Plantilla: {plantilla.nombre} ({plantilla.archivo})",
+        "from backend.formula_engine import calcular_indicador",
+        "",
+    ]
+    for indicador in plantilla.indicadores:
+        argumentos = {
+            clave: indicador[clave]
+            for clave in ("periodo", "columna_fecha", "meta", "sentido", "por")
+            if clave in indicador
+        }
+        tabla = (
+            _desde_agregados(plantilla, indicador, almacen)
+            if almacen is not None
+            else None
+        )
+        if tabla is None:
+            tabla = calcular_indicador(df, indicador["formula"], **argumentos)
+            codigo.append(f"# {indicador['titulo']}")
+        else:
+            codigo.append(f"# {indicador['titulo']} (con los agregados de la serie)")
+        tablas.append(tabla)
+        figuras.append(serializar_figura_plotly(_figura(indicador, tabla)))
+        codigo.append(
+            "calcular_indicador(df, "
+            + ", ".join(
+                [repr(indicador["formula"])]
+                + [f"{clave}={valor!r}" for clave, valor in argumentos.items()]
+            )
+            + ")"
+        )
+
+        unidad = indicador.get("unidad", "")
+        if indicador.get("por") or tabla.empty:
+            resumen.append(f"- **{indicador['titulo']}:** ver gráfica")
+            continue
+        ultima = tabla.iloc[-1]
+        linea = (
+            f"- **{indicador['titulo']}** ({ultima['periodo']}): "
+            f"{ultima['valor']:,.2f}{unidad}"
+        )
+        if "meta" in tabla:
+            linea += (
+                f" · meta {ultima['meta']:,.2f}{unidad} "
+                f"{'✅' if ultima['cumple'] else '⚠️'}"
+            )
+        resumen.append(linea)
+
+    return {
+        "tablas": tablas,
+        "plotly_figures": figuras,
+        "resumen": "\n".join(resumen),
+        "codigo": "\n".join(codigo),
+        "tiempo_s": time.perf_counter() - inicio,
+    }
+
+
+if __name__ == "__main__":
+    # Compara, para cada dataset incluido, la ruta de plantillas con la de IA
+    # (generación de código con Gemini + ejecución en el sandbox). La ruta de
+    # IA solo se mide si hay GOOGLE_API_KEY. Uso: python -m backend.kpi_templates
+    import os
+    import statistics
+
+    import pandas as pd
+
+    directorio = os.path.join(os.path.dirname(__file__), "..", "dataset")
+    repeticiones = 20
+    usar_ia = bool(os.getenv("GOOGLE_API_KEY"))
+    print(f"{'Dataset':45} {'Plantilla (ms)':>15} {'IA (s)':>10}")
+    for plantilla in PLANTILLAS:
+        df = pd.read_csv(os.path.join(directorio, plantilla.archivo))
+        instrucciones = f"Calcula y grafica los indicadores de {plantilla.nombre}"
+        assert detectar_plantilla(df.columns, instrucciones) is plantilla
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            ejecutar_plantilla(detectar_plantilla(df.columns, instrucciones), df)
+            tiempos.append(time.perf_counter() - inicio)
+        tiempo_ia = "-"
+        if usar_ia:
+            from backend.code_executor import SafeCodeExecutor
+            from backend.gemini_client import generate_code_from_prompt
+
+            inicio = time.perf_counter()
+            codigo = generate_code_from_prompt(instrucciones, df)
+            SafeCodeExecutor(usar_cache=False).execute_code(codigo, df)
+            tiempo_ia = f"{time.perf_counter() - inicio:.2f}"
+        print(
+            f"{plantilla.archivo:45} "
+            f"{statistics.median(tiempos) * 1000:>15.1f} {tiempo_ia:>10}"
+        )
@@ -0,0 +1,135 @@
+import os
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from backend.figure_store import get_figure_store
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Dueño, en el almacén de figuras, de las figuras referenciadas por la caché
+SESION_CACHE = "__cache_resultados__"
+
+
+def huella_dataframe(df: "pd.DataFrame") -> str:
+    """
+    Huella del contenido de un DataFrame: columnas, tipos, índice y datos.
+    Las columnas numéricas se hashean directamente sobre sus buffers; las
+    demás con `pd.util.hash_pandas_object`.
+    """
+    import numpy as np
+    import pandas as pd
+
+    # SHA-1 suele tener aceleración por hardware; aquí no se busca resistencia
+    # criptográfica sino una huella rápida del contenido
+    hasher = hashlib.sha1()
+    hasher.update(repr((list(df.columns), [str(t) for t in df.dtypes])).encode())
+    hasher.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    for _, columna in df.items():
+        valores = columna.to_numpy()
+        if valores.dtype.kind in "biufcmM":
+            hasher.update(np.ascontiguousarray(valores).view(np.uint8).data)
+        else:
+            hasher.update(
+                pd.util.hash_pandas_object(columna, index=False).to_numpy().data
+            )
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """
+    Caché LRU de resultados de ejecución, acotada por tamaño.
+
+    La clave combina el hash del código, la huella del DataFrame y las
+    opciones de ejecución. Se guardan la salida capturada, el JSON de las
+    figuras de Plotly y las referencias a las figuras de matplotlib (que
+    quedan retenidas en el almacén mientras estén en la caché); el tamaño
+    cuenta el texto y los bytes de las figuras.
+    """
+
+    def __init__(self, max_mb: Optional[float] = None):
+        """max_mb: Tamaño máximo de la caché (RESULTADOS_CACHE_MB, 256 MB)"""
+        if max_mb is None:
+            max_mb = float(os.getenv("RESULTADOS_CACHE_MB", "256"))
+        self.max_bytes = max_mb * 1024 * 1024
+        self._entradas: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._tamanos: Dict[tuple, int] = {}
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: tuple) -> Optional[Dict[str, Any]]:
+        """Retorna una copia del resultado cacheado, o None si no está o caducó."""
+        with self._lock:
+            resultado = self._entradas.get(clave)
+            if resultado is None:
+                return None
+            # Si alguna figura fue eliminada del disco, la entrada ya no sirve
+            if not all(os.path.exists(r) for r in resultado["figure_files"]):
+                self._quitar(clave)
+                return None
+            self._entradas.move_to_end(clave)
+            return copy.deepcopy(resultado)
+
+    def guardar(self, clave: tuple, resultado: Dict[str, Any]):
+        """Guarda un resultado exitoso y expulsa los menos usados si hace falta."""
+        if not resultado.get("success"):
+            return
+        tamano = self._tamano(resultado)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return
+        # Solo se guardan los resúmenes de variables, nunca los objetos
+        resultado = {**resultado, "objetos": {}}
+        store = get_figure_store()
+        for ruta in resultado["figure_files"]:
+            store.registrar(ruta, SESION_CACHE)
+        with self._lock:
+            self._entradas[clave] = copy.deepcopy(resultado)
+            self._tamanos[clave] = tamano
+            self._total += tamano
+            while self._total > self.max_bytes and self._entradas:
+                self._quitar(next(iter(self._entradas)))
+
+    def _quitar(self, clave: tuple):
+        resultado = self._entradas.pop(clave)
+        self._total -= self._tamanos.pop(clave)
+        en_otras = {
+            ruta for otro in self._entradas.values() for ruta in otro["figure_files"]
+        }
+        liberar = [r for r in resultado["figure_files"] if r not in en_otras]
+        if liberar:
+            get_figure_store().liberar(liberar, SESION_CACHE)
+
+    @staticmethod
+    def _tamano(resultado: Dict[str, Any]) -> int:
+        tamano = len(resultado.get("output", "")) + sum(
+            len(imagen) for imagen in resultado.get("figures", [])
+        )
+        tamano += sum(len(fig) for fig in resultado.get("plotly_figures", []))
+        for ruta in resultado["figure_files"]:
+            try:
+                tamano += os.path.getsize(ruta)
+            except OSError:
+                pass
+        return tamano
+
+
+# Caché global, creada en el primer uso
+_result_cache: Optional[ResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ResultCache:
+    """Retorna la caché global de resultados, creándola la primera vez."""
+    global _result_cache
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
@@ -0,0 +1,317 @@
+import os
+import sys
+import queue
+import atexit
+import subprocess
+import threading
+import time
+import marshal
+from types import CodeType
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Optional, Union
+
+# Carpeta raíz del proyecto, para que los trabajadores puedan importar `backend`
+RAIZ_PROYECTO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def tamano_pool_configurado() -> int:
+    """
+    Número de procesos trabajadores según SANDBOX_POOL_SIZE.
+    Por defecto usa hasta 4 núcleos; 0 desactiva el pool.
+    """
+    valor = os.getenv("SANDBOX_POOL_SIZE")
+    if valor is None:
+        return min(4, os.cpu_count() or 1)
+    return max(0, int(valor))
+
+
+def pool_habilitado() -> bool:
+    """Indica si el código generado debe ejecutarse en el pool de procesos."""
+    return tamano_pool_configurado() > 0
+
+
+def limites_configurados() -> Dict[str, float]:
+    """
+    Límites de recursos por ejecución, configurables por variables de entorno:
+    tiempo real (SANDBOX_TIMEOUT_S), CPU (SANDBOX_CPU_S), memoria que puede
+    reservar el código además del intérprete y los datos de entrada
+    (SANDBOX_MEMORIA_MB) y número de figuras (SANDBOX_MAX_FIGURAS).
+    """
+    return {
+        "tiempo_s": float(os.getenv("SANDBOX_TIMEOUT_S", "120")),
+        "cpu_s": float(os.getenv("SANDBOX_CPU_S", "60")),
+        "memoria_mb": float(os.getenv("SANDBOX_MEMORIA_MB", "2048")),
+        "max_figuras": int(os.getenv("SANDBOX_MAX_FIGURAS", "20")),
+    }
+
+
+def tiempo_arranque_configurado() -> float:
+    """
+    Segundos que se espera a que un trabajador nuevo termine de importar las
+    librerías (SANDBOX_ARRANQUE_S). No se descuentan del tiempo de la ejecución.
+    """
+    return float(os.getenv("SANDBOX_ARRANQUE_S", "120"))
+
+
+def resultado_error(
+    mensaje: str,
+    limite_excedido: Optional[str] = None,
+    recursos: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """Resultado con la misma forma que el de `ejecutar_codigo` para una ejecución fallida."""
+    return {
+        "success": False,
+        "output": "",
+        "error": mensaje,
+        "figures": [],
+        "figure_files": [],
+        "plotly_figures": [],
+        "variables": {},
+        "objetos": {},
+        "limite_excedido": limite_excedido,
+        "recursos": recursos or {},
+        "perfil": None,
+    }
+
+
+class _Trabajador:
+    """
+    Proceso intérprete independiente que ejecuta código generado.
+    Se comunica con el servidor por sus tuberías stdin/stdout usando
+    `multiprocessing.connection.Connection` (mensajes serializados con pickle).
+    """
+
+    def __init__(self):
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            ruta for ruta in (RAIZ_PROYECTO, env.get("PYTHONPATH")) if ruta
+        )
+        # Se lanza un intérprete nuevo en lugar de usar multiprocessing para
+        # no volver a ejecutar app.py (y construir la interfaz) en cada trabajador
+        self.proceso = subprocess.Popen(
+            [sys.executable, "-m", "backend.sandbox_worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        self.envio = Connection(os.dup(self.proceso.stdin.fileno()), readable=False)
+        self.recepcion = Connection(
+            os.dup(self.proceso.stdout.fileno()), writable=False
+        )
+        self.proceso.stdin.close()
+        self.proceso.stdout.close()
+        self.trabajos = 0
+        self.memoria_mb = 0.0
+        self.listo = False
+
+    def vivo(self) -> bool:
+        return self.proceso.poll() is None
+
+    def esperar_listo(self, timeout: Optional[float]) -> bool:
+        """
+        Espera el aviso que el trabajador envía al terminar de precalentarse.
+        Retorna False si no llega a tiempo o si el proceso murió.
+        """
+        if self.listo:
+            return True
+        try:
+            if timeout is not None and not self.recepcion.poll(timeout):
+                return False
+            self.listo = self.recepcion.recv() == "listo"
+        except (EOFError, OSError):
+            return False
+        return self.listo
+
+    def terminar(self):
+        """Pide al trabajador que salga y lo fuerza si no responde."""
+        try:
+            self.envio.send(None)
+        except (OSError, ValueError):
+            pass
+        for conexion in (self.envio, self.recepcion):
+            try:
+                conexion.close()
+            except OSError:
+                pass
+        try:
+            self.proceso.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.proceso.kill()
+            self.proceso.wait()
+
+
+class SandboxPool:
+    """
+    Pool de procesos trabajadores precalentados (pandas, matplotlib con
+    backend Agg y seaborn ya importados) para ejecutar código generado.
+
+    Cada ejecución toma un trabajador libre, de modo que varias solicitudes
+    corren en paralelo en distintos núcleos sin compartir sys.stdout ni el
+    estado global de pyplot. Los trabajadores se reciclan tras `max_trabajos`
+    ejecuciones o cuando su memoria máxima supera `max_memoria_mb`.
+    """
+
+    def __init__(
+        self,
+        tamano: Optional[int] = None,
+        max_trabajos: int = 50,
+        max_memoria_mb: float = 1024,
+    ):
+        self.tamano = tamano_pool_configurado() if tamano is None else tamano
+        if self.tamano < 1:
+            raise ValueError("El pool necesita al menos un trabajador")
+        self.max_trabajos = max_trabajos
+        self.max_memoria_mb = max_memoria_mb
+        self._libres: "queue.Queue[_Trabajador]" = queue.Queue()
+        self._todos: List[_Trabajador] = []
+        self._lock = threading.Lock()
+        self._cerrado = False
+        for _ in range(self.tamano):
+            self._libres.put(self._crear_trabajador())
+
+    def _crear_trabajador(self) -> _Trabajador:
+        trabajador = _Trabajador()
+        with self._lock:
+            self._todos.append(trabajador)
+        return trabajador
+
+    def _descartar(self, trabajador: _Trabajador):
+        with self._lock:
+            if trabajador in self._todos:
+                self._todos.remove(trabajador)
+        trabajador.terminar()
+
+    def _devolver(self, trabajador: _Trabajador):
+        """Devuelve un trabajador al pool, reciclándolo si hace falta."""
+        if self._cerrado:
+            self._descartar(trabajador)
+            return
+        if (
+            not trabajador.vivo()
+            or trabajador.trabajos >= self.max_trabajos
+            or trabajador.memoria_mb >= self.max_memoria_mb
+        ):
+            self._descartar(trabajador)
+            trabajador = self._crear_trabajador()
+        self._libres.put(trabajador)
+
+    def ejecutar(
+        self,
+        code: Union[str, CodeType],
+        df=None,
+        limites: Optional[Dict[str, float]] = None,
+        opciones_figuras: Optional[Dict[str, Any]] = None,
+        conservar_variables: Optional[List[str]] = None,
+        presupuesto_variables_mb: float = 50,
+        perfilar: bool = False,
+        al_renderizar: Optional[Callable[[str, str], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ejecuta el código en un trabajador libre (espera si todos están ocupados).
+        Retorna el mismo diccionario que `ejecutar_codigo`; de los objetos
+        conservados solo llegan los que se pueden serializar con pickle.
+
+        code: Código fuente o ya compilado (se envía como bytecode con marshal)
+        limites: Ver `limites_configurados`. Si la ejecución supera el tiempo
+            real permitido, el trabajador se termina y se reemplaza.
+        opciones_figuras: Formato, DPI y base64 de las figuras (ver
+            `ejecutar_codigo`).
+        conservar_variables, presupuesto_variables_mb, perfilar: Ver
+            `ejecutar_codigo`.
+        al_renderizar: Se llama en este proceso por cada figura que el
+            trabajador avisa como lista (ver `ejecutar_codigo`).
+        """
+        if self._cerrado:
+            return resultado_error("El pool de ejecución está cerrado")
+        limites = limites_configurados() if limites is None else limites
+
+        trabajador = self._libres.get()
+        try:
+            # Un trabajador recién creado puede seguir importando librerías: el
+            # tiempo real de la ejecución empieza a contar cuando está listo
+            if not trabajador.esperar_listo(tiempo_arranque_configurado()):
+                trabajador.proceso.kill()
+                trabajador.proceso.wait()
+                return resultado_error(
+                    "El proceso de ejecución no terminó de iniciar a tiempo"
+                )
+            inicio = time.perf_counter()
+            trabajo = {
+                "df": df,
+                "limites": limites,
+                "opciones_figuras": opciones_figuras,
+                "conservar_variables": conservar_variables,
+                "presupuesto_variables_mb": presupuesto_variables_mb,
+                "perfilar": perfilar,
+                "avisar_figuras": al_renderizar is not None,
+            }
+            if isinstance(code, CodeType):
+                trabajo["bytecode"] = marshal.dumps(code)
+            else:
+                trabajo["code"] = code
+            trabajador.envio.send(trabajo)
+            tiempo_s = limites.get("tiempo_s")
+            while True:
+                restante = (
+                    tiempo_s - (time.perf_counter() - inicio) if tiempo_s else None
+                )
+                if restante is not None and (
+                    restante <= 0 or not trabajador.recepcion.poll(restante)
+                ):
+                    trabajador.proceso.kill()
+                    trabajador.proceso.wait()
+                    return resultado_error(
+                        f"La ejecución superó el límite de {tiempo_s:g} s de tiempo real",
+                        limite_excedido="tiempo",
+                        recursos={"tiempo_s": round(time.perf_counter() - inicio, 3)},
+                    )
+                mensaje = trabajador.recepcion.recv()
+                # Los avisos de figura llegan como tuplas antes del resultado
+                if isinstance(mensaje, tuple):
+                    if al_renderizar:
+                        # Un fallo del aviso no puede dejar mensajes sin leer
+                        # en el canal del trabajador
+                        try:
+                            al_renderizar(*mensaje[1:])
+                        except Exception as e:
+                            print(f"Error en el aviso de figura: {e}")
+                    continue
+                resultado = mensaje
+                break
+            trabajador.memoria_mb = resultado.pop("memoria_mb", 0.0)
+            return resultado
+        except (EOFError, OSError) as e:
+            # El proceso murió (p. ej. por memoria); se reemplaza al devolverlo
+            trabajador.proceso.kill()
+            trabajador.proceso.wait()
+            return resultado_error(
+                f"El proceso de ejecución terminó inesperadamente: {e}"
+            )
+        finally:
+            trabajador.trabajos += 1
+            self._devolver(trabajador)
+
+    def cerrar(self):
+        """Termina todos los trabajadores del pool."""
+        self._cerrado = True
+        with self._lock:
+            trabajadores = list(self._todos)
+            self._todos.clear()
+        for trabajador in trabajadores:
+            trabajador.terminar()
+
+
+# Pool global, creado en el primer uso
+_sandbox_pool: Optional[SandboxPool] = None
+_sandbox_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool() -> SandboxPool:
+    """Retorna el pool global de ejecución, creándolo la primera vez."""
+    global _sandbox_pool
+    if _sandbox_pool is None:
+        with _sandbox_pool_lock:
+            if _sandbox_pool is None:
+                _sandbox_pool = SandboxPool()
+                atexit.register(_sandbox_pool.cerrar)
+    return _sandbox_pool
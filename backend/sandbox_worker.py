@@ -0,0 +1,195 @@
+"""
+Proceso trabajador del pool de ejecución de código generado.
+Se lanza con `python -m backend.sandbox_worker` desde `SandboxPool`.
+"""
+
+import gc
+import os
+import sys
+import math
+import signal
+import marshal
+import pickle
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _memoria_maxima_mb() -> float:
+    """Memoria residente máxima del proceso en MB (0 si no se puede medir)."""
+    # En Linux VmHWM se puede reiniciar entre ejecuciones (ver _reiniciar_pico_memoria)
+    try:
+        with open("/proc/self/status") as status:
+            for linea in status:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0.0
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta KB y macOS bytes
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def _reiniciar_pico_memoria():
+    """Reinicia el pico de memoria residente para medir cada ejecución por separado."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def _cpu_excedida(signum, frame):
+    from backend.code_executor import LimiteRecursosExcedido
+
+    raise LimiteRecursosExcedido(
+        "cpu", "La ejecución superó el límite de tiempo de CPU"
+    )
+
+
+def _espacio_direcciones_mb() -> float:
+    """Espacio de direcciones actual del proceso en MB (0 si no se puede medir)."""
+    try:
+        with open("/proc/self/status") as status:
+            for linea in status:
+                if linea.startswith("VmSize:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def _tamano_entrada_mb(df) -> float:
+    """
+    Memoria que ocupa el DataFrame de entrada: el tamaño del buffer Arrow que
+    se mapeará en memoria, o lo que ya ocupa el DataFrame recibido con pickle.
+    """
+    from backend.shared_frames import DataFrameCompartido
+
+    if df is None:
+        return 0.0
+    try:
+        if isinstance(df, DataFrameCompartido):
+            return os.path.getsize(df.ruta) / (1024 * 1024)
+        return float(df.memory_usage(deep=True).sum()) / (1024 * 1024)
+    except (OSError, AttributeError, TypeError):
+        return 0.0
+
+
+def _aplicar_limites(limites, entrada_mb: float = 0.0) -> dict:
+    """
+    Impone los límites de CPU y espacio de direcciones para la próxima
+    ejecución. El espacio de direcciones cuenta todo el proceso: las
+    librerías ya cargadas y los datos de entrada mapeados en memoria. Por eso
+    el límite es el espacio actual más `entrada_mb` más la memoria
+    configurada, que así restringe solo lo que reserva el código. Retorna los
+    límites previos para restaurarlos después.
+    """
+    if resource is None:
+        return {}
+    previos = {}
+    cpu_s = limites.get("cpu_s")
+    if cpu_s:
+        # RLIMIT_CPU es acumulativo por proceso: se suma a lo ya consumido
+        tiempos = os.times()
+        suave = math.ceil(tiempos.user + tiempos.system + cpu_s)
+        previos[resource.RLIMIT_CPU] = resource.getrlimit(resource.RLIMIT_CPU)
+        _, duro = previos[resource.RLIMIT_CPU]
+        if duro != resource.RLIM_INFINITY:
+            suave = min(suave, duro)
+        resource.setrlimit(resource.RLIMIT_CPU, (suave, duro))
+    memoria_mb = limites.get("memoria_mb")
+    if memoria_mb and hasattr(resource, "RLIMIT_AS"):
+        previos[resource.RLIMIT_AS] = resource.getrlimit(resource.RLIMIT_AS)
+        _, duro = previos[resource.RLIMIT_AS]
+        suave = int((_espacio_direcciones_mb() + entrada_mb + memoria_mb) * 1024 * 1024)
+        if duro != resource.RLIM_INFINITY:
+            suave = min(suave, duro)
+        resource.setrlimit(resource.RLIMIT_AS, (suave, duro))
+    return previos
+
+
+def _restaurar_limites(previos: dict):
+    for recurso, limite in previos.items():
+        resource.setrlimit(recurso, limite)
+
+
+def main():
+    recepcion = Connection(os.dup(sys.stdin.fileno()), writable=False)
+    envio = Connection(os.dup(sys.stdout.fileno()), readable=False)
+
+    # Los descriptores originales quedan para el protocolo: cualquier print
+    # que escape de la captura va a stderr en lugar de corromper los mensajes
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, sys.stdin.fileno())
+    os.close(devnull)
+
+    # Precalentar: pandas, matplotlib (Agg), seaborn y plotly quedan importados
+    from backend.code_executor import _cargar_librerias, ejecutar_codigo
+
+    libs = _cargar_librerias()
+    # Los DataFrames compartidos llegan sobre buffers de solo lectura: con
+    # copy-on-write cualquier modificación crea una copia en lugar de fallar
+    try:
+        libs["pd"].set_option("mode.copy_on_write", True)
+    except (KeyError, ValueError):
+        pass
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, _cpu_excedida)
+    # El pool empieza a contar el tiempo de cada ejecución desde este aviso
+    envio.send("listo")
+
+    while True:
+        try:
+            trabajo = recepcion.recv()
+        except EOFError:
+            break
+        if trabajo is None:
+            break
+
+        limites = trabajo.get("limites") or {}
+        _reiniciar_pico_memoria()
+        previos = _aplicar_limites(limites, _tamano_entrada_mb(trabajo["df"]))
+        try:
+            if "bytecode" in trabajo:
+                codigo = marshal.loads(trabajo["bytecode"])
+            else:
+                codigo = trabajo["code"]
+            resultado = ejecutar_codigo(
+                codigo,
+                trabajo["df"],
+                max_figuras=limites.get("max_figuras"),
+                opciones_figuras=trabajo.get("opciones_figuras"),
+                conservar_variables=trabajo.get("conservar_variables"),
+                presupuesto_variables_mb=trabajo.get("presupuesto_variables_mb", 50),
+                perfilar=trabajo.get("perfilar", False),
+                al_renderizar=(
+                    (lambda tipo, dato: envio.send(("figura", tipo, dato)))
+                    if trabajo.get("avisar_figuras")
+                    else None
+                ),
+            )
+        finally:
+            _restaurar_limites(previos)
+        for nombre in list(resultado["objetos"]):
+            try:
+                pickle.dumps(resultado["objetos"][nombre])
+            except Exception:
+                del resultado["objetos"][nombre]
+                resultado["variables"][nombre]["conservado"] = False
+        resultado["memoria_mb"] = _memoria_maxima_mb()
+        resultado["recursos"]["memoria_max_mb"] = round(resultado["memoria_mb"], 1)
+        envio.send(resultado)
+        del trabajo, resultado
+        # Liberar ciclos (figuras, DataFrames intermedios) antes del siguiente trabajo
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
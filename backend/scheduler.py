@@ -0,0 +1,199 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# Clases de prioridad, de mayor a menor
+INTERACTIVA = "interactiva"
+MASIVA = "masiva"
+CLASES = (INTERACTIVA, MASIVA)
+
+# Esperas recientes que se conservan por clase para los percentiles
+MAX_ESPERAS_METRICAS = 500
+
+
+class _Solicitud:
+    def __init__(self, clase: str, sesion: str, inicio_virtual: float):
+        self.clase = clase
+        self.sesion = sesion
+        self.inicio_virtual = inicio_virtual
+        self.encolada = time.monotonic()
+        self.concedida = False
+
+
+class Planificador:
+    """
+    Reparte los turnos de llamadas a Gemini (cuota y hilos compartidos)
+    entre clases de prioridad y sesiones.
+
+    - Las solicitudes interactivas (una evaluación, un clic) se despachan
+      siempre antes que las masivas en cola; además, las masivas nunca ocupan
+      todos los turnos, así que una interactiva no espera detrás de un lote.
+    - Dentro de cada clase, los turnos se reparten entre sesiones en
+      proporción a su peso (start-time fair queuing): una sesión con muchas
+      solicitudes no retrasa a las demás más de un turno por vez.
+
+    Las llamadas en curso no se interrumpen; la prioridad se aplica al
+    despachar. `metricas` informa profundidad de cola y esperas por clase
+    (`resumen_metricas`, en una línea).
+    """
+
+    def __init__(
+        self,
+        max_simultaneas: Optional[int] = None,
+        max_masivas: Optional[int] = None,
+    ):
+        """
+        max_simultaneas: Llamadas en curso a la vez (GEMINI_MAX_SIMULTANEAS, 4)
+        max_masivas: Llamadas masivas en curso a la vez (GEMINI_MAX_MASIVAS,
+            por defecto una menos que max_simultaneas)
+        """
+        self.max_simultaneas = max_simultaneas or int(
+            os.getenv("GEMINI_MAX_SIMULTANEAS", "4")
+        )
+        if max_masivas is None:
+            max_masivas = int(
+                os.getenv("GEMINI_MAX_MASIVAS", str(max(1, self.max_simultaneas - 1)))
+            )
+        self.max_masivas = max_masivas
+        self._cambio = threading.Condition()
+        self._colas: Dict[str, list] = {clase: [] for clase in CLASES}
+        self._orden = itertools.count()
+        # Tiempo virtual de cada clase y fin virtual de la última solicitud
+        # de cada sesión, para el reparto justo
+        self._reloj = {clase: 0.0 for clase in CLASES}
+        self._fin_sesion: Dict[tuple, float] = {}
+        self._en_curso = {clase: 0 for clase in CLASES}
+        self._atendidas = {clase: 0 for clase in CLASES}
+        self._esperas = {clase: deque(maxlen=MAX_ESPERAS_METRICAS) for clase in CLASES}
+        self._espera_max = {clase: 0.0 for clase in CLASES}
+
+    @contextmanager
+    def turno(
+        self,
+        clase: str = INTERACTIVA,
+        sesion: Optional[str] = None,
+        peso: float = 1.0,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Espera un turno de la clase indicada y lo libera al salir del bloque.
+        Lanza TimeoutError si no se obtiene en `timeout` segundos.
+        """
+        if clase not in self._colas:
+            raise ValueError(f"Clase de prioridad desconocida: {clase}")
+        solicitud = self._encolar(clase, sesion or "", peso)
+        with self._cambio:
+            concedida = self._cambio.wait_for(lambda: solicitud.concedida, timeout)
+            if not concedida:
+                self._colas[clase].remove(
+                    next(e for e in self._colas[clase] if e[2] is solicitud)
+                )
+                heapq.heapify(self._colas[clase])
+                raise TimeoutError("Se agotó la espera de un turno para Gemini")
+        try:
+            yield
+        finally:
+            with self._cambio:
+                self._en_curso[clase] -= 1
+                self._despachar()
+
+    def ejecutar(
+        self,
+        funcion: Callable[..., Any],
+        *args,
+        clase: str = INTERACTIVA,
+        sesion: Optional[str] = None,
+        **kwargs,
+    ) -> Any:
+        """Ejecuta `funcion` dentro de un turno (ver `turno`)."""
+        with self.turno(clase, sesion):
+            return funcion(*args, **kwargs)
+
+    def metricas(self) -> Dict[str, Dict[str, Any]]:
+        """Por clase: en cola, en curso, atendidas y esperas (s) recientes."""
+        with self._cambio:
+            metricas = {}
+            for clase in CLASES:
+                esperas = sorted(self._esperas[clase])
+                metricas[clase] = {
+                    "en_cola": len(self._colas[clase]),
+                    "en_curso": self._en_curso[clase],
+                    "atendidas": self._atendidas[clase],
+                    "espera_media_s": (
+                        round(sum(esperas) / len(esperas), 3) if esperas else 0.0
+                    ),
+                    "espera_p95_s": (
+                        round(esperas[int(0.95 * (len(esperas) - 1))], 3)
+                        if esperas
+                        else 0.0
+                    ),
+                    "espera_max_s": round(self._espera_max[clase], 3),
+                }
+            return metricas
+
+    def resumen_metricas(self) -> str:
+        """Las `metricas` en una línea, para el registro del servidor."""
+        return " | ".join(
+            f"{clase}: {m['en_cola']} en cola, {m['en_curso']} en curso, "
+            f"{m['atendidas']} atendidas, espera media {m['espera_media_s']} s, "
+            f"p95 {m['espera_p95_s']} s, máx {m['espera_max_s']} s"
+            for clase, m in self.metricas().items()
+        )
+
+    def _encolar(self, clase: str, sesion: str, peso: float) -> _Solicitud:
+        with self._cambio:
+            clave = (clase, sesion)
+            inicio = max(self._reloj[clase], self._fin_sesion.get(clave, 0.0))
+            self._fin_sesion[clave] = inicio + 1.0 / peso
+            solicitud = _Solicitud(clase, sesion, inicio)
+            heapq.heappush(self._colas[clase], (inicio, next(self._orden), solicitud))
+            self._despachar()
+            return solicitud
+
+    def _despachar(self):
+        # Se llama con el lock tomado, al encolar o liberar un turno
+        concedio = False
+        while sum(self._en_curso.values()) < self.max_simultaneas:
+            for clase in CLASES:
+                if not self._colas[clase]:
+                    continue
+                if clase == MASIVA and self._en_curso[MASIVA] >= self.max_masivas:
+                    continue
+                break
+            else:
+                break
+            inicio, _, solicitud = heapq.heappop(self._colas[clase])
+            self._reloj[clase] = inicio
+            self._en_curso[clase] += 1
+            self._atendidas[clase] += 1
+            espera = time.monotonic() - solicitud.encolada
+            self._esperas[clase].append(espera)
+            self._espera_max[clase] = max(self._espera_max[clase], espera)
+            solicitud.concedida = True
+            concedio = True
+        if concedio:
+            # Las sesiones ya atendidas por completo no necesitan su marca
+            for clave, fin in list(self._fin_sesion.items()):
+                if fin <= self._reloj[clave[0]]:
+                    del self._fin_sesion[clave]
+            self._cambio.notify_all()
+
+
+# Planificador global, creado en el primer uso
+_planificador: Optional[Planificador] = None
+_planificador_lock = threading.Lock()
+
+
+def get_scheduler() -> Planificador:
+    """Retorna el planificador global de llamadas a Gemini."""
+    global _planificador
+    if _planificador is None:
+        with _planificador_lock:
+            if _planificador is None:
+                _planificador = Planificador()
+    return _planificador
@@ -0,0 +1,123 @@
+import os
+import uuid
+import tempfile
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _directorio_compartido() -> str:
+    """Carpeta para los buffers: /dev/shm (RAM) si existe, si no la temporal."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    directorio = os.path.join(base, "indicadores_frames")
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+class DataFrameCompartido:
+    """
+    Referencia ligera a un DataFrame publicado como archivo Arrow IPC
+    (formato de archivo, sin compresión) en memoria compartida.
+
+    Se envía a los procesos trabajadores en lugar del DataFrame: al
+    serializarse solo viaja la ruta, y el trabajador mapea el archivo en
+    memoria y reconstruye el DataFrame sin copiar las columnas numéricas.
+    """
+
+    def __init__(
+        self, ruta: str, filas: int, columnas: List[str], huella: Optional[str] = None
+    ):
+        self.ruta = ruta
+        self.filas = filas
+        self.columnas = columnas
+        # Huella del contenido (ver result_cache.huella_dataframe)
+        self.huella = huella
+
+    def __len__(self):
+        return self.filas
+
+    def __repr__(self):
+        return f"DataFrameCompartido({self.ruta!r}, filas={self.filas})"
+
+
+# Buffers publicados por sesión y clave (p. ej. ruta del CSV subido)
+_publicados: Dict[str, Dict[str, DataFrameCompartido]] = {}
+_lock = threading.Lock()
+
+
+def publicar_dataframe(
+    df: "pd.DataFrame", sesion: Optional[str] = None, clave: Optional[str] = None
+) -> Union["pd.DataFrame", DataFrameCompartido]:
+    """
+    Convierte el DataFrame una sola vez a Arrow IPC en memoria compartida.
+
+    Si ya se publicó la misma `clave` en la sesión, reutiliza el buffer. Si
+    pyarrow no está instalado o el DataFrame no se puede convertir, retorna
+    el DataFrame original (que se enviará serializado con pickle).
+    """
+    if sesion and clave:
+        with _lock:
+            existente = _publicados.get(sesion, {}).get(clave)
+        if existente is not None and os.path.exists(existente.ruta):
+            return existente
+
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+
+    ruta = os.path.join(_directorio_compartido(), f"{uuid.uuid4().hex}.arrow")
+    try:
+        tabla = pa.Table.from_pandas(df, preserve_index=True)
+        with pa.OSFile(ruta, "wb") as destino:
+            with pa.ipc.new_file(destino, tabla.schema) as escritor:
+                escritor.write_table(tabla)
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        print(f"No se pudo publicar el DataFrame en memoria compartida: {e}")
+        if os.path.exists(ruta):
+            os.remove(ruta)
+        return df
+
+    from backend.result_cache import huella_dataframe
+
+    compartido = DataFrameCompartido(
+        ruta, len(df), [str(c) for c in df.columns], huella_dataframe(df)
+    )
+    if sesion:
+        with _lock:
+            anterior = _publicados.setdefault(sesion, {}).get(clave or ruta)
+            _publicados[sesion][clave or ruta] = compartido
+        if anterior is not None:
+            _eliminar(anterior)
+    return compartido
+
+
+def adjuntar_dataframe(compartido: DataFrameCompartido) -> "pd.DataFrame":
+    """
+    Reconstruye el DataFrame mapeando el archivo en memoria en solo lectura.
+    Las columnas numéricas sin nulos comparten memoria con el buffer.
+    """
+    import pyarrow as pa
+
+    fuente = pa.memory_map(compartido.ruta, "r")
+    tabla = pa.ipc.open_file(fuente).read_all()
+    return tabla.to_pandas(split_blocks=True)
+
+
+def liberar_sesion(sesion: str) -> int:
+    """Elimina los buffers publicados por una sesión. Retorna cuántos se liberaron."""
+    with _lock:
+        publicados = _publicados.pop(sesion, {})
+    for compartido in publicados.values():
+        _eliminar(compartido)
+    return len(publicados)
+
+
+def _eliminar(compartido: DataFrameCompartido):
+    # Los procesos que aún lo tengan mapeado conservan el acceso hasta cerrarlo
+    try:
+        os.remove(compartido.ruta)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.aggregate_store import AlmacenAgregados
+from backend.formula_engine import calcular_indicador
+from backend.kpi_templates import PLANTILLAS, ejecutar_plantilla
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset")
+
+FORMULA = "sum(avance_real) / sum(avance_programado) * 100"
+MEDIDAS = ["avance_real", "avance_programado"]
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenAgregados(str(tmp_path / "agregados.db"))
+
+
+def _avance_obra():
+    # Tres reportes por frente y mes, con un id creciente
+    base = pd.read_csv(os.path.join(DATASETS, "avance_obra.csv"))
+    df = pd.concat([base] * 3).sort_values("mes", kind="stable")
+    rng = np.random.default_rng(0)
+    df["avance_real"] = df["avance_real"] * rng.uniform(0.5, 1.5, len(df))
+    df = df.reset_index(drop=True)
+    df["id"] = np.arange(len(df))
+    return df
+
+
+def _comparar(almacen, nombre, df):
+    """Los agregados guardados frente a recalcular con el dataset completo."""
+    total = calcular_indicador(df, FORMULA)
+    incremental = almacen.calcular(nombre, FORMULA)
+    assert incremental["periodo"].tolist() == total["periodo"].tolist()
+    np.testing.assert_allclose(incremental["valor"], total["valor"], rtol=1e-12)
+
+    por_frente = calcular_indicador(df, FORMULA, por="frente_obra")
+    incremental = almacen.calcular(nombre, FORMULA, por_grupo=True)
+    np.testing.assert_allclose(incremental["valor"], por_frente["valor"], rtol=1e-12)
+
+    periodos = pd.to_datetime(df["mes"]).dt.to_period("M").astype(str)
+    esperado = df.groupby(periodos)["avance_real"].agg(["sum", "count", "min", "max"])
+    for estadistico, columna in [
+        ("suma", "sum"),
+        ("cuenta", "count"),
+        ("minimo", "min"),
+        ("maximo", "max"),
+    ]:
+        serie = almacen.serie(nombre, "avance_real", estadistico)
+        np.testing.assert_allclose(serie["valor"], esperado[columna], rtol=1e-12)
+    acumulado = almacen.serie(nombre, "avance_real", "acumulado")
+    np.testing.assert_allclose(acumulado["valor"], esperado["sum"].cumsum(), rtol=1e-12)
+
+
+def test_por_periodo_recalcula_el_ultimo_periodo(almacen):
+    df = _avance_obra()
+    almacen.definir_serie("obra", "mes", MEDIDAS, columna_grupo="frente_obra")
+    meses = sorted(df["mes"].unique())
+    for n, mes in enumerate(meses):
+        hasta = df[df["mes"] <= mes]
+        # El mes recién agregado llega primero a medias y luego completo
+        parcial = hasta.iloc[: len(hasta) - 4]
+        for carga in (parcial, hasta):
+            resultado = almacen.actualizar("obra", carga)
+            assert not resultado["reconstruida"]
+            # Solo se procesan el último período guardado y los nuevos
+            nuevas = carga[carga["mes"] >= meses[max(0, n - 1)]]
+            if carga is hasta:
+                nuevas = carga[carga["mes"] == mes]
+            assert resultado["filas_nuevas"] == len(nuevas)
+            _comparar(almacen, "obra", carga)
+
+
+def test_por_clave_solo_procesa_filas_nuevas(almacen):
+    df = _avance_obra()
+    almacen.definir_serie(
+        "obra", "mes", MEDIDAS, columna_grupo="frente_obra", columna_clave="id"
+    )
+    # Cortes que no coinciden con los meses: el mismo período crece en dos cargas
+    cortes = [5, 40, 41, 100, len(df)]
+    anterior = 0
+    for corte in cortes:
+        resultado = almacen.actualizar("obra", df.iloc[:corte])
+        assert resultado["filas_nuevas"] == corte - anterior
+        assert not resultado["reconstruida"]
+        _comparar(almacen, "obra", df.iloc[:corte])
+        anterior = corte
+    assert almacen.actualizar("obra", df)["filas_nuevas"] == 0
+
+
+@pytest.mark.parametrize("clave", [None, "id"])
+def test_otro_dataset_reconstruye_la_serie(almacen, clave):
+    df = _avance_obra()
+    almacen.definir_serie(
+        "obra", "mes", MEDIDAS, columna_grupo="frente_obra", columna_clave=clave
+    )
+    almacen.actualizar("obra", df.iloc[:100])
+    # Mismo esquema, pero con una fila antigua corregida
+    corregido = df.copy()
+    corregido.loc[3, "avance_real"] += 10
+    resultado = almacen.actualizar("obra", corregido)
+    assert resultado["reconstruida"]
+    assert resultado["filas_nuevas"] == len(df)
+    _comparar(almacen, "obra", corregido)
+
+
+@pytest.mark.parametrize(
+    "plantilla", [p for p in PLANTILLAS if p.serie], ids=lambda p: p.archivo
+)
+def test_plantillas_con_agregados(plantilla, almacen):
+    df = pd.read_csv(os.path.join(DATASETS, plantilla.archivo))
+    meses = sorted(df["mes"].unique())
+    for hasta in (meses[-2], meses[-1]):
+        parcial = df[df["mes"] <= hasta]
+        resultado = ejecutar_plantilla(plantilla, parcial, almacen)
+        assert "agregados de la serie" in resultado["codigo"]
+        for indicador, tabla in zip(plantilla.indicadores, resultado["tablas"]):
+            argumentos = {
+                clave: indicador[clave]
+                for clave in ("meta", "sentido", "por")
+                if clave in indicador
+            }
+            esperado = calcular_indicador(parcial, indicador["formula"], **argumentos)
+            assert tabla.columns.tolist() == esperado.columns.tolist()
+            assert tabla["periodo"].tolist() == esperado["periodo"].tolist()
+            np.testing.assert_allclose(tabla["valor"], esperado["valor"], rtol=1e-12)
+            assert tabla["cumple"].tolist() == esperado["cumple"].tolist()
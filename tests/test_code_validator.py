@@ -0,0 +1,128 @@
+import pandas as pd
+import pytest
+
+from backend.code_executor import SafeCodeExecutor, ejecutar_codigo
+from backend.code_validator import MODULOS_PERMITIDOS, validar_codigo
+
+# Código que escapaba del sandbox y el validador daba por válido
+EVASIONES = [
+    'pd.io.common.os.environ["GOOGLE_API_KEY"]',
+    "pd.io.common.os.remove(p)",
+    "import pandas.io.common as c\nc.os.unlink(p)",
+    'np.lib.npyio.os.listdir("/")',
+    'plt.savefig("/any/path")',
+    'sns.load_dataset("tips")',
+    'df.to_json("/tmp/x.json")',
+    'df.to_html(buf="/tmp/x.html")',
+    'df.apply("to_pickle", path="/tmp/x.pkl")',
+    "from pandas import read_csv",
+    "from pandas import io",
+    'px.optional_imports.get_module("shutil")',
+    "plt.matplotlib.os.getcwd()",
+    'df.query("a > 1")',
+    '"{0.__globals__}".format(pd.concat)',
+    "from numpy import *",
+    "(x for x in []).gi_frame.f_globals",
+    'np.fromregex("/etc/hostname", r"(.*)", [("linea", "S64")])',
+    'df.values.dump("/tmp/x.npy")',
+    'plt.figure().canvas.print_png("/tmp/x.png")',
+    'm = "to_" + "pickle"\ndf.agg(m, 0, "/tmp/x.pkl")',
+    'f = df.agg\nf("sum")',
+    'm = "to_pickle"\npd.pivot_table(df, aggfunc=m)',
+    'df.groupby("a").agg(total=("a", "to_pickle"))',
+    'pd.set_option("plotting.backend", "os")',
+    'plt.style.use("/etc/passwd")',
+    'texto = "{0.__class__}"[:0]\ntexto.format(df)',
+    "df.info(buf=None)",
+]
+
+# Escrituras que sí llegaban al disco con SafeCodeExecutor (ruta en {ruta})
+ESCRITURAS = [
+    "df.values.dump({ruta!r})",
+    "plt.figure().canvas.print_png({ruta!r})",
+    'm = "to_" + "pickle"\ndf.agg(m, 0, {ruta!r})',
+]
+
+# Código habitual de análisis que debe seguir siendo válido
+CODIGO_ANALISIS = """
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from datetime import datetime, timedelta
+from collections import Counter
+x = np.random.default_rng(0).normal(size=10)
+pd.options.display.max_rows = 20
+d = pd.DataFrame.from_dict({"a": [1, 2, 2]})
+print(d.to_string(), d.to_json(orient="records"))
+print(f"{x.mean():.2f}", "{:.1%}".format(0.25))
+print(d.groupby("a").agg(total=("a", "sum"), n=pd.NamedAgg("a", "count")))
+print(d.agg(["sum", "mean"]), d["a"].apply(lambda v: v * 2).tolist())
+def rango(serie):
+    return serie.max() - serie.min()
+print(d.apply(pd.to_numeric, errors="coerce"), d.agg({"a": rango}))
+print(d["a"].apply(np.sqrt).round(2).tolist())
+print(pd.pivot_table(d, values="a", index="a", aggfunc="count"))
+pd.set_option("display.max_columns", None)
+plt.style.use("ggplot")
+print(pd.api.types.is_numeric_dtype(d["a"]), np.linalg.norm(x))
+print(Counter(d["a"]), datetime(2024, 1, 1) + timedelta(days=1))
+colores = px.colors.qualitative.Set2
+plt.figure(figsize=(4, 3))
+plt.plot(d["a"], color=plt.cm.viridis(0.5))
+plt.show()
+fig = go.Figure(go.Bar(x=[1], y=[2]))
+fig.update_layout(title=go.layout.Title(text="t"))
+"""
+
+
+@pytest.mark.parametrize("codigo", EVASIONES)
+def test_rechaza_evasiones_del_sandbox(codigo):
+    validado = validar_codigo(codigo, MODULOS_PERMITIDOS)
+    assert not validado.valido
+    assert validado.mensaje.startswith("Línea ")
+
+
+@pytest.mark.parametrize("codigo", ESCRITURAS)
+def test_el_ejecutor_no_escribe_archivos(codigo, tmp_path):
+    ruta = str(tmp_path / "salida")
+    ejecutor = SafeCodeExecutor(usar_pool=False, usar_cache=False)
+    resultado = ejecutor.execute_code(
+        codigo.format(ruta=ruta), pd.DataFrame({"a": [1]})
+    )
+    assert not resultado["success"]
+    assert not list(tmp_path.iterdir())
+
+
+def test_acepta_codigo_de_analisis():
+    validado = validar_codigo(CODIGO_ANALISIS, MODULOS_PERMITIDOS)
+    assert validado.valido, validado.mensaje
+
+
+@pytest.mark.parametrize(
+    "codigo",
+    [
+        "x = pd.io",
+        "import pandas.io.common as c",
+        "from pandas import io",
+        "y = px.optional_imports",
+        "z = plt.matplotlib.os",
+        "import os",
+        "pd.read_csv = None",
+    ],
+)
+def test_ejecucion_niega_modulos_no_permitidos(codigo):
+    # Sin pasar por el validador: la restricción también se aplica al ejecutar
+    resultado = ejecutar_codigo(compile(codigo, "<prueba>", "exec"))
+    assert not resultado["success"]
+    assert any(
+        texto in resultado["error"]
+        for texto in ("no permitid", "cannot import", "no se pueden modificar")
+    )
+
+
+def test_ejecucion_de_codigo_de_analisis():
+    validado = validar_codigo(CODIGO_ANALISIS, MODULOS_PERMITIDOS)
+    resultado = ejecutar_codigo(validado.codigo, pd.DataFrame({"a": [1]}))
+    assert resultado["success"], resultado["error"]
+    assert len(resultado["figure_files"]) == 1
+    assert len(resultado["plotly_figures"]) == 1
+    assert "pd" not in resultado["variables"]
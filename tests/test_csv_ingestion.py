@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.csv_ingestion import ErrorIngesta, IngestaCSV, olfatear_csv
+
+
+def _csv(ruta, filas, **opciones):
+    df = pd.DataFrame(
+        {
+            "fila": range(filas),
+            "doble": [2 * i for i in range(filas)],
+            "area": [f"Área {i % 7}" for i in range(filas)],
+        }
+    )
+    df.to_csv(ruta, index=False, **opciones)
+    return ruta
+
+
+@pytest.mark.parametrize(
+    "opciones, formato",
+    [
+        ({"sep": ";", "encoding": "latin-1"}, {"sep": ";", "encoding": "latin-1"}),
+        (
+            {"sep": "\t", "encoding": "utf-8-sig"},
+            {"sep": "\t", "encoding": "utf-8-sig"},
+        ),
+        ({"sep": "|", "encoding": "utf-8"}, {"sep": "|", "encoding": "utf-8-sig"}),
+    ],
+)
+def test_olfatea_separador_codificacion_y_tipos(opciones, formato, tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 50, **opciones)
+    detectado = olfatear_csv(str(ruta))
+    assert {clave: detectado[clave] for clave in formato} == formato
+    assert detectado["dtype"] == {
+        "fila": "int64",
+        "doble": "int64",
+        "area": "object",
+    }
+    df = IngestaCSV(str(ruta)).iniciar().resultado(timeout=30)
+    assert df["area"].iloc[3] == "Área 3"
+
+
+def test_olfatear_solo_lee_el_comienzo(tmp_path):
+    # Con una línea cortada al final del bloque leído
+    ruta = _csv(tmp_path / "datos.csv", 20_000)
+    detectado = olfatear_csv(str(ruta), bytes_muestra=1000)
+    assert detectado["sep"] == ","
+    assert detectado["dtype"]["doble"] == "int64"
+
+
+def test_archivo_vacio(tmp_path):
+    ruta = tmp_path / "vacio.csv"
+    ruta.write_text("\n\n")
+    with pytest.raises(ErrorIngesta, match="vacío"):
+        IngestaCSV(str(ruta)).iniciar()
+
+
+def test_muestra_de_todas_las_filas(tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 5000)
+    ingesta = IngestaCSV(
+        str(ruta), {"filas_bloque": 300, "muestra_filas": 200}
+    ).iniciar()
+    df = ingesta.resultado(timeout=30)
+    assert len(df) == 5000
+    muestra = ingesta.esperar_muestra()
+    assert len(muestra) == 200
+    assert muestra["fila"].is_unique
+    # Cada índice de la muestra se tradujo a la fila correcta de su bloque
+    assert (muestra["doble"] == 2 * muestra["fila"]).all()
+    assert muestra["fila"].max() >= 300
+
+
+def test_muestra_uniforme():
+    # Muchas muestras de 50 entre 1000 filas leídas en bloques de 64: cada
+    # fila debe aparecer con probabilidad 50 / 1000, sin importar su bloque
+    ingesta = IngestaCSV("no_se_lee.csv", {"muestra_filas": 50})
+    rng = np.random.default_rng(0)
+    apariciones = np.zeros(1000)
+    repeticiones = 400
+    for _ in range(repeticiones):
+        ingesta._muestra, ingesta.filas_leidas = [], 0
+        for inicio in range(0, 1000, 64):
+            filas = min(64, 1000 - inicio)
+            ingesta.filas_leidas += filas
+            ingesta._actualizar_muestra(filas, rng)
+        assert len(set(ingesta._muestra)) == 50
+        apariciones[ingesta._muestra] += 1
+    esperado = repeticiones * 50 / 1000
+    por_decil = apariciones.reshape(10, 100).sum(axis=1) / (100 * esperado)
+    assert np.allclose(por_decil, 1, atol=0.1)
+    # El primer bloque, que llena la muestra, no queda sobrerrepresentado
+    assert abs(apariciones[:64].mean() / esperado - 1) < 0.15
+
+
+def test_limite_de_tamano(tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 5000)
+    with pytest.raises(ErrorIngesta, match="MB"):
+        IngestaCSV(str(ruta), {"max_mb": 0.01}).iniciar()
+
+
+def test_limite_de_filas(tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 5000)
+    ingesta = IngestaCSV(str(ruta), {"filas_bloque": 500, "max_filas": 1200})
+    ingesta.iniciar()
+    with pytest.raises(ErrorIngesta, match="1,200"):
+        ingesta.resultado(timeout=30)
+    # Al fallar se libera lo leído
+    assert ingesta.filas_leidas == 0
+    assert ingesta._bloques == []
+
+
+def test_limite_de_memoria(tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 50_000)
+    ingesta = IngestaCSV(str(ruta), {"filas_bloque": 5000, "max_memoria_mb": 1})
+    with pytest.raises(ErrorIngesta, match="en memoria"):
+        ingesta.iniciar().resultado(timeout=30)
+
+
+def test_cancelar(tmp_path):
+    ruta = _csv(tmp_path / "datos.csv", 50_000)
+    ingesta = IngestaCSV(str(ruta), {"filas_bloque": 100}).iniciar()
+    assert len(ingesta.esperar_muestra(timeout=30))
+    ingesta.cancelar()
+    with pytest.raises(ErrorIngesta, match="Lectura cancelada"):
+        ingesta.resultado(timeout=30)
+    with pytest.raises(ErrorIngesta, match="Lectura cancelada"):
+        ingesta.esperar_muestra(timeout=30)
+    assert ingesta._bloques == []
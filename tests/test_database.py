@@ -0,0 +1,118 @@
+import re
+import sqlite3
+
+import pytest
+
+from backend.database import DatabaseManager
+
+
+def _calificacion_original(respuesta):
+    # Extracción anterior a los patrones precompilados, como referencia
+    if "**Calificación:**" not in respuesta:
+        return None
+    parte = respuesta.split("**Calificación:**")[1].strip()
+    for patron in (r"[🟢🟨🟧🟥⚪]\s*(\d+)\.", r"(\d+)\.", r"(\d+)"):
+        match = re.search(patron, parte)
+        if match:
+            return match.group(1)
+    return None
+
+
+RECOMENDACIONES = """**Recomendaciones:**
+- Define la periodicidad de medición (mensual).
+- Aclara la fuente: 2 sistemas distintos reportan el dato.
+"""
+
+# Cierres reales de respuestas de Gemini, con lo que la calificación debe dar
+RESPUESTAS = {
+    "**Calificación:** 🟧 2. Medio-bajo | Tiene aspectos rescatables.": "2",
+    "**Calificación:** (escala 1-4) 🟧 2. Medio-bajo": "2",
+    "**Calificación:** 🟩 4. Alto | Indicador claro, relevante y medible.": "4",
+    "**Calificación:**\n\n🟥 1. Bajo | El indicador tiene múltiples fallos.": "1",
+    "**Calificación:** En una escala de 1 a 4, 3. Medio-alto": "3",
+    "**Calificación:** 3 - Medio-alto": "3",
+    "**Calificación:** (escala 1-4) 3 - Medio-alto": "3",
+    "**Calificación:** nivel 2 de 4": "2",
+    "**Calificación:** sin calificar": None,
+    "Sin encabezado de calificación. 🟨 3. Medio-alto": None,
+}
+
+# Casos en que la extracción original tomaba un número de la escala
+CORREGIDAS = {"**Calificación:** (escala 1-4) 3 - Medio-alto"}
+
+
+@pytest.mark.parametrize("cierre, esperada", RESPUESTAS.items())
+def test_extrae_la_calificacion(cierre, esperada, tmp_path):
+    db = DatabaseManager(str(tmp_path / "evaluaciones.db"))
+    respuesta = "**Análisis:** El indicador mide el avance.\n\n" + RECOMENDACIONES
+    respuesta += "\n" + cierre
+    calificacion, recomendaciones = db.extraer_calificacion_y_recomendaciones(respuesta)
+    assert calificacion == esperada
+    assert recomendaciones.startswith("- Define la periodicidad")
+    if cierre in CORREGIDAS:
+        assert _calificacion_original(respuesta) != esperada
+    else:
+        assert _calificacion_original(respuesta) == esperada
+
+
+def test_reextraccion_masiva_usa_la_misma_prioridad(tmp_path):
+    db = DatabaseManager(str(tmp_path / "evaluaciones.db"))
+    respuestas = [RECOMENDACIONES + cierre for cierre in RESPUESTAS]
+    for respuesta in respuestas:
+        db.guardar_evaluacion(
+            "Objetivo", "Indicador", "95%", "ERP", "a/b", "", respuesta
+        )
+    with sqlite3.connect(db.db_path) as conn:
+        conn.execute("UPDATE evaluaciones SET calificacion = '9'")
+
+    assert db.reextraer_calificaciones(tamano_lote=4)["actualizadas"] == len(respuestas)
+    with sqlite3.connect(db.db_path) as conn:
+        calificaciones = [
+            fila[0]
+            for fila in conn.execute(
+                "SELECT calificacion FROM evaluaciones ORDER BY id"
+            )
+        ]
+    assert calificaciones == list(RESPUESTAS.values())
+
+
+def _con_archivos(directorio, anios):
+    # Una evaluación por año, archivada en su archivo anual, y una reciente
+    db = DatabaseManager(str(directorio / "evaluaciones.db"))
+    for anio in anios:
+        evaluacion_id = db.guardar_evaluacion(
+            "Objetivo", f"Indicador {anio}", "95%", "ERP", "a/b", "", RECOMENDACIONES
+        )
+        with sqlite3.connect(db.db_path) as conn:
+            conn.execute(
+                "UPDATE evaluaciones SET fecha_creacion = ? WHERE id = ?",
+                (f"{anio}-06-01 12:00:00", evaluacion_id),
+            )
+    db.archivar_evaluaciones(meses=1)
+    db.guardar_evaluacion(
+        "Objetivo", "Indicador actual", "95%", "ERP", "a/b", "", RECOMENDACIONES
+    )
+    return db
+
+
+def test_consultas_con_mas_archivos_de_los_que_se_adjuntan(tmp_path):
+    # Más años que bases adjuntables, en una ruta que hay que escapar en la URI
+    directorio = tmp_path / "datos #1 ?"
+    directorio.mkdir()
+    anios = list(range(2005, 2020))
+    db = _con_archivos(directorio, anios)
+    assert db.listar_archivos() == anios[::-1]
+
+    indicadores = [
+        e["indicador"] for e in db.obtener_evaluaciones(incluir_archivo=True)
+    ]
+    assert indicadores == ["Indicador actual"] + [f"Indicador {a}" for a in anios[::-1]]
+    assert [e["indicador"] for e in db.obtener_evaluaciones()] == ["Indicador actual"]
+
+    recientes = db.obtener_evaluaciones(limit=3, incluir_archivo=True)
+    assert [e["indicador"] for e in recientes] == indicadores[:3]
+
+    encontradas = db.buscar_evaluaciones("Indicador 2005", incluir_archivo=True)
+    assert [e["indicador"] for e in encontradas] == ["Indicador 2005"]
+    assert db.buscar_evaluaciones("Indicador 2005") == []
+    assert db.obtener_estadisticas(incluir_archivo=True)["total_evaluaciones"] == 16
@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+import pandas as pd
+import pytest
+
+from backend.formula_engine import ErrorFormula, calcular_indicador
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fórmulas que con enteros de Python bloqueaban el proceso
+FORMULAS_COSTOSAS = ["9**9**9**9", "(avance + 9) ** 9 ** 9 ** 9", "2 ** 10 ** 10"]
+
+
+def _dataset():
+    return pd.DataFrame(
+        {
+            "fecha": pd.to_datetime(["2024-01-05", "2024-01-20", "2024-02-03"]),
+            "avance": [10, 20, 30],
+            "estado": ["Abierto", "Cerrado", "Cerrado"],
+        }
+    )
+
+
+@pytest.mark.parametrize("formula", FORMULAS_COSTOSAS)
+def test_potencias_enormes_terminan_enseguida(formula, tmp_path):
+    # En un proceso aparte, para que una regresión no bloquee las pruebas
+    codigo = (
+        "import pandas as pd\n"
+        "from backend.formula_engine import calcular_indicador\n"
+        "df = pd.DataFrame({'avance': [1, 2]})\n"
+        f"print(calcular_indicador(df, {formula!r}, periodo=None)['valor'].tolist())\n"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": RAIZ},
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip().splitlines()[-1] == "[nan]"
+
+
+@pytest.mark.parametrize(
+    "formula", ["'a' * 10 ** 10", "'a' * avance", "0x" + "f" * 400]
+)
+def test_rechaza_formulas_que_agotan_memoria(formula):
+    with pytest.raises(ErrorFormula):
+        calcular_indicador(_dataset(), formula, periodo=None)
+
+
+def test_formulas_habituales():
+    df = _dataset()
+    resultado = calcular_indicador(df, "avance / count() * 100", meta="1500")
+    assert resultado["periodo"].tolist() == ["2024-01", "2024-02"]
+    assert resultado["valor"].tolist() == [1500.0, 3000.0]
+    assert resultado["cumple"].tolist() == [True, True]
+    total = calcular_indicador(df, 'count(estado == "Cerrado") ** 2', periodo=None)
+    assert total["valor"].tolist() == [4.0]
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Librerías que solo se necesitan al generar o ejecutar análisis
+MODULOS_PESADOS = [
+    "pandas",
+    "seaborn",
+    "plotly",
+    "matplotlib",
+    "google.genai",
+    "pyarrow",
+]
+
+
+def test_importar_app_no_carga_librerias_pesadas_ni_crea_archivos(tmp_path):
+    # En un proceso nuevo, para que nada importado por otras pruebas cuente
+    codigo = (
+        "import json, sys\n"
+        "import app\n"
+        f"print(json.dumps([m for m in {MODULOS_PESADOS!r} if m in sys.modules]))\n"
+    )
+    entorno = {**os.environ, "PYTHONPATH": RAIZ}
+    resultado = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=tmp_path,
+        env=entorno,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    cargados = json.loads(resultado.stdout.strip().splitlines()[-1])
+    assert cargados == []
+    # Las bases y carpetas de trabajo se crean al arrancar el servidor, no al importar
+    assert list(tmp_path.glob("*.db")) == []
+    assert not (tmp_path / "trabajos").exists()
@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backend.job_queue import (
+    COMPLETADO,
+    EJECUTANDO,
+    EN_COLA,
+    FALLIDO,
+    ColaTrabajos,
+    registrar_tipo,
+)
+
+
+@pytest.fixture
+def cola(tmp_path):
+    cola = ColaTrabajos(
+        db_path=str(tmp_path / "trabajos.db"),
+        max_simultaneos=2,
+        max_por_usuario=1,
+        intervalo_purga_s=3600,
+    )
+    yield cola
+    cola.detener()
+
+
+def _esperar(cola, id_trabajo, estado, limite_s=10):
+    fin = time.monotonic() + limite_s
+    while time.monotonic() < fin:
+        if cola.obtener(id_trabajo)["estado"] == estado:
+            return
+        time.sleep(0.02)
+    pytest.fail(f"{id_trabajo} no llegó a {estado}: {cola.obtener(id_trabajo)}")
+
+
+class Manejador:
+    """Registra el orden de ejecución y retiene cada trabajo hasta `soltar`."""
+
+    def __init__(self):
+        self.orden = []
+        self.liberar = threading.Event()
+
+    def __call__(self, parametros, contexto):
+        self.orden.append(parametros["n"])
+        self.liberar.wait(10)
+        return {"exito": True, "n": parametros["n"]}
+
+    def soltar(self):
+        self.liberar.set()
+
+
+def test_orden_de_llegada(cola):
+    manejador = Manejador()
+    cola.registrar_tipo("prueba", manejador)
+    cola.max_simultaneos = 1
+    ids = [cola.enviar("prueba", {"n": n}, usuario=f"u{n}") for n in range(4)]
+    _esperar(cola, ids[0], EJECUTANDO)
+    assert [cola.posicion_en_cola(i) for i in ids] == [None, 1, 2, 3]
+    manejador.soltar()
+    for id_trabajo in ids:
+        _esperar(cola, id_trabajo, COMPLETADO)
+    assert manejador.orden == [0, 1, 2, 3]
+    assert cola.obtener(ids[2])["resultado"] == {"exito": True, "n": 2}
+
+
+def test_limite_por_usuario(cola):
+    manejador = Manejador()
+    cola.registrar_tipo("prueba", manejador)
+    primero = cola.enviar("prueba", {"n": 0}, usuario="ana")
+    segundo = cola.enviar("prueba", {"n": 1}, usuario="ana")
+    otro = cola.enviar("prueba", {"n": 2}, usuario="beto")
+    # El segundo de "ana" espera aunque haya lugar; "beto" lo adelanta
+    _esperar(cola, primero, EJECUTANDO)
+    _esperar(cola, otro, EJECUTANDO)
+    assert cola.obtener(segundo)["estado"] == EN_COLA
+    assert cola.posicion_en_cola(segundo) == 1
+    manejador.soltar()
+    _esperar(cola, segundo, COMPLETADO)
+    assert sorted(manejador.orden[:2]) == [0, 2] and manejador.orden[2] == 1
+
+
+def test_cancelar_solo_en_cola(cola):
+    manejador = Manejador()
+    cola.registrar_tipo("prueba", manejador)
+    en_curso = cola.enviar("prueba", {"n": 0}, usuario="ana")
+    pendiente = cola.enviar("prueba", {"n": 1}, usuario="ana")
+    _esperar(cola, en_curso, EJECUTANDO)
+    assert cola.cancelar(pendiente)
+    assert not cola.cancelar(pendiente)
+    assert not cola.cancelar(en_curso)
+    trabajo = cola.obtener(pendiente)
+    assert (trabajo["estado"], trabajo["error"]) == (FALLIDO, "Cancelado")
+    assert cola.posicion_en_cola(pendiente) is None
+    manejador.soltar()
+    _esperar(cola, en_curso, COMPLETADO)
+    assert manejador.orden == [0]
+
+
+def test_fallos_del_manejador(cola):
+    def fallar(parametros, contexto):
+        if parametros["lanzar"]:
+            raise RuntimeError("sin datos")
+        return {"exito": False, "error": "instrucciones vacías"}
+
+    cola.registrar_tipo("prueba", fallar)
+    lanza = cola.enviar("prueba", {"lanzar": True})
+    falla = cola.enviar("prueba", {"lanzar": False}, usuario="otro")
+    _esperar(cola, lanza, FALLIDO)
+    _esperar(cola, falla, FALLIDO)
+    assert cola.obtener(lanza)["error"] == "sin datos"
+    assert "Error: sin datos" in cola.obtener(lanza)["registro"]
+    assert cola.obtener(falla)["error"] == "instrucciones vacías"
+
+
+def test_tipos_registrados_para_todas_las_colas(tmp_path):
+    registrar_tipo("prueba_global", lambda parametros, contexto: {"ok": 1})
+    cola = ColaTrabajos(db_path=str(tmp_path / "trabajos.db"))
+    try:
+        id_trabajo = cola.enviar("prueba_global", {})
+        _esperar(cola, id_trabajo, COMPLETADO)
+        with pytest.raises(ValueError):
+            cola.enviar("desconocido", {})
+    finally:
+        cola.detener()
+
+
+def test_reinicio_marca_fallidos_los_que_se_ejecutaban(tmp_path):
+    db_path = str(tmp_path / "trabajos.db")
+    anterior = ColaTrabajos(db_path=db_path)
+    anterior.registrar_tipo("prueba", lambda parametros, contexto: {})
+    # Trabajos que dejó un proceso anterior: uno a medias y uno sin empezar
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO trabajos (id, tipo, usuario, estado, parametros) "
+            "VALUES (?, 'prueba', 'ana', ?, '{}')",
+            [("a_medias", EJECUTANDO), ("pendiente", EN_COLA)],
+        )
+
+    nueva = ColaTrabajos(db_path=db_path)
+    nueva.registrar_tipo("prueba", lambda parametros, contexto: {"ok": 1})
+    nueva.iniciar()
+    try:
+        trabajo = nueva.obtener("a_medias")
+        assert trabajo["estado"] == FALLIDO
+        assert "reinició" in trabajo["error"]
+        _esperar(nueva, "pendiente", COMPLETADO)
+    finally:
+        nueva.detener()
+
+
+def test_purgar_elimina_terminados_antiguos(cola):
+    cola.registrar_tipo("prueba", lambda parametros, contexto: {})
+    viejo = cola.enviar("prueba", {})
+    nuevo = cola.enviar("prueba", {}, usuario="otro")
+    _esperar(cola, viejo, COMPLETADO)
+    _esperar(cola, nuevo, COMPLETADO)
+    with sqlite3.connect(cola.db_path) as conn:
+        conn.execute(
+            "UPDATE trabajos SET terminado = datetime('now', '-10 days') WHERE id = ?",
+            (viejo,),
+        )
+    assert cola.purgar() == 1
+    assert cola.obtener(viejo) is None
+    assert cola.obtener(nuevo) is not None
@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backend.kpi_templates import PLANTILLAS, detectar_plantilla
+
+DATASETS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "dataset")
+
+
+def _columnas(plantilla):
+    return pd.read_csv(os.path.join(DATASETS, plantilla.archivo), nrows=1).columns
+
+
+@pytest.mark.parametrize("plantilla", PLANTILLAS, ids=lambda p: p.archivo)
+def test_plantilla_si_las_instrucciones_la_piden(plantilla):
+    columnas = _columnas(plantilla)
+    pedido = f"Calcula los indicadores de {plantilla.nombre.lower()}"
+    assert detectar_plantilla(columnas, pedido) is plantilla
+
+
+@pytest.mark.parametrize("plantilla", PLANTILLAS, ids=lambda p: p.archivo)
+def test_otros_pedidos_van_a_la_ia(plantilla):
+    # Que el dataset sea conocido no basta para ignorar las instrucciones
+    columnas = _columnas(plantilla)
+    for pedido in (
+        "Crea visualizaciones para identificar correlaciones entre variables",
+        "Genera un histograma de cada columna numérica",
+    ):
+        assert detectar_plantilla(columnas, pedido) is None
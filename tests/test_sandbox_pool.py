@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from backend.sandbox_pool import SandboxPool
+
+LIMITES = {"tiempo_s": 60, "cpu_s": 60, "memoria_mb": 1024, "max_figuras": 3}
+
+# Tarda lo suficiente para que dos ejecuciones se superpongan
+TRABAJO = """
+import matplotlib.pyplot as plt
+etiqueta = {etiqueta!r}
+total = sum(i * i for i in range(4_000_000))
+for n in range({figuras}):
+    plt.figure()
+    plt.plot([0, n])
+print(etiqueta, len(plt.get_fignums()))
+"""
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(tamano=2)
+    yield pool
+    pool.cerrar()
+
+
+def _trabajos(pool):
+    return sum(trabajador.trabajos for trabajador in pool._todos)
+
+
+def test_ejecuciones_simultaneas_aisladas(pool):
+    resultados = {}
+
+    def ejecutar(etiqueta, figuras):
+        codigo = TRABAJO.format(etiqueta=etiqueta, figuras=figuras)
+        resultados[etiqueta] = pool.ejecutar(codigo, limites=LIMITES)
+
+    hilos = [
+        threading.Thread(target=ejecutar, args=("a", 1)),
+        threading.Thread(target=ejecutar, args=("b", 3)),
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join(120)
+    # Cada una ve solo su salida y sus figuras, no las de la otra
+    assert resultados["a"]["output"] == "a 1\n"
+    assert resultados["b"]["output"] == "b 3\n"
+    assert [resultados[e]["recursos"]["figuras"] for e in "ab"] == [1, 3]
+    assert [trabajador.trabajos for trabajador in pool._todos] == [1, 1]
+    # Tampoco queda el estado de la ejecución anterior en cada proceso
+    for _ in range(2):
+        siguiente = pool.ejecutar("print(etiqueta)", limites=LIMITES)
+        assert not siguiente["success"]
+        assert "etiqueta" in siguiente["error"]
+
+
+def test_limite_de_figuras(pool):
+    resultado = pool.ejecutar(TRABAJO.format(etiqueta="c", figuras=4), limites=LIMITES)
+    assert not resultado["success"]
+    assert resultado["limite_excedido"] == "figuras"
+    assert resultado["recursos"]["figuras"] == 4
+
+
+def test_tiempo_excedido_reemplaza_el_trabajador(pool):
+    antes = set(pool._todos)
+    resultado = pool.ejecutar("while True:\n    pass\n", limites={"tiempo_s": 1})
+    assert not resultado["success"]
+    assert resultado["limite_excedido"] == "tiempo"
+    (terminado,) = antes - set(pool._todos)
+    assert not terminado.vivo()
+    assert len(pool._todos) == 2
+    # El reemplazo atiende las ejecuciones siguientes
+    trabajos = _trabajos(pool)
+    for _ in range(2):
+        assert pool.ejecutar("print(1 + 1)", limites=LIMITES)["output"] == "2\n"
+    assert _trabajos(pool) == trabajos + 2
+
+
+def test_recicla_tras_max_trabajos():
+    pool = SandboxPool(tamano=1, max_trabajos=2)
+    try:
+        procesos = []
+        for _ in range(5):
+            resultado = pool.ejecutar("x = 1", limites=LIMITES)
+            assert resultado["success"], resultado["error"]
+            procesos.append(pool._todos[0].proceso)
+        # Tras cada dos ejecuciones el trabajador se reemplaza por uno nuevo
+        assert [len(set(procesos[:i])) for i in range(1, 6)] == [1, 2, 2, 3, 3]
+        assert [p.poll() is None for p in dict.fromkeys(procesos)] == [
+            False,
+            False,
+            True,
+        ]
+    finally:
+        pool.cerrar()
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from backend.scheduler import INTERACTIVA, MASIVA, Planificador
+
+
+def _esperar(condicion, limite_s=5):
+    fin = time.monotonic() + limite_s
+    while not condicion():
+        if time.monotonic() > fin:
+            pytest.fail("La condición no se cumplió a tiempo")
+        time.sleep(0.005)
+
+
+def _en_cola(planificador):
+    return sum(m["en_cola"] for m in planificador.metricas().values())
+
+
+def _orden_de_atencion(planificador, solicitudes):
+    """
+    Encola las solicitudes (clase, sesión, etiqueta) en ese orden mientras
+    un turno interactivo está tomado, lo libera y retorna las etiquetas en
+    el orden en que se atendieron. Con un turno a la vez, ese es el orden
+    de despacho.
+    """
+    orden = []
+
+    def pedir(clase, sesion, etiqueta):
+        with planificador.turno(clase, sesion):
+            orden.append(etiqueta)
+
+    hilos = []
+    with planificador.turno(INTERACTIVA, "ocupa"):
+        for clase, sesion, etiqueta in solicitudes:
+            hilo = threading.Thread(target=pedir, args=(clase, sesion, etiqueta))
+            hilo.start()
+            hilos.append(hilo)
+            _esperar(lambda: _en_cola(planificador) == len(hilos))
+    for hilo in hilos:
+        hilo.join(5)
+    return orden
+
+
+def test_interactivas_antes_que_masivas_en_cola():
+    planificador = Planificador(max_simultaneas=1)
+    orden = _orden_de_atencion(
+        planificador,
+        [
+            (MASIVA, "lote", "m1"),
+            (MASIVA, "lote", "m2"),
+            (INTERACTIVA, "clic", "i1"),
+            (MASIVA, "lote", "m3"),
+            (INTERACTIVA, "clic", "i2"),
+        ],
+    )
+    assert orden == ["i1", "i2", "m1", "m2", "m3"]
+
+
+def test_reparto_justo_entre_sesiones():
+    planificador = Planificador(max_simultaneas=1)
+    lote = [(MASIVA, "ana", f"a{n}") for n in range(4)]
+    orden = _orden_de_atencion(planificador, lote + [(MASIVA, "beto", "b0")])
+    # "beto" llegó después de las cuatro de "ana", pero no espera a todas
+    assert orden == ["a0", "b0", "a1", "a2", "a3"]
+
+
+def test_masivas_dejan_un_turno_libre():
+    planificador = Planificador(max_simultaneas=2, max_masivas=1)
+    liberar = threading.Event()
+
+    def masiva():
+        with planificador.turno(MASIVA, "lote"):
+            liberar.wait(5)
+
+    hilos = [threading.Thread(target=masiva) for _ in range(2)]
+    for hilo in hilos:
+        hilo.start()
+    _esperar(lambda: _en_cola(planificador) == 1)
+    metricas = planificador.metricas()[MASIVA]
+    assert (metricas["en_curso"], metricas["en_cola"]) == (1, 1)
+    # El turno reservado atiende enseguida a una interactiva
+    with planificador.turno(INTERACTIVA, "clic", timeout=1):
+        assert planificador.metricas()[INTERACTIVA]["en_curso"] == 1
+    liberar.set()
+    for hilo in hilos:
+        hilo.join(5)
+    assert planificador.metricas()[MASIVA]["atendidas"] == 2
+
+
+def test_solicitud_vencida_sale_de_la_cola():
+    planificador = Planificador(max_simultaneas=1)
+    orden = []
+
+    def pedir(sesion, etiqueta, timeout=None):
+        try:
+            with planificador.turno(MASIVA, sesion, timeout=timeout):
+                orden.append(etiqueta)
+        except TimeoutError:
+            orden.append(f"{etiqueta} vencida")
+
+    # La que vence es la raíz del montículo; si al quitarla no se reordena,
+    # la segunda de "ana" pasa delante de la primera de "beto"
+    solicitudes = [("ana", "a0", 0.2), ("ana", "a1"), ("beto", "b0")]
+    hilos = []
+    with planificador.turno(INTERACTIVA, "ocupa"):
+        for args in solicitudes:
+            hilos.append(threading.Thread(target=pedir, args=args))
+            hilos[-1].start()
+            _esperar(lambda: _en_cola(planificador) == len(hilos))
+        _esperar(lambda: orden == ["a0 vencida"])
+        assert _en_cola(planificador) == 2
+    for hilo in hilos:
+        hilo.join(5)
+    assert orden == ["a0 vencida", "b0", "a1"]
+    metricas = planificador.metricas()
+    assert metricas[MASIVA]["atendidas"] == 2
+    assert metricas[MASIVA]["en_curso"] == 0
+    assert "masiva: 0 en cola, 0 en curso, 2 atendidas" in (
+        planificador.resumen_metricas()
+    )
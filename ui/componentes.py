@@ -0,0 +1,24 @@
+import gradio as gr
+from gradio.components.dataframe import DataframeData
+
+
+class Tabla(gr.Dataframe):
+    """
+    gr.Dataframe que no importa pandas para una tabla vacía.
+
+    Gradio procesa el valor inicial de cada componente al construir la
+    interfaz, y el de Dataframe importa pandas (y con él pyarrow y el Styler,
+    que carga matplotlib) aunque el valor sea None. Las tablas que se llenan
+    con `demo.load` no necesitan nada de eso al arrancar. Como plantilla, se
+    dibuja en el navegador igual que un Dataframe.
+
+    Gradio escribe `componentes.pyi` junto a este archivo al definir la
+    subclase; el archivo es generado y está en .gitignore.
+    """
+
+    is_template = True
+
+    def postprocess(self, value) -> DataframeData:
+        if value is None:
+            return DataframeData(headers=list(self.headers or []), data=[])
+        return super().postprocess(value)
@@ -1,13 +1,103 @@
+import threading
 import gradio as gr
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from backend.database import db_manager
+from gradio.components.plot import PlotData
+from backend.database import get_db_manager
+
+# Cada cuánto las pestañas abiertas comprueban si hay evaluaciones nuevas
+INTERVALO_REFRESCO_S = 5
+
+# Últimas salidas generadas, la versión de la base con la que se generaron y
+# los conteos de los que salen (para sumarles solo las evaluaciones nuevas)
+_cache_estadisticas = {
+    "version": None,
+    "salidas": None,
+    "stats": None,
+    "reescrituras": None,
+    "ultimo_id": 0,
+}
+_cache_lock = threading.Lock()
+
+
+def _sumar_conteos(stats, nuevas):
+    total = dict(stats)
+    for clave in ("por_calificacion", "por_tipo"):
+        conteos = dict(stats[clave])
+        for valor, cantidad in nuevas[clave].items():
+            conteos[valor] = conteos.get(valor, 0) + cantidad
+        total[clave] = conteos
+    total["total_evaluaciones"] += nuevas["total_evaluaciones"]
+    return total
 
 
 def generar_estadisticas():
-    """Genera el markdown y las gráficas (pie y bar) para la pestaña de estadísticas."""
-    stats = db_manager.obtener_estadisticas()
+    """
+    Genera el markdown y las gráficas (pie y bar) para la pestaña de estadísticas.
+
+    Las salidas se reutilizan mientras la base no cambie (ver
+    `DatabaseManager.version_datos`): una actualización sin datos nuevos
+    cuesta una consulta mínima. Si solo se agregaron evaluaciones, se cuentan
+    únicamente las nuevas y se suman a los conteos anteriores; si alguna se
+    modificó o archivó, se vuelve a contar todo. Las gráficas se guardan ya
+    serializadas.
+    """
+    db = get_db_manager()
+    version = db.version_datos()
+    with _cache_lock:
+        if _cache_estadisticas["version"] == version:
+            return _cache_estadisticas["salidas"]
+        anterior = dict(_cache_estadisticas)
+    reescrituras, ultimo_id = db.estado_cambios()
+    if anterior["stats"] is not None and anterior["reescrituras"] == reescrituras:
+        stats = _sumar_conteos(
+            anterior["stats"],
+            db.obtener_estadisticas(desde_id=anterior["ultimo_id"], hasta_id=ultimo_id),
+        )
+    else:
+        stats = db.obtener_estadisticas(hasta_id=ultimo_id)
+    markdown_text, fig_calificacion, fig_tipo = _construir_estadisticas(stats)
+    salidas = (
+        markdown_text,
+        PlotData(type="plotly", plot=fig_calificacion.to_json()),
+        PlotData(type="plotly", plot=fig_tipo.to_json()),
+    )
+    with _cache_lock:
+        # La versión leída antes de consultar: si hubo una escritura en el
+        # medio, la próxima actualización vuelve a calcular
+        _cache_estadisticas.update(
+            version=version,
+            salidas=salidas,
+            stats=stats,
+            reescrituras=reescrituras,
+            ultimo_id=ultimo_id,
+        )
+    return salidas
+
+
+def estadisticas_con_version():
+    """
+    Salidas de `generar_estadisticas` más la versión de la base que muestran.
+    La versión se lee antes de generar: si la base cambia entretanto, el
+    temporizador vuelve a enviar las gráficas en lugar de perder el cambio.
+    """
+    version = get_db_manager().version_datos()
+    return (*generar_estadisticas(), version)
+
+
+def refrescar_estadisticas(version_mostrada):
+    """
+    Evento del temporizador: solo envía las gráficas si la base cambió desde
+    la última versión mostrada en la página.
+    """
+    if get_db_manager().version_datos() == version_mostrada:
+        return gr.skip(), gr.skip(), gr.skip(), version_mostrada
+    return estadisticas_con_version()
+
+
+def _construir_estadisticas(stats):
+    # pandas y plotly se importan aquí para no cargarlos al arrancar la aplicación
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
 
     # Markdown con estadísticas
     markdown_text = f"""## 📊 Estadísticas de Evaluaciones
@@ -152,16 +242,33 @@ def generar_estadisticas():
     return markdown_text, fig_calificacion, fig_tipo
 
 
-def crear_tab_estadisticas():
-    """Crea la pestaña de Estadísticas"""
-    # Obtener valores iniciales para cargar al arrancar la app
+def cargar_estadisticas_iniciales():
+    """
+    Valores iniciales de la pestaña y su versión (ver `estadisticas_con_version`);
+    nunca falla para no romper la carga de la página.
+    """
     try:
-        initial_markdown, initial_fig_cal, initial_fig_tipo = generar_estadisticas()
+        return estadisticas_con_version()
     except Exception as e:
         print(f"Error al generar estadísticas iniciales: {e}")
-        initial_markdown = "No se pudieron cargar las estadísticas."
-        initial_fig_cal = go.Figure()
-        initial_fig_tipo = go.Figure()
+        return "No se pudieron cargar las estadísticas.", None, None, None
+
+
+def crear_tab_estadisticas(demo=None):
+    """
+    Crea la pestaña de Estadísticas.
+    Si se recibe `demo`, los valores iniciales se cargan con su evento `load`
+    en lugar de calcularse mientras se construye la interfaz.
+    """
+    if demo is None:
+        initial_markdown, initial_fig_cal, initial_fig_tipo, initial_version = (
+            cargar_estadisticas_iniciales()
+        )
+    else:
+        initial_markdown = "Cargando estadísticas..."
+        initial_fig_cal = None
+        initial_fig_tipo = None
+        initial_version = None
 
     with gr.TabItem("Estadísticas"):
         with gr.Row():
@@ -180,8 +287,26 @@ def crear_tab_estadisticas():
                     label="Distribución por Tipo de Indicador",
                 )
 
-        # Configurar evento
-        refresh_stats_btn.click(
-            fn=generar_estadisticas,
-            outputs=[estadisticas_text, fig_calificacion_plot, fig_tipo_plot],
+        # Versión de la base mostrada en esta página
+        version_mostrada = gr.State(initial_version)
+        temporizador = gr.Timer(INTERVALO_REFRESCO_S)
+
+        # Todas las salidas devuelven la versión mostrada, para que el
+        # temporizador no reenvíe lo que la página ya tiene
+        salidas = [
+            estadisticas_text,
+            fig_calificacion_plot,
+            fig_tipo_plot,
+            version_mostrada,
+        ]
+
+        # Configurar eventos
+        refresh_stats_btn.click(fn=estadisticas_con_version, outputs=salidas)
+        temporizador.tick(
+            fn=refrescar_estadisticas,
+            inputs=version_mostrada,
+            outputs=salidas,
+            show_progress="hidden",
         )
+        if demo is not None:
+            demo.load(fn=cargar_estadisticas_iniciales, outputs=salidas)
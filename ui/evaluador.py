@@ -1,6 +1,19 @@
 import gradio as gr
 from backend.gemini_client import get_indicator_evaluation
 
+# Tipos de indicador que se pueden evaluar (también filtran el historial)
+TIPOS_INDICADOR = ["Eficiencia", "Eficacia", "Calidad", "Productividad", "Impacto"]
+
+
+def evaluar_indicador(
+    objetivo, indicador, meta, fuente, formula, tipo, request: gr.Request = None
+):
+    """Evalúa el indicador repartiendo los turnos de Gemini por sesión."""
+    sesion = request.session_hash if request is not None else None
+    return get_indicator_evaluation(
+        objetivo, indicador, meta, fuente, formula, tipo, sesion=sesion
+    )
+
 
 def crear_tab_nueva_evaluacion():
     """Crea la pestaña de Nueva Evaluación"""
@@ -28,13 +41,7 @@ def crear_tab_nueva_evaluacion():
                 )
                 tipo = gr.Dropdown(
                     label="Tipo de Indicador",
-                    choices=[
-                        "Eficiencia",
-                        "Eficacia",
-                        "Calidad",
-                        "Productividad",
-                        "Impacto",
-                    ],
+                    choices=TIPOS_INDICADOR,
                 )
                 submit_btn = gr.Button(
                     "Evaluar Indicador", elem_classes="submit-button"
@@ -47,10 +54,12 @@ def crear_tab_nueva_evaluacion():
                     elem_classes="output-area",
                 )
 
-        # Configurar evento
+        # Configurar evento: el planificador limita las llamadas a Gemini,
+        # así que las evaluaciones no se encolan además en Gradio
         submit_btn.click(
-            fn=get_indicator_evaluation,
+            fn=evaluar_indicador,
             inputs=[objetivo_estrategico, indicador, meta, fuente_dato, formula, tipo],
             outputs=output_text,
             show_progress=True,
+            concurrency_limit=None,
         )
@@ -1,76 +1,594 @@
 import gradio as gr
-import pandas as pd
-import base64
-import io
+from gradio.components.plot import PlotData
 import os
+import time
+import queue
+import shutil
+import uuid
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from backend.gemini_client import generate_code_from_prompt
 from backend.code_executor import SafeCodeExecutor
+from backend.figure_store import get_figure_store
+from backend.csv_ingestion import ErrorIngesta
+from backend.dataset_cache import abrir_dataset
+from backend.dtype_optimizer import bytes_ahorrados
+from backend.formula_engine import PERIODOS, ErrorFormula, calcular_indicador
+from backend.kpi_templates import detectar_plantilla, ejecutar_plantilla
+from backend.job_queue import (
+    EN_COLA,
+    EJECUTANDO,
+    COMPLETADO,
+    FALLIDO,
+    ESTADOS_FINALES,
+    get_job_queue,
+    registrar_tipo,
+)
+from backend import shared_frames
+from ui.componentes import Tabla
+
+# Espacios fijos para gráficas interactivas de Plotly en la pestaña
+MAX_GRAFICAS_INTERACTIVAS = 4
+
+# Cada cuánto se refresca el tiempo de la etapa en curso mientras se espera
+INTERVALO_PROGRESO_S = 1.0
+
+# Hilos para leer, generar y ejecutar mientras el trabajo publica su avance
+_tareas = ThreadPoolExecutor(max_workers=8, thread_name_prefix="generador_ia")
+
+# Cada cuánto la pestaña consulta el estado de un trabajo en curso
+INTERVALO_CONSULTA_S = 0.5
+
+# Tipo de trabajo de la cola (ver ColaTrabajos) para un análisis de CSV
+TIPO_TRABAJO = "analisis_csv"
+
+# Trabajos recientes que se ofrecen para volver a abrir
+MAX_TRABAJOS_RECIENTES = 20
+
+# Estado de cada sesión de Gradio con la pestaña abierta: su último dataset
+# (ver CargaDataset) y cuántos de sus trabajos siguen en la cola
+_sesiones: "dict[str, dict]" = {}
+_sesiones_lock = threading.Lock()
+
+
+def formatear_perfil(perfil, codigo=""):
+    """Presenta en markdown el perfil de una ejecución (ver PerfilEjecucion)."""
+    if not perfil:
+        return ""
+    lineas_codigo = codigo.splitlines()
+    texto = (
+        f"**Ejecución:** {perfil['ejecucion_s']:.3f} s · "
+        f"**Renderizado de figuras:** {perfil['renderizado_s']:.3f} s · "
+        f"**Pico de memoria (Python):** {perfil['memoria_pico_mb']:.1f} MB\n\n"
+    )
+    if perfil["lineas"]:
+        texto += (
+            "**Líneas más lentas**\n\n"
+            "| Línea | Tiempo (s) | Veces | Código |\n|---:|---:|---:|---|\n"
+        )
+        for fila in perfil["lineas"]:
+            n = fila["linea"]
+            fuente = lineas_codigo[n - 1].strip() if 0 < n <= len(lineas_codigo) else ""
+            fuente = fuente.replace("|", "\\|")
+            texto += (
+                f"| {n} | {fila['tiempo_s']:.4f} | {fila['ejecuciones']} "
+                f"| `{fuente}` |\n"
+            )
+    if perfil["funciones"]:
+        texto += (
+            "\n**Funciones con mayor tiempo acumulado**\n\n"
+            "| Función | Llamadas | Propio (s) | Acumulado (s) |\n"
+            "|---|---:|---:|---:|\n"
+        )
+        for fila in perfil["funciones"]:
+            nombre = fila["funcion"].replace("|", "\\|")
+            texto += (
+                f"| `{nombre}` <br><sub>{fila['ubicacion']}</sub> | {fila['llamadas']} "
+                f"| {fila['tiempo_propio_s']:.4f} | {fila['tiempo_acumulado_s']:.4f} |\n"
+            )
+    return texto
+
+
+def formatear_optimizacion(reporte):
+    """Resume en markdown las conversiones de tipos y la memoria ahorrada."""
+    if not reporte:
+        return ""
+    detalle = ", ".join(
+        f"`{fila['columna']}` → {fila['tipo_despues']}" for fila in reporte
+    )
+    ahorro_mb = bytes_ahorrados(reporte) / (1024 * 1024)
+    return f"**Tipos optimizados** ({ahorro_mb:.2f} MB ahorrados): {detalle}"
+
+
+def salidas_interactivas(plotly_figures=()):
+    """
+    Actualizaciones para los componentes `gr.Plot`: el JSON de cada figura
+    se entrega tal cual al cliente, sin volver a serializarla en el servidor.
+    """
+    actualizaciones = []
+    for i in range(MAX_GRAFICAS_INTERACTIVAS):
+        if i < len(plotly_figures):
+            valor = PlotData(type="plotly", plot=plotly_figures[i])
+            actualizaciones.append(gr.update(value=valor, visible=True))
+        else:
+            actualizaciones.append(gr.update(value=None, visible=False))
+    return tuple(actualizaciones)
+
+
+def _instantanea(
+    mensaje,
+    graficas=None,
+    codigo="",
+    info="",
+    plotly_figures=(),
+    perfil="",
+    exito=None,
+):
+    """
+    Estado de las salidas de un análisis, serializable a JSON para guardarlo
+    como progreso o resultado del trabajo. `exito` es None mientras avanza.
+    """
+    return {
+        "mensaje": mensaje,
+        "graficas": list(graficas or []),
+        "codigo": codigo,
+        "info": info,
+        "plotly_figures": list(plotly_figures),
+        "perfil": perfil,
+        "exito": exito,
+    }
+
+
+def _error(mensaje, codigo=""):
+    return _instantanea(mensaje, codigo=codigo, exito=False)
+
+
+def _respuesta(instantanea):
+    """Salidas de la pestaña a partir de una instantánea de `_instantanea`."""
+    return (
+        instantanea["mensaje"],
+        [tuple(grafica) for grafica in instantanea["graficas"]],
+        instantanea["codigo"],
+        instantanea["info"],
+        instantanea["perfil"],
+    ) + salidas_interactivas(instantanea["plotly_figures"])
+
+
+def formatear_recursos(recursos):
+    """Resume en markdown los recursos consumidos por una ejecución."""
+    partes = []
+    if "tiempo_s" in recursos:
+        partes.append(f"{recursos['tiempo_s']:.2f} s")
+    if "cpu_s" in recursos:
+        partes.append(f"CPU {recursos['cpu_s']:.2f} s")
+    if "memoria_max_mb" in recursos:
+        partes.append(f"memoria máx. {recursos['memoria_max_mb']:.0f} MB")
+    if not partes:
+        return ""
+    return f"**Recursos de ejecución:** {' · '.join(partes)}"
+
+
+# Cómo se obtuvo el DataFrame (ver CargaDataset)
+ORIGENES_DATASET = {
+    "csv": "lectura del CSV",
+    "cache": "caché de datasets (sin volver a leer el CSV)",
+    "sesion": "memoria (mismo archivo que tu análisis anterior)",
+}
+
+# Cómo se muestra cada estado de un trabajo
+ESTADOS_TRABAJO = {
+    EN_COLA: "en cola",
+    EJECUTANDO: "ejecutando",
+    COMPLETADO: "completado",
+    FALLIDO: "fallido",
+}
+
+
+class _Progreso:
+    """Estado de las salidas mientras avanza el procesamiento, con tiempos por etapa."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapa = ""
+        self.tiempos = []
+        self.graficas = []
+        self.codigo = ""
+        self.info_datos = ""
+        self.info_ejecucion = ""
+        self.plotly_figures = []
+        self.perfil = ""
+
+    def completar(self, nombre, inicio):
+        self.tiempos.append((nombre, time.perf_counter() - inicio))
+
+    def salidas(self, mensaje=None, exito=None):
+        """Instantánea actual; sin `mensaje`, el estado muestra la etapa en curso."""
+        if mensaje is None:
+            transcurrido = time.perf_counter() - self.inicio
+            mensaje = f"⏳ **{self.etapa}…** ({transcurrido:.1f} s)"
+        if self.tiempos:
+            mensaje += "\n\n" + " · ".join(
+                f"{nombre}: {segundos:.1f} s" for nombre, segundos in self.tiempos
+            )
+        return _instantanea(
+            mensaje,
+            self.graficas,
+            self.codigo,
+            self.info_datos + self.info_ejecucion,
+            self.plotly_figures,
+            self.perfil,
+            exito,
+        )
+
 
+def _estado_sesion(sesion, crear=True):
+    """Estado de una sesión (ver `_sesiones`), o None si no existe y no se crea."""
+    with _sesiones_lock:
+        if sesion not in _sesiones and crear:
+            _sesiones[sesion] = {"dataset": {}, "trabajos": 0, "cerrada": False}
+        return _sesiones.get(sesion)
 
-def procesar_csv_y_generar_codigo(archivo_csv, instrucciones_usuario):
+
+def _reservar_sesion(sesion):
+    """Cuenta un trabajo encolado por la sesión; sus recursos esperan a que termine."""
+    estado = _estado_sesion(sesion)
+    with _sesiones_lock:
+        estado["trabajos"] += 1
+
+
+def _liberar_recursos(sesion):
+    get_figure_store().liberar_sesion(sesion)
+    shared_frames.liberar_sesion(sesion)
+
+
+def _terminar_trabajo_sesion(sesion):
     """
-    Procesa el archivo CSV subido, genera código usando IA y lo ejecuta
+    Descuenta un trabajo terminado. Si la sesión ya se cerró (o el trabajo
+    viene de antes de reiniciar el servidor), libera sus recursos.
     """
-    if archivo_csv is None:
-        return "❌ Por favor, sube un archivo CSV.", [], "", ""
-
-    if not instrucciones_usuario.strip():
-        return (
-            "❌ Por favor, proporciona instrucciones sobre qué visualizar.",
-            [],
-            "",
-            "",
-        )
+    with _sesiones_lock:
+        estado = _sesiones.get(sesion)
+        if estado is not None:
+            estado["trabajos"] = max(0, estado["trabajos"] - 1)
+            if not (estado["cerrada"] and estado["trabajos"] == 0):
+                return
+            del _sesiones[sesion]
+    _liberar_recursos(sesion)
 
-    try:
-        # Leer el archivo CSV
-        df = pd.read_csv(archivo_csv.name)
 
-        # Validar que el DataFrame no esté vacío
-        if df.empty:
-            return "❌ El archivo CSV está vacío.", [], "", ""
+def liberar_recursos_sesion(request: gr.Request):
+    """
+    Elimina las figuras, los DataFrames compartidos y el último dataset de
+    una sesión cuando el usuario cierra la página. Si la sesión tiene
+    trabajos pendientes, se liberan cuando termina el último.
+    """
+    sesion = request.session_hash
+    with _sesiones_lock:
+        estado = _sesiones.get(sesion)
+        if estado is not None and estado["trabajos"]:
+            estado["cerrada"] = True
+            return
+        _sesiones.pop(sesion, None)
+    _liberar_recursos(sesion)
 
-        # Generar código usando Gemini
-        codigo_generado = generate_code_from_prompt(instrucciones_usuario, df)
 
-        if codigo_generado.startswith("Error"):
-            return f"❌ Error al generar código: {codigo_generado}", [], "", ""
+def ejecutar_trabajo_analisis(parametros, contexto):
+    """
+    Manejador del trabajo "analisis_csv" en la cola: lee el CSV, genera el
+    código con IA y lo ejecuta, publicando cada instantánea como progreso.
+    Las gráficas finales se copian a la carpeta del trabajo para que sigan
+    disponibles aunque la caché de figuras las elimine.
+    """
+    # Los trabajos de antes de reiniciar el servidor no tienen sesión viva
+    sesion = parametros.get("sesion") or f"trabajo:{contexto.id}"
+    estado = _estado_sesion(sesion, crear=False)
+    final = None
+    try:
+        for instantanea in _procesar(
+            parametros["archivo"],
+            parametros["instrucciones"],
+            parametros["perfilar"],
+            estado["dataset"] if estado else {},
+            sesion=sesion,
+            usar_plantillas=parametros.get("usar_plantillas", False),
+        ):
+            contexto.publicar(instantanea)
+            final = instantanea
+        contexto.registrar(final["mensaje"].splitlines()[0])
+        graficas = []
+        for archivo, nombre in final["graficas"]:
+            if not os.path.exists(archivo):
+                continue
+            destino = os.path.join(contexto.directorio, os.path.basename(archivo))
+            try:
+                os.link(archivo, destino)
+            except OSError:
+                shutil.copy2(archivo, destino)
+            graficas.append((destino, nombre))
+        final["graficas"] = graficas
+    finally:
+        _terminar_trabajo_sesion(sesion)
+    if not final["exito"]:
+        final["error"] = final["mensaje"]
+    return final
+
+
+def procesar_csv_y_generar_codigo(
+    archivo_csv,
+    instrucciones_usuario,
+    perfilar=False,
+    usar_plantillas=True,
+    usuario="",
+    request: gr.Request = None,
+):
+    """
+    Encola el análisis del CSV subido y muestra su avance.
+
+    Es un generador: entrega la información del dataset en cuanto termina la
+    lectura, luego el código generado y cada gráfica a medida que se
+    renderiza, con el tiempo de cada etapa en el estado. Con `perfilar`,
+    también devuelve el perfil de la ejecución. Con `usar_plantillas`, los
+    datasets reconocidos cuyas instrucciones piden los indicadores de su
+    plantilla de KPI se analizan con ella, sin IA (ver `detectar_plantilla`).
+    El trabajo sigue en la cola
+    aunque se cierre la pestaña; `usuario` (guardado en el navegador)
+    permite volver a abrirlo desde "Trabajos recientes". El trabajo lleva la
+    sesión de Gradio, dueña del dataset en memoria y de las figuras.
+    """
+    usuario = usuario or uuid.uuid4().hex
+    if archivo_csv is None:
+        mensaje = "❌ Por favor, sube un archivo CSV."
+    elif not instrucciones_usuario.strip():
+        mensaje = "❌ Por favor, proporciona instrucciones sobre qué visualizar."
+    else:
+        mensaje = None
+    if mensaje:
+        yield _respuesta(_error(mensaje)) + (gr.update(), usuario)
+        return
+
+    sesion = request.session_hash if request else None
+    if sesion:
+        _reservar_sesion(sesion)
+    try:
+        id_trabajo = get_job_queue().enviar(
+            TIPO_TRABAJO,
+            {
+                "archivo": archivo_csv.name,
+                "instrucciones": instrucciones_usuario,
+                "perfilar": bool(perfilar),
+                "usar_plantillas": bool(usar_plantillas),
+                "usuario": usuario,
+                "sesion": sesion,
+            },
+            usuario=usuario,
+        )
+    except Exception:
+        if sesion:
+            _terminar_trabajo_sesion(sesion)
+        raise
+    trabajos = trabajos_recientes(usuario, id_trabajo)
+    for salidas in seguir_trabajo(id_trabajo):
+        yield salidas + (trabajos, usuario)
 
-        # Ejecutar el código de forma segura
-        executor = SafeCodeExecutor()
 
-        # Validar código antes de ejecutar
-        es_valido, mensaje_validacion = executor.validate_code(codigo_generado)
-        if not es_valido:
-            return f"❌ Código no seguro: {mensaje_validacion}", [], codigo_generado, ""
+def seguir_trabajo(id_trabajo):
+    """
+    Muestra el estado de un trabajo de la cola hasta que termina: la
+    posición mientras espera, el progreso publicado mientras se ejecuta y
+    el resultado guardado al final (también para trabajos ya terminados).
+    """
+    if not id_trabajo:
+        yield _respuesta(_error("❌ Selecciona un trabajo."))
+        return
+    cola = get_job_queue()
+    anterior = None
+    while True:
+        trabajo = cola.obtener(id_trabajo)
+        if trabajo is None:
+            yield _respuesta(_error("❌ El trabajo ya no existe."))
+            return
+        if trabajo["estado"] in ESTADOS_FINALES:
+            if trabajo["resultado"]:
+                yield _respuesta(trabajo["resultado"])
+            else:
+                yield _respuesta(_error(f"❌ {trabajo['error']}"))
+            return
+        if trabajo["estado"] == EN_COLA:
+            posicion = cola.posicion_en_cola(id_trabajo)
+            instantanea = _instantanea(
+                f"🕒 **En cola** (posición {posicion or '—'}). "
+                "Puedes cerrar la pestaña y volver a abrir el trabajo más tarde."
+            )
+        else:
+            instantanea = trabajo["progreso"] or _instantanea("⏳ **Iniciando…**")
+        if instantanea != anterior:
+            yield _respuesta(instantanea)
+            anterior = instantanea
+        time.sleep(INTERVALO_CONSULTA_S)
 
-        # Ejecutar código
-        resultado = executor.execute_code(codigo_generado, df)
 
-        if resultado["success"]:
-            # Preparar archivos de gráficas para el Gallery
-            archivos_graficas = []
-            if resultado["figure_files"]:
-                for i, archivo in enumerate(resultado["figure_files"]):
-                    if os.path.exists(archivo):
-                        # Renombrar archivo para descarga con nombre más descriptivo
-                        nombre_descriptivo = f"grafica_{i+1}_indicadores.png"
-                        archivos_graficas.append((archivo, nombre_descriptivo))
-
-            # Preparar información del dataset
-            dataset_info = f"""## 📊 Información del Dataset
+def trabajos_recientes(usuario, seleccionado=None):
+    """Actualización del selector con los últimos trabajos del usuario."""
+    opciones = []
+    for trabajo in get_job_queue().listar(usuario, MAX_TRABAJOS_RECIENTES):
+        instrucciones = " ".join(trabajo["parametros"]["instrucciones"].split())
+        if len(instrucciones) > 50:
+            instrucciones = instrucciones[:50] + "…"
+        etiqueta = f"{trabajo['creado']} · {ESTADOS_TRABAJO[trabajo['estado']]} · {instrucciones}"
+        opciones.append((etiqueta, trabajo["id"]))
+    return gr.update(choices=opciones, value=seleccionado)
+
+
+def _info_datos(df, carga, reporte_tipos):
+    return f"""## 📊 Información del Dataset
 
 **Filas:** {len(df):,}  
 **Columnas:** {len(df.columns)}  
-**Columnas disponibles:** {', '.join(df.columns.tolist())}
+**Columnas disponibles:** {', '.join(df.columns.tolist())}  
+**Formato detectado:** separador `{carga.formato["sep"]}`, codificación {carga.formato["encoding"]}  
+**Origen de los datos:** {ORIGENES_DATASET[carga.origen]}  
+{formatear_optimizacion(reporte_tipos)}
+"""
+
+
+def _procesar(
+    ruta_csv,
+    instrucciones_usuario,
+    perfilar,
+    estado_dataset,
+    sesion=None,
+    usar_plantillas=False,
+):
+    progreso = _Progreso()
+    carga = None
+    try:
+        # Reutilizar el DataFrame de la sesión o de la caché; si no, leer el
+        # archivo CSV por bloques en segundo plano
+        progreso.etapa = "Leyendo datos"
+        yield progreso.salidas()
+        carga = abrir_dataset(ruta_csv, estado_dataset)
 
+        # El prompt se arma con una muestra de las filas leídas hasta ahora:
+        # la generación no espera a que termine la carga
+        muestra = carga.muestra()
+
+        # Validar que el DataFrame no esté vacío
+        if muestra.empty:
+            yield _error("❌ El archivo CSV está vacío.")
+            return
+
+        # Los datasets conocidos se analizan con su plantilla, sin IA, si las
+        # instrucciones piden esos indicadores
+        plantilla = (
+            detectar_plantilla(muestra.columns, instrucciones_usuario)
+            if usar_plantillas
+            else None
+        )
+        if plantilla is not None:
+            yield from _procesar_plantilla(plantilla, carga, progreso)
+            return
+
+        # Generar código usando Gemini mientras termina la lectura; cada
+        # resultado se muestra en cuanto está listo
+        progreso.etapa = "Generando código"
+        inicio_etapa = time.perf_counter()
+        pendientes = {
+            _tareas.submit(carga.resultado): "datos",
+            _tareas.submit(
+                generate_code_from_prompt, instrucciones_usuario, muestra, sesion
+            ): "codigo",
+        }
+        executor = SafeCodeExecutor(perfilar=bool(perfilar))
+        while pendientes:
+            listas, _ = wait(
+                pendientes, timeout=INTERVALO_PROGRESO_S, return_when=FIRST_COMPLETED
+            )
+            for futuro in listas:
+                if pendientes.pop(futuro) == "datos":
+                    try:
+                        df, reporte_tipos = futuro.result()
+                    except Exception:
+                        # Sin datos el código no sirve: la generación se
+                        # cancela si no empezó y, si ya corre, no se espera
+                        for pendiente in pendientes:
+                            pendiente.cancel()
+                        raise
+                    progreso.completar("Lectura de datos", progreso.inicio)
+                    progreso.info_datos = _info_datos(df, carga, reporte_tipos)
+                    continue
+                codigo_generado = futuro.result()
+                progreso.completar("Generación de código", inicio_etapa)
+                if codigo_generado.startswith("Error"):
+                    carga.cancelar()
+                    yield _error(f"❌ Error al generar código: {codigo_generado}")
+                    return
+                progreso.codigo = codigo_generado
+
+                # Validar código antes de ejecutar
+                es_valido, mensaje_validacion = executor.validate_code(codigo_generado)
+                if not es_valido:
+                    carga.cancelar()
+                    yield _error(
+                        f"❌ Código no seguro: {mensaje_validacion}",
+                        codigo=codigo_generado,
+                    )
+                    return
+            if pendientes:
+                progreso.etapa = (
+                    "Leyendo datos"
+                    if "codigo" not in pendientes.values()
+                    else "Generando código"
+                )
+            yield progreso.salidas()
+
+        # Ejecutar código; las gráficas se muestran a medida que se renderizan
+        progreso.etapa = "Ejecutando código"
+        inicio_etapa = time.perf_counter()
+        yield progreso.salidas()
+        datos = df
+        if executor.usar_pool:
+            # Se publica una vez por archivo subido; las ejecuciones siguientes
+            # sobre el mismo archivo reutilizan el buffer compartido
+            datos = shared_frames.publicar_dataframe(
+                df, sesion=sesion, clave=carga.huella
+            )
+        avisos = queue.Queue()
+        # Las figuras quedan a nombre de la sesión y se borran al cerrarla;
+        # el trabajo conserva una copia de las finales
+        futuro = _tareas.submit(
+            executor.execute_code,
+            codigo_generado,
+            datos,
+            sesion=sesion,
+            al_renderizar=lambda tipo, dato: avisos.put((tipo, dato)),
+        )
+        # None en la cola marca el fin de la ejecución (después de sus avisos)
+        futuro.add_done_callback(lambda _: avisos.put(None))
+        while True:
+            try:
+                aviso = avisos.get(timeout=INTERVALO_PROGRESO_S)
+            except queue.Empty:
+                yield progreso.salidas()
+                continue
+            if aviso is None:
+                break
+            tipo, dato = aviso
+            progreso.etapa = "Renderizando gráficas"
+            if tipo == "imagen":
+                progreso.graficas.append(_grafica_galeria(dato, len(progreso.graficas)))
+            else:
+                progreso.plotly_figures.append(dato)
+            yield progreso.salidas()
+        resultado = futuro.result()
+        progreso.completar("Ejecución", inicio_etapa)
+        progreso.perfil = formatear_perfil(resultado["perfil"], codigo_generado)
+
+        if resultado["success"]:
+            # Lista definitiva de gráficas (también cuando sale de la caché)
+            progreso.graficas = [
+                _grafica_galeria(archivo, i)
+                for i, archivo in enumerate(resultado["figure_files"])
+                if os.path.exists(archivo)
+            ]
+            progreso.plotly_figures = resultado["plotly_figures"]
+            progreso.info_ejecucion = f"""
 **Variables creadas:** {len(resultado["variables"])}  
-**Gráficas generadas:** {len(resultado["figures"])}
+**Gráficas generadas:** {len(resultado["figure_files"])}  
+**Gráficas interactivas:** {len(resultado["plotly_figures"])}  
+{formatear_recursos(resultado["recursos"])}
 """
 
             success_message = "✅ **Código ejecutado exitosamente!**"
+            if resultado["desde_cache"]:
+                success_message += " _(resultado recuperado de la caché)_"
+
+            if len(resultado["plotly_figures"]) > MAX_GRAFICAS_INTERACTIVAS:
+                success_message += (
+                    f" Se muestran las primeras {MAX_GRAFICAS_INTERACTIVAS}"
+                    " gráficas interactivas."
+                )
 
-            return success_message, archivos_graficas, codigo_generado, dataset_info
+            yield progreso.salidas(success_message, exito=True)
 
         else:
             error_msg = f"""❌ **Error al ejecutar el código:**
@@ -84,14 +602,113 @@ def procesar_csv_y_generar_codigo(archivo_csv, instrucciones_usuario):
 {resultado["output"]}
 ```
 """
-            return error_msg, [], codigo_generado, ""
+            if resultado["limite_excedido"]:
+                error_msg += f"\n{formatear_recursos(resultado['recursos'])}\n"
+            progreso.graficas = []
+            progreso.plotly_figures = []
+            yield progreso.salidas(error_msg, exito=False)
+
+    except ErrorIngesta as e:
+        yield _error(f"❌ {e}")
 
     except Exception as e:
-        return f"❌ Error al procesar el archivo: {str(e)}", [], "", ""
+        if carga is not None:
+            carga.cancelar()
+        yield _error(f"❌ Error al procesar el archivo: {str(e)}")
 
 
-def crear_tab_generador_ia():
-    """Crea la pestaña del Generador IA"""
+def calcular_formula(
+    archivo_csv, formula, periodo, meta, sentido, request: gr.Request = None
+):
+    """
+    Calcula un indicador sobre el CSV subido con el motor de fórmulas, sin
+    pasar por la IA ni por la ejecución de código. Retorna el estado, la
+    tabla por período y una gráfica del valor frente a la meta.
+    """
+    import plotly.graph_objects as go
+
+    if archivo_csv is None:
+        return "❌ Por favor, sube un archivo CSV.", None, None
+    if not formula or not formula.strip():
+        return "❌ Escribe la fórmula del indicador.", None, None
+    try:
+        inicio = time.perf_counter()
+        estado = _estado_sesion(request.session_hash) if request else None
+        carga = abrir_dataset(archivo_csv.name, estado["dataset"] if estado else {})
+        df, _ = carga.resultado()
+        inicio_calculo = time.perf_counter()
+        resultado = calcular_indicador(
+            df,
+            formula,
+            periodo=None if periodo == "total" else periodo,
+            meta=meta or None,
+            sentido=sentido,
+        )
+        fin = time.perf_counter()
+    except (ErrorFormula, ErrorIngesta) as e:
+        return f"❌ {e}", None, None
+
+    fig = go.Figure(
+        go.Scatter(x=resultado["periodo"], y=resultado["valor"], mode="lines+markers")
+    )
+    if "meta" in resultado:
+        fig.add_hline(
+            y=resultado["meta"].iloc[0], line_dash="dash", annotation_text="Meta"
+        )
+    fig.update_layout(title=formula, height=400, xaxis=dict(type="category"))
+    mensaje = (
+        f"✅ **Indicador calculado** en {(fin - inicio_calculo) * 1000:.1f} ms "
+        f"(datos: {ORIGENES_DATASET[carga.origen]}, "
+        f"{(inicio_calculo - inicio) * 1000:.0f} ms)"
+    )
+    if "cumple" in resultado:
+        mensaje += (
+            f"  \n**Períodos que cumplen la meta:** "
+            f"{int(resultado['cumple'].sum())} de {len(resultado)}"
+        )
+    return (
+        mensaje,
+        resultado.round(4),
+        PlotData(type="plotly", plot=fig.to_json()),
+    )
+
+
+def _procesar_plantilla(plantilla, carga, progreso):
+    df, reporte_tipos = carga.resultado()
+    progreso.completar("Lectura de datos", progreso.inicio)
+    progreso.info_datos = _info_datos(df, carga, reporte_tipos)
+    progreso.etapa = f"Calculando indicadores ({plantilla.nombre})"
+    yield progreso.salidas()
+    resultado = ejecutar_plantilla(plantilla, df)
+    progreso.completar("Indicadores", time.perf_counter() - resultado["tiempo_s"])
+    progreso.codigo = resultado["codigo"]
+    progreso.plotly_figures = resultado["plotly_figures"]
+    progreso.info_ejecucion = "\n" + resultado["resumen"] + "\n"
+    mensaje = (
+        f"✅ **Plantilla de KPI aplicada:** {plantilla.nombre} "
+        "_(dataset reconocido; no se generó código con IA. Para un análisis a"
+        " medida, desmarca «Usar plantillas de KPI»)_"
+    )
+    if len(resultado["plotly_figures"]) > MAX_GRAFICAS_INTERACTIVAS:
+        mensaje += (
+            f" Se muestran las primeras {MAX_GRAFICAS_INTERACTIVAS}"
+            " gráficas interactivas."
+        )
+    yield progreso.salidas(mensaje, exito=True)
+
+
+def _grafica_galeria(archivo, indice):
+    # Nombre más descriptivo para la descarga, conservando la extensión
+    extension = os.path.splitext(archivo)[1]
+    return (archivo, f"grafica_{indice + 1}_indicadores{extension}")
+
+
+def crear_tab_generador_ia(demo=None):
+    """
+    Crea la pestaña del Generador IA.
+    Si se recibe `demo`, al abrir la página se listan los trabajos recientes.
+    """
+    registrar_tipo(TIPO_TRABAJO, ejecutar_trabajo_analisis)
     with gr.TabItem("Generador IA"):
         gr.HTML("""
             <div style="text-align: center; margin-bottom: 20px;">
@@ -121,6 +738,15 @@ def crear_tab_generador_ia():
                     lines=6,
                 )
 
+                perfilar = gr.Checkbox(
+                    label="⏱️ Perfilar ejecución (tiempo por línea y memoria; más lento)",
+                    value=False,
+                )
+                usar_plantillas = gr.Checkbox(
+                    label="📐 Usar plantillas de KPI (sin IA) si el dataset es conocido y las instrucciones piden sus indicadores",
+                    value=True,
+                )
+
                 with gr.Row():
                     generar_btn = gr.Button(
                         "🚀 Generar Análisis",
@@ -146,6 +772,11 @@ def crear_tab_generador_ia():
                     show_download_button=True,
                     interactive=True,
                 )
+                # Las gráficas de Plotly se dibujan en el navegador
+                graficas_interactivas = [
+                    gr.Plot(label=f"📊 Gráfica interactiva {i + 1}", visible=False)
+                    for i in range(MAX_GRAFICAS_INTERACTIVAS)
+                ]
 
         # Tercera fila: Código para cargar archivo en Google Colab
         with gr.Row():
@@ -183,16 +814,81 @@ display(df.head())"""
                 dataset_info_output = gr.Markdown(
                     label="📊 Información del Dataset", elem_classes="output-area"
                 )
+                with gr.Accordion("⏱️ Perfil de ejecución", open=False):
+                    perfil_output = gr.Markdown()
 
-        # Configurar evento
+        # Sexta fila: cálculo directo de un indicador con su fórmula
+        with gr.Row():
+            with gr.Column(elem_classes="card"):
+                with gr.Accordion("🧮 Calcular indicador con fórmula", open=False):
+                    gr.Markdown(
+                        "Calcula el indicador directamente sobre el CSV subido, "
+                        "sin IA. Ejemplos: `avance_real / avance_programado * 100`, "
+                        '`count(estado == "Abierto") / count() * 100`, '
+                        "`mean(dias(fecha_real - fecha_programada))`."
+                    )
+                    with gr.Row():
+                        formula = gr.Textbox(label="Fórmula", scale=3)
+                        periodo = gr.Dropdown(
+                            label="Período",
+                            choices=[*PERIODOS, "total"],
+                            value="mes",
+                            scale=1,
+                        )
+                        meta = gr.Textbox(label="Meta", placeholder="Ej.: 95", scale=1)
+                        sentido = gr.Radio(
+                            label="La meta se cumple con valores",
+                            choices=[("mayores", "mayor"), ("menores", "menor")],
+                            value="mayor",
+                            scale=1,
+                        )
+                    calcular_btn = gr.Button("Calcular")
+                    formula_status = gr.Markdown()
+                    formula_tabla = Tabla(interactive=False)
+                    formula_grafica = gr.Plot()
+
+        # Trabajos anteriores del usuario, para volver a ver su resultado
+        with gr.Row():
+            with gr.Column(elem_classes="card"):
+                with gr.Row():
+                    trabajos_dropdown = gr.Dropdown(
+                        label="🗂️ Trabajos recientes", choices=[], scale=4
+                    )
+                    reabrir_btn = gr.Button("Ver trabajo", scale=1)
+
+        # Identificador estable del usuario, guardado en su navegador
+        usuario = gr.BrowserState("", storage_key="generador_ia_usuario")
+
+        salidas = [
+            status_output,
+            graficas_output,
+            codigo_output,
+            dataset_info_output,
+            perfil_output,
+            *graficas_interactivas,
+        ]
+
+        # Configurar eventos: solo consultan la cola, así que no necesitan
+        # límite de concurrencia (la cola limita los análisis en ejecución)
         generar_btn.click(
             fn=procesar_csv_y_generar_codigo,
-            inputs=[archivo_csv, instrucciones],
-            outputs=[
-                status_output,
-                graficas_output,
-                codigo_output,
-                dataset_info_output,
-            ],
+            inputs=[archivo_csv, instrucciones, perfilar, usar_plantillas, usuario],
+            outputs=salidas + [trabajos_dropdown, usuario],
+            show_progress=True,
+            concurrency_limit=None,
+        )
+        reabrir_btn.click(
+            fn=seguir_trabajo,
+            inputs=[trabajos_dropdown],
+            outputs=salidas,
             show_progress=True,
+            concurrency_limit=None,
+        )
+        calcular_btn.click(
+            fn=calcular_formula,
+            inputs=[archivo_csv, formula, periodo, meta, sentido],
+            outputs=[formula_status, formula_tabla, formula_grafica],
         )
+        if demo is not None:
+            demo.load(trabajos_recientes, inputs=[usuario], outputs=[trabajos_dropdown])
+            demo.unload(liberar_recursos_sesion)
@@ -1,76 +1,328 @@
+import math
+
 import gradio as gr
-import pandas as pd
-from backend.database import db_manager
+from backend.database import MAX_ARCHIVOS_ADJUNTOS, get_db_manager
+from ui.componentes import Tabla
+from ui.evaluador import TIPOS_INDICADOR
+
+# Columnas de la tabla, en el orden en que se muestran
+COLUMNAS_HISTORIAL = {
+    "id": "ID",
+    "fecha_creacion": "Fecha",
+    "objetivo_estrategico": "Objetivo Estratégico",
+    "indicador": "Indicador",
+    "meta": "Meta",
+    "fuente_dato": "Fuente de Datos",
+    "formula": "Fórmula",
+    "tipo": "Tipo",
+    "calificacion": "Calificación",
+    "recomendaciones": "Recomendaciones",
+    "respuesta_gemini": "Respuesta Gemini",
+}
+
+# Filas por página de la tabla
+LIMITE_HISTORIAL = 100
+
+# Cada cuánto la pestaña abierta comprueba si hay evaluaciones nuevas
+INTERVALO_REFRESCO_S = 5
+
+CALIFICACIONES = [
+    ("Todas", ""),
+    ("🟥 1. Bajo", "1"),
+    ("🟧 2. Medio-bajo", "2"),
+    ("🟨 3. Medio-alto", "3"),
+    ("🟩 4. Alto", "4"),
+]
+
+ORDENES = [
+    ("Fecha", "fecha_creacion"),
+    ("ID", "id"),
+    ("Indicador", "indicador"),
+    ("Tipo", "tipo"),
+    ("Calificación", "calificacion"),
+]
+
+# Filtros con los que la tabla muestra las evaluaciones más recientes; solo
+# en ese caso el temporizador puede agregar las nuevas sin volver a consultar
+FILTROS_INICIALES = {
+    "tipo": "",
+    "calificacion": "",
+    "desde": "",
+    "hasta": "",
+    "texto": "",
+    "orden": "fecha_creacion",
+    "descendente": True,
+}
+
+
+def _a_dataframe(evaluaciones):
+    """Convierte filas de la base en la tabla con columnas para mostrar."""
+    import pandas as pd
 
+    if not evaluaciones:
+        return pd.DataFrame(columns=list(COLUMNAS_HISTORIAL.values()))
+    df = pd.DataFrame(evaluaciones)
+    # Renombrar y reordenar columnas para mostrar la información de forma lógica
+    return df[list(COLUMNAS_HISTORIAL)].rename(columns=COLUMNAS_HISTORIAL)
 
-def obtener_historial():
+
+def _resumen(pagina, total, omitidos=()):
+    paginas = max(1, math.ceil(total / LIMITE_HISTORIAL))
+    resumen = f"Página {pagina} de {paginas} · {total} evaluaciones"
+    if omitidos:
+        resumen += (
+            "\n\n⚠️ No se consultaron los archivos de "
+            f"{', '.join(map(str, sorted(omitidos)))} (una consulta admite "
+            f"{MAX_ARCHIVOS_ADJUNTOS - 1} archivos); "
+            "acota el rango de fechas para verlos."
+        )
+    return resumen
+
+
+def obtener_historial(incluir_archivo=False):
     """Obtiene el historial de evaluaciones y lo convierte en un DataFrame"""
-    evaluaciones = db_manager.obtener_evaluaciones(limit=100)
-    if evaluaciones:
-        df = pd.DataFrame(evaluaciones)
-        # Renombrar columnas para mejor presentación
-        df = df.rename(
-            columns={
-                "id": "ID",
-                "fecha_creacion": "Fecha",
-                "objetivo_estrategico": "Objetivo Estratégico",
-                "indicador": "Indicador",
-                "meta": "Meta",
-                "fuente_dato": "Fuente de Datos",
-                "formula": "Fórmula",
-                "tipo": "Tipo",
-                "respuesta_gemini": "Respuesta Gemini",
-                "calificacion": "Calificación",
-                "recomendaciones": "Recomendaciones",
-            }
+    evaluaciones = get_db_manager().obtener_evaluaciones(
+        limit=LIMITE_HISTORIAL, incluir_archivo=incluir_archivo
+    )
+    return _a_dataframe(evaluaciones)
+
+
+def cargar_historial(
+    incluir_archivo=False,
+    tipo="",
+    calificacion="",
+    desde="",
+    hasta="",
+    texto="",
+    orden="fecha_creacion",
+    descendente=True,
+    pagina=1,
+):
+    """
+    Carga una página de la tabla con los filtros indicados, que se aplican en
+    la base. Retorna (tabla, estado, resumen, página) donde el estado
+    recuerda la versión de la base, los filtros y el último id mostrado, para
+    que el temporizador sepa qué consultar (ver `refrescar_historial`).
+    """
+    db = get_db_manager()
+    filtros = {
+        "tipo": tipo or "",
+        "calificacion": calificacion or "",
+        "desde": desde or "",
+        "hasta": hasta or "",
+        "texto": (texto or "").strip(),
+        "orden": orden or "fecha_creacion",
+        "descendente": bool(descendente),
+    }
+    pagina = max(1, int(pagina or 1))
+    version = db.version_datos()
+    reescrituras, ultimo_id = db.estado_cambios()
+    try:
+        evaluaciones, total = db.filtrar_evaluaciones(
+            **filtros,
+            pagina=pagina,
+            por_pagina=LIMITE_HISTORIAL,
+            incluir_archivo=incluir_archivo,
         )
-        # Reordenar columnas para mostrar la información de forma lógica
-        ordered_columns = [
-            "ID",
-            "Fecha",
-            "Objetivo Estratégico",
-            "Indicador",
-            "Meta",
-            "Fuente de Datos",
-            "Fórmula",
-            "Tipo",
-            "Calificación",
-            "Recomendaciones",
-            "Respuesta Gemini",
-        ]
-        df = df[ordered_columns]
-        return df
-    else:
-        return pd.DataFrame(
-            columns=[
-                "ID",
-                "Fecha",
-                "Objetivo Estratégico",
-                "Indicador",
-                "Meta",
-                "Fuente de Datos",
-                "Fórmula",
-                "Tipo",
-                "Calificación",
-                "Recomendaciones",
-                "Respuesta Gemini",
-            ]
+        # Una página que quedó fuera del rango se reemplaza por la última
+        paginas = max(1, math.ceil(total / LIMITE_HISTORIAL))
+        if pagina > paginas:
+            pagina = paginas
+            evaluaciones, total = db.filtrar_evaluaciones(
+                **filtros,
+                pagina=pagina,
+                por_pagina=LIMITE_HISTORIAL,
+                incluir_archivo=incluir_archivo,
+            )
+        omitidos = db.anios_archivo(desde, hasta)[1] if incluir_archivo else []
+    except ValueError as e:
+        return gr.skip(), gr.skip(), f"⚠️ {e}", gr.skip()
+    df = _a_dataframe(evaluaciones)
+    if not df.empty:
+        ultimo_id = max(ultimo_id, int(df["ID"].max()))
+    estado = {
+        "version": version,
+        "reescrituras": reescrituras,
+        "ultimo_id": ultimo_id,
+        "incluir_archivo": incluir_archivo,
+        "filtros": filtros,
+        "pagina": pagina,
+        "total": total,
+        "omitidos": omitidos,
+        "tabla": df,
+    }
+    return df, estado, _resumen(pagina, total, omitidos), pagina
+
+
+def filtrar_historial(incluir_archivo, *filtros):
+    """Aplica filtros nuevos desde la primera página."""
+    return cargar_historial(incluir_archivo, *filtros, pagina=1)
+
+
+def pagina_anterior(incluir_archivo, *filtros_y_pagina):
+    *filtros, pagina = filtros_y_pagina
+    return cargar_historial(incluir_archivo, *filtros, pagina=(pagina or 1) - 1)
+
+
+def pagina_siguiente(incluir_archivo, *filtros_y_pagina):
+    *filtros, pagina = filtros_y_pagina
+    return cargar_historial(incluir_archivo, *filtros, pagina=(pagina or 1) + 1)
+
+
+def refrescar_historial(incluir_archivo, estado):
+    """
+    Evento del temporizador. Sin cambios en la base no envía nada. En la
+    primera página sin filtros, si solo hay evaluaciones nuevas, consulta
+    únicamente esas y las agrega arriba de la tabla; con filtros, otro orden
+    u otra página, vuelve a consultar la página mostrada (una consulta
+    acotada por los índices). Si alguna evaluación se modificó o archivó,
+    recarga la tabla.
+    """
+    if not estado:
+        return cargar_historial(incluir_archivo)
+    db = get_db_manager()
+    version = db.version_datos()
+    if version == estado["version"]:
+        return gr.skip(), estado, gr.skip(), gr.skip()
+    reescrituras, _ = db.estado_cambios()
+    if (
+        reescrituras != estado["reescrituras"]
+        or estado["filtros"] != FILTROS_INICIALES
+        or estado["pagina"] != 1
+    ):
+        # Se refresca lo que la tabla muestra, aunque los controles tengan
+        # cambios sin aplicar (p. ej. texto sin Enter)
+        return cargar_historial(
+            estado["incluir_archivo"], **estado["filtros"], pagina=estado["pagina"]
         )
+    nuevas = db.obtener_evaluaciones_desde(estado["ultimo_id"], LIMITE_HISTORIAL)
+    if not nuevas:
+        return gr.skip(), {**estado, "version": version}, gr.skip(), gr.skip()
+    import pandas as pd
 
+    df = pd.concat([_a_dataframe(nuevas), estado["tabla"]], ignore_index=True)
+    df = df.head(LIMITE_HISTORIAL)
+    estado = {
+        **estado,
+        "version": version,
+        "ultimo_id": max(fila["id"] for fila in nuevas),
+        "total": estado["total"] + len(nuevas),
+        "tabla": df,
+    }
+    return df, estado, _resumen(1, estado["total"], estado["omitidos"]), gr.skip()
 
-def crear_tab_historial():
-    """Crea la pestaña de Historial"""
+
+def crear_tab_historial(demo=None):
+    """
+    Crea la pestaña de Historial.
+    Si se recibe `demo`, la tabla se llena con su evento `load` en lugar de
+    consultar la base de datos mientras se construye la interfaz. Los
+    filtros, el orden y la paginación se resuelven en la base; mientras la
+    página está abierta, las evaluaciones nuevas se agregan solas.
+    """
     with gr.TabItem("Historial"):
         with gr.Row():
             with gr.Column():
                 refresh_btn = gr.Button(
                     "🔄 Actualizar Historial", elem_classes="submit-button"
                 )
-                historial_df = gr.Dataframe(
-                    value=obtener_historial(),
+                incluir_archivo = gr.Checkbox(
+                    label="Incluir evaluaciones archivadas", value=False
+                )
+                with gr.Row():
+                    tipo = gr.Dropdown(
+                        label="Tipo",
+                        choices=[("Todos", ""), *TIPOS_INDICADOR],
+                        value="",
+                    )
+                    calificacion = gr.Dropdown(
+                        label="Calificación", choices=CALIFICACIONES, value=""
+                    )
+                    desde = gr.DateTime(
+                        label="Desde", include_time=False, type="string", value=None
+                    )
+                    hasta = gr.DateTime(
+                        label="Hasta", include_time=False, type="string", value=None
+                    )
+                with gr.Row():
+                    texto = gr.Textbox(
+                        label="Buscar indicador u objetivo",
+                        placeholder="Texto y Enter",
+                        scale=3,
+                    )
+                    orden = gr.Dropdown(
+                        label="Ordenar por",
+                        choices=ORDENES,
+                        value="fecha_creacion",
+                        scale=1,
+                    )
+                    descendente = gr.Radio(
+                        label="Orden",
+                        choices=[("Descendente", True), ("Ascendente", False)],
+                        value=True,
+                        scale=1,
+                    )
+                historial_df = Tabla(
+                    value=obtener_historial() if demo is None else None,
                     label="Evaluaciones Recientes",
                     interactive=False,
                 )
+                with gr.Row():
+                    anterior_btn = gr.Button("◀ Anterior", scale=1)
+                    pagina = gr.Number(
+                        label="Página", value=1, precision=0, minimum=1, scale=1
+                    )
+                    siguiente_btn = gr.Button("Siguiente ▶", scale=1)
+                resumen = gr.Markdown()
 
-        # Configurar evento
-        refresh_btn.click(fn=obtener_historial, outputs=historial_df)
+        # Tabla mostrada, filtros y marcas de la base con las que se cargó
+        estado_historial = gr.State({})
+        temporizador = gr.Timer(INTERVALO_REFRESCO_S)
+
+        filtros = [tipo, calificacion, desde, hasta, texto, orden, descendente]
+        salidas = [historial_df, estado_historial, resumen, pagina]
+
+        # Configurar eventos
+        refresh_btn.click(
+            fn=cargar_historial,
+            inputs=[incluir_archivo, *filtros, pagina],
+            outputs=salidas,
+        )
+        for control in (incluir_archivo, tipo, calificacion, desde, hasta, orden):
+            control.change(
+                fn=filtrar_historial,
+                inputs=[incluir_archivo, *filtros],
+                outputs=salidas,
+            )
+        texto.submit(
+            fn=filtrar_historial,
+            inputs=[incluir_archivo, *filtros],
+            outputs=salidas,
+        )
+        pagina.submit(
+            fn=cargar_historial,
+            inputs=[incluir_archivo, *filtros, pagina],
+            outputs=salidas,
+        )
+        anterior_btn.click(
+            fn=pagina_anterior,
+            inputs=[incluir_archivo, *filtros, pagina],
+            outputs=salidas,
+        )
+        siguiente_btn.click(
+            fn=pagina_siguiente,
+            inputs=[incluir_archivo, *filtros, pagina],
+            outputs=salidas,
+        )
+        temporizador.tick(
+            fn=refrescar_historial,
+            inputs=[incluir_archivo, estado_historial],
+            outputs=salidas,
+            show_progress="hidden",
+        )
+        if demo is not None:
+            demo.load(
+                fn=cargar_historial,
+                inputs=[incluir_archivo, *filtros, pagina],
+                outputs=salidas,
+            )